@@ -29,7 +29,8 @@ def run_command(command, check=True, shell=False, capture_output=False):
 def main():
     args = parse_arguments()
     if args.num_threads == 0:
-        args.num_threads = os.cpu_count()
+        # the cores this run is pinned to, not every core of the machine
+        args.num_threads = len(os.sched_getaffinity(0))
     benchmark_dir = os.path.dirname(os.path.abspath(__file__))
     os.chdir(benchmark_dir + "/YCSB-cpp/")
     lmdb_config = ["lmdb.dbpath="+args.db_path+"\n", "lmdb.mapsize="+args.lmdb_mapsize+"\n"]
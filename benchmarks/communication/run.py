@@ -1,18 +1,25 @@
 
 import os
 
+import sys
+
 import argparse
 
 import subprocess
 
-import paramiko
-
 from getpass import getpass
 
 import time
 
 import getpass
 
+base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+if base_dir not in sys.path:
+    sys.path.append(base_dir)
+
+from benchmarks.packages.agent import AgentClient
+
   
 
 def parse_arguments():
@@ -31,6 +38,11 @@ def parse_arguments():
     parser.add_argument('--host_username', type=str, default="username", help='username of host')
     parser.add_argument('--dpu_ip', type=str, default="192.168.100.2", help='IP address of dpu')
     parser.add_argument('--port', type=int, default=8080, help='Port number')
+    parser.add_argument('--agent', type=str, default=None,
+                        help="Address (ip[:port]) of the dpbento agent on the host, or 'loopback'; replaces ssh/scp and sleeps")
+    parser.add_argument('--ready_timeout', type=float, default=60, help='Seconds to wait for a server started by the agent, and for all client nodes to be ready')
+    parser.add_argument('--client_nodes', type=int, default=1, help='Nodes running the client against one agent; they start their clients together at a barrier')
+    parser.add_argument('--client_rank', type=int, default=0, help='Rank of this client node, rank 0 starts and stops the server')
     parser.add_argument('--metrics', type=str, help='Metrics to collect (not used in run.py)')
     
     return parser.parse_args()
@@ -69,6 +81,83 @@ def ssh_clean_host_tcp_directory(host_username, host_ip, password, log_file):
     command = ["bash", str(sh_path), str(host_username), str(host_ip), password]
     subprocess.run(command, stdout=None, stderr=None, text=True)
 
+def start_clients(agent, name, nodes, ready_timeout, log_file):
+    """Wait at the agent until the clients of every node are ready, so that they all start at the same moment."""
+    start = agent.barrier(f"{name}:start", nodes, timeout=ready_timeout)
+    print(f"{nodes} client node(s) started {name} at {start['time']:.6f} on the agent's clock", file=log_file)
+
+def tcp_via_agent(agent, server_ip, port, file_size, threads, total_requests, output_folder, output_file, isBW, ready_timeout,
+                  nodes, rank, log_file):
+    file_path = os.path.join(os.path.dirname(__file__), "benchmark_tcp")
+    # copied once per version of the sources instead of on every run
+    remote_dir = agent.sync("benchmark_tcp", file_path)
+
+    # build the client outside benchmark_tcp, a new binary there would change what gets synced
+    client = os.path.join(output_folder, "tcp_client")
+    subprocess.run(["gcc", "-o", client, os.path.join(file_path, "client", "client.c"), "-lpthread"], check=True)
+
+    name = f"TCP:{port}:{file_size}:{threads}:{total_requests}"
+    server = None
+    if rank == 0:
+        # returns as soon as the server listens, no fixed sleep
+        server = agent.spawn(["bash", "server.sh", str(port), str(total_requests), str(threads)], cwd=remote_dir,
+                             ready="Server is listening", ready_timeout=ready_timeout)
+    try:
+        start_clients(agent, name, nodes, ready_timeout, log_file)
+        subprocess.run([client, server_ip, str(port), str(file_size), str(threads), "1", str(total_requests), output_file, str(isBW)],
+                       check=True)
+    finally:
+        try:
+            if nodes > 1:
+                # the server must outlive the last client; every node arrives here, failed or not. The clients
+                # started together, so a node that is not here within ready_timeout of this one is gone
+                agent.barrier(f"{name}:done", nodes, timeout=ready_timeout)
+        finally:
+            # the server keeps accepting clients until it is stopped
+            result = agent.kill(server) if server else None
+    if result:
+        print(result['output'], file=log_file)
+
+def rdma_via_agent(agent, tool, server_ip, host_ib_dev, dpu_ib_dev, data_size, test_rounds, output_file, ready_timeout, log_file):
+    server = agent.spawn([tool, "-d", host_ib_dev], ready="Waiting for client", ready_timeout=ready_timeout)
+    try:
+        # perftest serves a single client, the barrier still marks the start on the agent's clock
+        start_clients(agent, f"RDMA:{tool}:{data_size}:{test_rounds}", 1, ready_timeout, log_file)
+        client = subprocess.run([tool, server_ip, "-d", dpu_ib_dev, "-n", str(test_rounds), "-s", str(data_size)],
+                                stdout=subprocess.PIPE, text=True)
+    except BaseException:
+        agent.kill(server)
+        raise
+    print(client.stdout)
+    with open(output_file, 'w') as f:
+        f.write(client.stdout)
+    # perftest servers exit after serving one client; on timeout the agent kills it
+    result = agent.wait(server, timeout=ready_timeout)
+    print(result['output'], file=log_file)
+
+def run_benchmark_via_agent(agent, port, data_size, threads, test_rounds, host_ib_dev, dpu_ib_dev, host_ip, output_folder, log_file, benchmark_item, metrics, ready_timeout,
+                            client_nodes, client_rank):
+    print(f"Running {benchmark_item} test through the agent on {agent.host} with block_size={data_size} bytes, threads={threads}, test_rounds={test_rounds}", file=log_file)
+    test_run_dir = os.path.join(output_folder, benchmark_item)
+    create_directory(test_run_dir)
+    # an in-process agent serves this machine
+    server_ip = "127.0.0.1" if agent.loopback else host_ip
+
+    if benchmark_item == "TCP":
+        isBW = 1 if "bandwidth" in metrics else 0
+        output_file = os.path.join(test_run_dir, f"latency_output.csv")
+        tcp_via_agent(agent, server_ip, port, data_size, threads, test_rounds, output_folder, output_file, isBW, ready_timeout,
+                      client_nodes, client_rank, log_file)
+        print(f"Results saved to {output_file}", file=log_file)
+
+    if benchmark_item == "RDMA":
+        output_file = os.path.join(test_run_dir, f"latency_output.txt")
+        rdma_via_agent(agent, "ib_read_lat", server_ip, host_ib_dev, dpu_ib_dev, data_size, test_rounds, output_file, ready_timeout, log_file)
+        if "bandwidth" in metrics:
+            rdma_via_agent(agent, "ib_read_bw", server_ip, host_ib_dev, dpu_ib_dev, data_size, test_rounds,
+                           os.path.join(test_run_dir, f"bandwidth_output.txt"), ready_timeout, log_file)
+        print(f"Results saved to {test_run_dir}", file=log_file)
+
 def run_benchmark(port, data_size, queue_depth, threads, test_rounds, host_ib_dev, dpu_ib_dev, host_username, host_ip, dpu_ip, password, output_folder, log_file, log_file_path, benchmark_item, metrics):
     print(f"Running {benchmark_item} test with block_size={data_size} bytes, queue depth={queue_depth}, threads={threads}, test_rounds={test_rounds}", file=log_file)
     test_run_dir = os.path.join(output_folder, benchmark_item)
@@ -97,11 +186,22 @@ def main():
 
     # Assume latency is always inside metrics
     args = parse_arguments()
-    password = getpass.getpass("Please Enter SSH password:")
     communication_output_dir = os.path.join(os.path.dirname(__file__), 'output')
     create_directory(communication_output_dir)
     log_file_path = os.path.join(communication_output_dir, "benchmark_test_log.txt")
-    
+
+    if args.agent:
+        if args.client_nodes > 1 and ('RDMA' in args.benchmark_items.split(',') or args.agent == 'loopback'):
+            sys.exit("Several client nodes need TCP and a shared agent, perftest's RDMA servers serve a single client")
+        if not 0 <= args.client_rank < args.client_nodes:
+            sys.exit(f"client_rank must be between 0 and {args.client_nodes - 1}")
+        with open(log_file_path, 'a') as log_file, AgentClient(args.agent) as agent:
+            for benchmark_item in args.benchmark_items.split(','):
+                run_benchmark_via_agent(agent, args.port, args.data_size, args.threads, args.test_rounds, args.host_ib_dev, args.dpu_ib_dev, args.host_ip, communication_output_dir, log_file, benchmark_item, args.metrics or '', args.ready_timeout,
+                                        args.client_nodes, args.client_rank)
+        return
+
+    password = getpass.getpass("Please Enter SSH password:")
     with open(log_file_path, 'a') as log_file:
         benchmark_items = args.benchmark_items.split(',')
         for benchmark_item in benchmark_items:
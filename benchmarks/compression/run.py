@@ -8,11 +8,20 @@ import io
 import subprocess
 import re
 import csv
-import zlib_ng
-from zlib_ng import gzip_ng_threaded, gzip_ng
 import zlib
 from time import perf_counter_ns
 
+base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+if base_dir not in sys.path:
+    sys.path.append(base_dir)
+
+from benchmarks.packages.lazy_import import lazy_import
+from benchmarks.packages.metrics import emit_metrics
+
+# only the threaded items need it, 'default' and 'doca' run without zlib-ng installed
+gzip_ng_threaded = lazy_import('zlib_ng.gzip_ng_threaded', install='pip3 install zlib-ng')
+
 VALID_ITEMS = ['default', 'threaded-single', 'single', 'threading', 'doca']
 
 def write_results(type, data_size, bs, threads, latency, operation='compression'):
@@ -33,6 +42,7 @@ def write_results(type, data_size, bs, threads, latency, operation='compression'
     # Write the results
     writer.writerow([type, data_size, str(bs / 1024) + 'K', threads, latency])
     fp.close()
+    emit_metrics({'latency': latency}, type=type, operation=operation)
 
 def create_tmp_file(data_size: str):
     root_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
@@ -199,15 +209,17 @@ def doca_compress(data_size: str):
     print(f"DOCA throughput: {throughput} MB/s")
     write_results('doca', data_size, data_size, 0, elapsed_s * 1000)
 
-def main():
+def parse_arguments(argv=None):
     parser = argparse.ArgumentParser(description='Run compression benchmark')
     parser.add_argument('--benchmark_items', help='Comma-separated list of benchmark items')
     parser.add_argument('--operation', type=str, default='compression', help='Operation type')
     parser.add_argument('--block_size', type=int, default=1, help='Block size in KB')
     parser.add_argument('--data_size', type=str, default='4K', help='Data size')
     parser.add_argument('--threads', type=int, default=-1, help='Number of threads')
-    args, _ = parser.parse_known_args()
+    args, _ = parser.parse_known_args(argv)
+    return args
 
+def run_items(args):
     items = args.benchmark_items.split(',')
     block_size = args.block_size * 1024
     data_size = args.data_size
@@ -239,5 +251,8 @@ def main():
         else:
             print(f"Invalid operation: {args.operation}")
 
+def main():
+    run_items(parse_arguments())
+
 if __name__ == '__main__':  
     main()
\ No newline at end of file
@@ -19,14 +19,16 @@ def install_dependencies():
     #                pip install pandas", shell=True, check=True, executable='/bin/bash')
 
 def compile_exec():
-    fp_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'float')
-    int_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'int')
+    # binaries go next to the sources, so the prepare cache finds them wherever dpbento is started from
+    curr_dir = os.path.dirname(os.path.realpath(__file__))
+    fp_path = os.path.join(curr_dir, 'float')
+    int_path = os.path.join(curr_dir, 'int')
     print('compiling compute benchmarks...')
-    subprocess.run(f"gcc -o int32 {int_path}/int32.c", shell=True, check=True)
-    subprocess.run(f"gcc -o int8 {int_path}/int8.c", shell=True, check=True)
-    subprocess.run(f"gcc -o int128 {int_path}/int128.c", shell=True, check=True)
-    subprocess.run(f"gcc -o fp32 {fp_path}/fp32.c", shell=True, check=True)
-    subprocess.run(f"gcc -o double {fp_path}/double.c", shell=True, check=True)
+    subprocess.run(f"gcc -o {curr_dir}/int32 {int_path}/int32.c", shell=True, check=True)
+    subprocess.run(f"gcc -o {curr_dir}/int8 {int_path}/int8.c", shell=True, check=True)
+    subprocess.run(f"gcc -o {curr_dir}/int128 {int_path}/int128.c", shell=True, check=True)
+    subprocess.run(f"gcc -o {curr_dir}/fp32 {fp_path}/fp32.c", shell=True, check=True)
+    subprocess.run(f"gcc -o {curr_dir}/double {fp_path}/double.c", shell=True, check=True)
     print('compiled compute benchmarks')
 
 if __name__ == '__main__':
@@ -1,10 +1,19 @@
 import glob
 import json
 import os
+import sys
 from run import VALID_BENCHMARK_ITEMS
 
 import argparse
-import pandas as pd
+
+base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+if base_dir not in sys.path:
+    sys.path.append(base_dir)
+
+from benchmarks.packages.lazy_import import lazy_import
+
+pd = lazy_import('pandas', install='pip3 install pandas')
 
 # report.py shall aggregate all the intermediate results generated by the benchmark items
 # (which may have been run multiple times each) and generate an aggregate (csv) file
@@ -17,7 +26,7 @@ def parse_arguments():
     print(args)
     return args
 
-def gather_results() -> pd.DataFrame:
+def gather_results() -> 'pd.DataFrame':
     # Get the directory path of the current file
     dir = os.path.dirname(os.path.realpath(__file__))
     
@@ -2,7 +2,15 @@ import argparse
 import os
 import re
 import subprocess
-import pandas as pd
+import sys
+
+base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+if base_dir not in sys.path:
+    sys.path.append(base_dir)
+
+from benchmarks.packages.metrics import emit_metrics
+from benchmarks.packages.perf_counters import run_with_counters
 
 
 # TYPE_SIZE = [16, 32, 64, 128]
@@ -139,9 +147,23 @@ def collect_results_compute(out: str, args, data_type):
         op_type = m[0]
         ops_per_sec = round(NUM_OPS / float(m[1]) * 1000000) * OPS_PER_LOOP
         fp.write(','.join(map(str, [data_type, op_type, ops_per_sec])) + '\n')
+        emit_metrics({'ops/s': ops_per_sec}, data_type=data_type, op_type=op_type)
     fp.close()
     
 
+def run_exec(data_type: str) -> str:
+    '''
+    Run the compute binary of `data_type`, under perf stat if the config asked for hardware counters.
+    The counters cover the whole binary, i.e. all op types of the data type.
+    '''
+    exec_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), data_type)
+    result, counters = run_with_counters([exec_path], check=True, capture_output=True, text=True)
+    if counters:
+        print(f"{data_type} counters: {counters}")
+        emit_metrics(counters, data_type=data_type, op_type='all')
+    return result.stdout
+
+
 def run():
     args = parse_arguments()
     print(f"Running compute benchmark")
@@ -151,20 +173,20 @@ def run():
         # pattern match against the item
         if item == 'int':
             if 'int32' in args.data_type:
-                output = subprocess.run(f"./int32", check=True, capture_output=True, shell=True, text=True).stdout
+                output = run_exec('int32')
                 collect_results_compute(output, args, 'int32')
             if 'int8' in args.data_type:
-                output = subprocess.run(f"./int8", check=True, capture_output=True, shell=True, text=True).stdout
+                output = run_exec('int8')
                 collect_results_compute(output, args, 'int8')
             if 'int128' in args.data_type:
-                output = subprocess.run(f"./int128", check=True, capture_output=True, shell=True, text=True).stdout
+                output = run_exec('int128')
                 collect_results_compute(output, args, 'int128')
         elif item == 'fp':
             if 'fp32' in args.data_type:
-                output = subprocess.run(f"./fp32", check=True, capture_output=True, shell=True, text=True).stdout
+                output = run_exec('fp32')
                 collect_results_compute(output, args, 'fp32')
             if 'double' in args.data_type:
-                output = subprocess.run(f"./double", check=True, capture_output=True, shell=True, text=True).stdout
+                output = run_exec('double')
                 collect_results_compute(output, args, 'double')
         print(f"Finished running {item} benchmark")
 
@@ -9,6 +9,13 @@ import subprocess
 import re
 import csv
 
+base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+if base_dir not in sys.path:
+    sys.path.append(base_dir)
+
+from benchmarks.packages.metrics import emit_metrics
+
 ITERATIONS = 1000000
 
 VALID_ITEMS = ['openssl_speed', 'doca_sha256']
@@ -71,6 +78,10 @@ def run_openssl_speed_test(args):
         try:
             result = subprocess.run(command, check=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
             output_file.write(result.stdout)
+            # same number report.py extracts: throughput in 1000s of bytes per second
+            throughput = re.search(rf"{re.escape(args.algorithm)}\s+([\d.]+)k", result.stdout)
+            if throughput:
+                emit_metrics({'throughput': throughput.group(1)}, item='openssl_speed')
         except subprocess.CalledProcessError as e:
             output_file.write(f"Error running OpenSSL speed test: {e}\n")
             output_file.write(e.stdout)
@@ -111,9 +122,10 @@ def run_doca_sha256(data_size):
     # Write the results
     writer.writerow([data_size, throughput_mbps])
     fp.close()
+    emit_metrics({'throughput': throughput_mbps}, item='doca_sha256')
 
 
-def main():
+def parse_arguments(argv=None):
     parser = argparse.ArgumentParser(description='Run OpenSSL speed test')
     parser.add_argument('--algorithm', default='sha256', help='Hash algorithm')
     parser.add_argument('--seconds', default='3', help='Test duration in seconds')
@@ -124,15 +136,20 @@ def main():
     parser.add_argument('--benchmark_items', help='Comma-separated list of benchmark items')
     parser.add_argument('--metrics', type=json.loads, default=[], help='JSON string of metrics')
 
-    args = parser.parse_args()
+    return parser.parse_args(argv)
 
+def run_items(args):
+    success = True
     if 'openssl_speed' in args.benchmark_items:
-        run_openssl_speed_test(args)
+        success = run_openssl_speed_test(args)
     if 'doca_sha256' in args.benchmark_items:
         run_doca_sha256(args.bytes)
+    return success
 
+def main():
+    args = parse_arguments()
 
-    if run_openssl_speed_test(args):
+    if run_items(args):
         sys.exit(0)
     else:
         sys.exit(1)
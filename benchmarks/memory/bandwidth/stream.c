@@ -0,0 +1,167 @@
+#define _GNU_SOURCE
+#include <errno.h>
+#include <pthread.h>
+#include <sched.h>
+#include <stdint.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <time.h>
+#include <unistd.h>
+
+// STREAM's copy, scale, add and triad kernels, one thread per listed cpu. Every thread allocates and
+// first-touches its own arrays, so they live on its NUMA node, and runs the kernels on them between
+// barriers. A kernel's aggregate bandwidth is the bytes all threads moved over the time from the first
+// thread starting to the last one finishing; per-thread bandwidth uses the thread's own time. Both are
+// the best of -n repetitions, the first one being a warm-up, and count bytes the way STREAM does.
+//
+// usage: stream [-a bytes per array] [-n times] cpu...
+// prints "<kernel> aggregate GB/s: <x>" and "<kernel> thread <i> cpu <cpu> GB/s: <x>" lines
+
+#define DEFAULT_ARRAY_BYTES (32UL << 20)
+#define DEFAULT_TIMES 10
+#define KERNELS 4
+#define SCALAR 3.0
+
+static const char *kernel_names[KERNELS] = {"copy", "scale", "add", "triad"};
+static const int kernel_words[KERNELS] = {2, 2, 3, 3};
+
+struct worker {
+    pthread_t thread;
+    int index;
+    int cpu;
+    double *start;  // [times][KERNELS] seconds
+    double *end;
+};
+
+static size_t n;
+static int times = DEFAULT_TIMES;
+static pthread_barrier_t barrier;
+static double checksum_total = 0;
+static pthread_mutex_t checksum_lock = PTHREAD_MUTEX_INITIALIZER;
+
+static double now(void) {
+    struct timespec t;
+    clock_gettime(CLOCK_MONOTONIC, &t);
+    return t.tv_sec + t.tv_nsec / 1e9;
+}
+
+static void *run_worker(void *arg) {
+    struct worker *w = arg;
+    double *a, *b, *c, checksum = 0;
+    cpu_set_t set;
+    size_t j;
+    int k, kernel;
+
+    CPU_ZERO(&set);
+    CPU_SET(w->cpu, &set);
+    if (pthread_setaffinity_np(pthread_self(), sizeof(set), &set) != 0)
+        fprintf(stderr, "cannot pin thread %d to cpu %d, running unpinned\n", w->index, w->cpu);
+
+    if (posix_memalign((void **) &a, 64, n * sizeof(double)) || posix_memalign((void **) &b, 64, n * sizeof(double))
+        || posix_memalign((void **) &c, 64, n * sizeof(double))) {
+        fprintf(stderr, "cannot allocate the arrays of thread %d\n", w->index);
+        exit(1);
+    }
+    for (j = 0; j < n; j++) {
+        a[j] = 1.0;
+        b[j] = 2.0;
+        c[j] = 0.0;
+    }
+
+    for (k = 0; k < times; k++) {
+        for (kernel = 0; kernel < KERNELS; kernel++) {
+            pthread_barrier_wait(&barrier);
+            w->start[k * KERNELS + kernel] = now();
+            switch (kernel) {
+            case 0:
+                for (j = 0; j < n; j++) c[j] = a[j];
+                break;
+            case 1:
+                for (j = 0; j < n; j++) b[j] = SCALAR * c[j];
+                break;
+            case 2:
+                for (j = 0; j < n; j++) c[j] = a[j] + b[j];
+                break;
+            case 3:
+                for (j = 0; j < n; j++) a[j] = b[j] + SCALAR * c[j];
+                break;
+            }
+            w->end[k * KERNELS + kernel] = now();
+        }
+    }
+
+    // keeps the kernels from being optimized away
+    for (j = 0; j < n; j += 4096)
+        checksum += a[j] + b[j] + c[j];
+    pthread_mutex_lock(&checksum_lock);
+    checksum_total += checksum;
+    pthread_mutex_unlock(&checksum_lock);
+    free(a);
+    free(b);
+    free(c);
+    return NULL;
+}
+
+int main(int argc, char **argv) {
+    size_t array_bytes = DEFAULT_ARRAY_BYTES;
+    struct worker *workers;
+    int threads, opt, i, k, kernel;
+
+    while ((opt = getopt(argc, argv, "a:n:")) != -1) {
+        switch (opt) {
+        case 'a': array_bytes = strtoull(optarg, NULL, 10); break;
+        case 'n': times = atoi(optarg); break;
+        default:
+            fprintf(stderr, "usage: %s [-a bytes per array] [-n times] cpu...\n", argv[0]);
+            return 2;
+        }
+    }
+    threads = argc - optind;
+    n = array_bytes / sizeof(double);
+    if (threads < 1 || n < 1 || times < 2) {
+        fprintf(stderr, "usage: %s [-a bytes per array] [-n times >= 2] cpu...\n", argv[0]);
+        return 2;
+    }
+
+    workers = calloc(threads, sizeof(struct worker));
+    pthread_barrier_init(&barrier, NULL, threads);
+    for (i = 0; i < threads; i++) {
+        workers[i].index = i;
+        workers[i].cpu = atoi(argv[optind + i]);
+        workers[i].start = calloc(times * KERNELS, sizeof(double));
+        workers[i].end = calloc(times * KERNELS, sizeof(double));
+        if (pthread_create(&workers[i].thread, NULL, run_worker, &workers[i]) != 0) {
+            fprintf(stderr, "cannot start thread %d: %s\n", i, strerror(errno));
+            return 1;
+        }
+    }
+    for (i = 0; i < threads; i++)
+        pthread_join(workers[i].thread, NULL);
+
+    for (kernel = 0; kernel < KERNELS; kernel++) {
+        double bytes = (double) kernel_words[kernel] * n * sizeof(double);
+        double best = 0;
+        for (k = 1; k < times; k++) {
+            double first = workers[0].start[k * KERNELS + kernel], last = workers[0].end[k * KERNELS + kernel];
+            for (i = 1; i < threads; i++) {
+                if (workers[i].start[k * KERNELS + kernel] < first) first = workers[i].start[k * KERNELS + kernel];
+                if (workers[i].end[k * KERNELS + kernel] > last) last = workers[i].end[k * KERNELS + kernel];
+            }
+            if (best == 0 || last - first < best)
+                best = last - first;
+        }
+        printf("%s aggregate GB/s: %f\n", kernel_names[kernel], threads * bytes / best / 1e9);
+        for (i = 0; i < threads; i++) {
+            double own = 0;
+            for (k = 1; k < times; k++) {
+                double t = workers[i].end[k * KERNELS + kernel] - workers[i].start[k * KERNELS + kernel];
+                if (own == 0 || t < own)
+                    own = t;
+            }
+            printf("%s thread %d cpu %d GB/s: %f\n", kernel_names[kernel], i, workers[i].cpu, bytes / own / 1e9);
+        }
+    }
+    fprintf(stderr, "checksum: %f\n", checksum_total);
+    return 0;
+}
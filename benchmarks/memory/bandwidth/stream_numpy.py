@@ -0,0 +1,119 @@
+import argparse
+import os
+import sys
+import time
+import multiprocessing
+
+base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+
+if base_dir not in sys.path:
+    sys.path.append(base_dir)
+
+from benchmarks.packages.lazy_import import lazy_import
+
+np = lazy_import('numpy', install='pip3 install numpy')
+
+KERNELS = ['copy', 'scale', 'add', 'triad']
+KERNEL_WORDS = {'copy': 2, 'scale': 2, 'add': 3, 'triad': 3}
+'''Arrays each kernel reads or writes once, which is how STREAM counts its bytes'''
+SCALAR = 3.0
+TRIAD_BLOCK = 16384
+'''Elements of the triad done at a time: NumPy has no fused multiply-add, so b + q*c takes two passes,
+the second one over a block that is still in cache rather than over the whole array'''
+DEFAULT_ARRAY_BYTES = 32 << 20
+DEFAULT_TIMES = 10
+
+
+def now():
+    # CLOCK_MONOTONIC is the same clock in every worker process, so their start and end times compare
+    return time.clock_gettime(time.CLOCK_MONOTONIC)
+
+
+def run_kernel(kernel, a, b, c):
+    if kernel == 'copy':
+        np.copyto(c, a)
+    elif kernel == 'scale':
+        np.multiply(c, SCALAR, out=b)
+    elif kernel == 'add':
+        np.add(a, b, out=c)
+    else:
+        for i in range(0, len(a), TRIAD_BLOCK):
+            block = a[i:i + TRIAD_BLOCK]
+            np.multiply(c[i:i + TRIAD_BLOCK], SCALAR, out=block)
+            np.add(block, b[i:i + TRIAD_BLOCK], out=block)
+
+
+def worker(index, cpu, n, times, barrier, results):
+    '''One process per core: pinned first, so that its arrays are first touched, and placed, on the core's node.'''
+    try:
+        os.sched_setaffinity(0, {cpu})
+    except OSError as e:
+        print(f"cannot pin worker {index} to cpu {cpu}, running unpinned: {e}", file=sys.stderr)
+    try:
+        a = np.full(n, 1.0)
+        b = np.full(n, 2.0)
+        c = np.zeros(n)
+
+        spans = []
+        for _ in range(times):
+            for kernel in KERNELS:
+                barrier.wait()
+                start = now()
+                run_kernel(kernel, a, b, c)
+                spans.append((kernel, start, now()))
+        results.put((index, spans))
+    except Exception as e:
+        # release the workers waiting for this one at the barrier
+        barrier.abort()
+        results.put((index, f"worker {index} on cpu {cpu} failed: {e!r}"))
+
+
+def run_stream(cpus, array_bytes=DEFAULT_ARRAY_BYTES, times=DEFAULT_TIMES):
+    '''
+    Aggregate and per-worker GB/s of each kernel with one worker process per cpu in `cpus`, as
+    {kernel: (aggregate, [per worker])}: the best of `times` repetitions after a warm-up, like the C backend.
+    '''
+    n = array_bytes // 8
+    np.ndarray  # imports NumPy before forking, so that a missing NumPy fails here rather than in every worker
+    context = multiprocessing.get_context('fork')
+    barrier = context.Barrier(len(cpus))
+    results = context.Queue()
+    processes = [context.Process(target=worker, args=(i, cpu, n, times, barrier, results)) for i, cpu in enumerate(cpus)]
+    for process in processes:
+        process.start()
+    spans = dict(results.get() for _ in processes)
+    for process in processes:
+        process.join()
+    errors = [result for result in spans.values() if isinstance(result, str)]
+    if errors:
+        raise RuntimeError('; '.join(errors))
+
+    bandwidth = {}
+    for position, kernel in enumerate(KERNELS):
+        nbytes = KERNEL_WORDS[kernel] * n * 8
+        # skip the first repetition, it faults the pages in
+        repetitions = [[spans[i][k * len(KERNELS) + position] for i in range(len(cpus))] for k in range(1, times)]
+        wall = min(max(end for _, _, end in spans_k) - min(start for _, start, _ in spans_k) for spans_k in repetitions)
+        own = [min(spans_k[i][2] - spans_k[i][1] for spans_k in repetitions) for i in range(len(cpus))]
+        bandwidth[kernel] = (len(cpus) * nbytes / wall / 1e9, [nbytes / t / 1e9 for t in own])
+    return bandwidth
+
+
+def main():
+    parser = argparse.ArgumentParser(description='STREAM kernels on NumPy arrays, one worker process per cpu')
+    parser.add_argument('-a', type=int, default=DEFAULT_ARRAY_BYTES, help='Bytes per array per worker')
+    parser.add_argument('-n', type=int, default=DEFAULT_TIMES, help='Repetitions, the first is a warm-up')
+    parser.add_argument('cpus', type=int, nargs='+', help='Cpu of each worker')
+    args = parser.parse_args()
+    if args.n < 2 or args.a < 8:
+        parser.error('needs -n >= 2 and -a >= 8')
+
+    # same output as stream.c, so run.py and report.py read either backend
+    for kernel, (aggregate, per_worker) in run_stream(args.cpus, args.a, args.n).items():
+        print(f"{kernel} aggregate GB/s: {aggregate:f}")
+        for i, (cpu, rate) in enumerate(zip(args.cpus, per_worker)):
+            print(f"{kernel} thread {i} cpu {cpu} GB/s: {rate:f}")
+
+
+if __name__ == '__main__':
+    main()
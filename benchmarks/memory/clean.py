@@ -60,6 +60,12 @@ def main():
     output_path = os.path.join(script_dir, 'output')
     remove_directory(output_path)
 
+    for binary in ('pointer_chase', 'stream'):
+        path = os.path.join(script_dir, binary)
+        if os.path.exists(path):
+            os.remove(path)
+            logging.info(f"Removed {path}")
+
     # Check if sysbench is installed before trying to remove it
     if run_command(['which', 'sysbench'], check=False).returncode == 0:
         run_command(['sudo', 'apt', 'remove', '-y', 'sysbench'])
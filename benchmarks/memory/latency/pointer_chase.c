@@ -0,0 +1,149 @@
+#define _GNU_SOURCE
+#include <errno.h>
+#include <sched.h>
+#include <stdint.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <sys/mman.h>
+#include <time.h>
+#include <unistd.h>
+
+// Load-to-use latency of memory: a chain of pointers, one per cache line, visited in a random
+// order so that every load depends on the previous one and neither the prefetchers nor
+// out-of-order execution can overlap them. Timing many loads over a working set gives the ns
+// per load of the cache level (and TLB reach) that set fits in.
+//
+// usage: pointer_chase [-c cpu] [-H] [-l loads] bytes...
+//   -c  pin to this cpu
+//   -H  back the working sets with huge pages: hugetlbfs if pages are reserved, else THP
+//   -l  dependent loads timed per working set, default 2^24
+// prints one line per working set: "latency <bytes> bytes <pages> ns per load: <ns>"
+
+#define LINE 64
+#define DEFAULT_LOADS (1UL << 24)
+#define HUGE_PAGE (2UL << 20)
+
+struct node {
+    struct node *next;
+    char pad[LINE - sizeof(struct node *)];
+};
+
+static uint64_t rng_state = 0x9e3779b97f4a7c15ULL;
+
+static uint64_t xorshift64(void) {
+    rng_state ^= rng_state << 13;
+    rng_state ^= rng_state >> 7;
+    rng_state ^= rng_state << 17;
+    return rng_state;
+}
+
+static void *map_working_set(size_t bytes, int huge, const char **pages) {
+    void *p;
+    *pages = "4k";
+    if (huge) {
+        size_t rounded = (bytes + HUGE_PAGE - 1) & ~(HUGE_PAGE - 1);
+        p = mmap(NULL, rounded, PROT_READ | PROT_WRITE, MAP_PRIVATE | MAP_ANONYMOUS | MAP_HUGETLB, -1, 0);
+        if (p != MAP_FAILED) {
+            *pages = "hugetlb";
+            return p;
+        }
+    }
+    p = mmap(NULL, bytes, PROT_READ | PROT_WRITE, MAP_PRIVATE | MAP_ANONYMOUS, -1, 0);
+    if (p == MAP_FAILED)
+        return NULL;
+    if (huge && madvise(p, bytes, MADV_HUGEPAGE) == 0)
+        *pages = "thp";
+    return p;
+}
+
+// Sattolo's algorithm turns the identity into a single cycle through all n nodes, so the chase
+// visits the whole working set before it repeats. The permutation is kept in the nodes themselves,
+// a working set of several GiB needs no second array.
+static struct node *build_chain(struct node *nodes, size_t n) {
+    size_t i, j, tmp;
+    for (i = 0; i < n; i++)
+        ((size_t *) &nodes[i])[0] = i;
+    for (i = n - 1; i > 0; i--) {
+        j = xorshift64() % i;
+        tmp = ((size_t *) &nodes[i])[0];
+        ((size_t *) &nodes[i])[0] = ((size_t *) &nodes[j])[0];
+        ((size_t *) &nodes[j])[0] = tmp;
+    }
+    for (i = 0; i < n; i++)
+        nodes[i].next = &nodes[((size_t *) &nodes[i])[0]];
+    return &nodes[0];
+}
+
+#define HOP p = p->next;
+#define HOP16 HOP HOP HOP HOP HOP HOP HOP HOP HOP HOP HOP HOP HOP HOP HOP HOP
+
+static double chase(struct node *start, size_t n, unsigned long loads) {
+    struct node *volatile sink;
+    struct node *p = start;
+    struct timespec start_time, end_time;
+    unsigned long i;
+    double t;
+
+    // one lap to fault the pages in and warm the caches and TLBs
+    for (i = 0; i < n; i++)
+        p = p->next;
+
+    clock_gettime(CLOCK_MONOTONIC, &start_time);
+    for (i = 0; i < loads; i += 16) {
+        HOP16
+    }
+    clock_gettime(CLOCK_MONOTONIC, &end_time);
+    sink = p;
+    (void) sink;
+
+    t = (end_time.tv_sec - start_time.tv_sec) * 1e9;
+    t += (end_time.tv_nsec - start_time.tv_nsec);
+    return t / loads;
+}
+
+int main(int argc, char **argv) {
+    unsigned long loads = DEFAULT_LOADS;
+    int huge = 0, cpu = -1, opt, i;
+
+    while ((opt = getopt(argc, argv, "c:Hl:")) != -1) {
+        switch (opt) {
+        case 'c': cpu = atoi(optarg); break;
+        case 'H': huge = 1; break;
+        case 'l': loads = strtoul(optarg, NULL, 10); break;
+        default:
+            fprintf(stderr, "usage: %s [-c cpu] [-H] [-l loads] bytes...\n", argv[0]);
+            return 2;
+        }
+    }
+    loads = (loads + 15) & ~15UL;
+    if (cpu >= 0) {
+        cpu_set_t set;
+        CPU_ZERO(&set);
+        CPU_SET(cpu, &set);
+        if (sched_setaffinity(0, sizeof(set), &set) != 0) {
+            fprintf(stderr, "cannot run on cpu %d: %s\n", cpu, strerror(errno));
+            return 1;
+        }
+    }
+
+    for (i = optind; i < argc; i++) {
+        size_t bytes = strtoull(argv[i], NULL, 10);
+        size_t n = bytes / LINE;
+        const char *pages;
+        struct node *nodes;
+        if (n < 2) {
+            fprintf(stderr, "working set of %zu bytes is smaller than two cache lines\n", bytes);
+            return 2;
+        }
+        nodes = map_working_set(n * LINE, huge, &pages);
+        if (nodes == NULL) {
+            fprintf(stderr, "cannot map %zu bytes: %s\n", bytes, strerror(errno));
+            return 1;
+        }
+        printf("latency %zu bytes %s ns per load: %f\n", n * LINE, pages, chase(build_chain(nodes, n), n, loads));
+        fflush(stdout);
+        munmap(nodes, huge && strcmp(pages, "hugetlb") == 0 ? (n * LINE + HUGE_PAGE - 1) & ~(HUGE_PAGE - 1) : n * LINE);
+    }
+    return 0;
+}
@@ -1,3 +1,4 @@
+import os
 import subprocess
 import sys
 
@@ -25,6 +26,17 @@ def install_python_packages():
     for package in required_packages:
         run_command(f"pip3 install {package}")
 
+def compile_pointer_chase():
+    # the binary goes next to run.py, so the prepare cache finds it wherever dpbento is started from
+    curr_dir = os.path.dirname(os.path.realpath(__file__))
+    print("Compiling the pointer-chase latency engine...")
+    run_command(f"gcc -O2 -o {curr_dir}/pointer_chase {curr_dir}/latency/pointer_chase.c")
+
+def compile_stream():
+    curr_dir = os.path.dirname(os.path.realpath(__file__))
+    print("Compiling the STREAM bandwidth kernels...")
+    run_command(f"gcc -O3 -march=native -pthread -o {curr_dir}/stream {curr_dir}/bandwidth/stream.c")
+
 def main():
     print("Starting preparation for memory benchmark...")
     
@@ -33,6 +45,9 @@ def main():
     
     # Install Python packages
     install_python_packages()
+
+    compile_pointer_chase()
+    compile_stream()
     
     print("Preparation completed successfully.")
 
@@ -35,18 +35,80 @@ def parse_file_content(file_path, metrics):
         if bandwidth_match:
             results['bandwidth'] = bandwidth_match.group(2)
 
-    if 'latency' in metrics:
-        events_match = re.search(r'total number of events:\s+(\d+)', content)
-        latency_sum_match = re.search(r'sum:\s+([\d.]+)', content)
-        
-        if events_match and latency_sum_match:
-            total_events = int(events_match.group(1))
-            latency_sum_ms = float(latency_sum_match.group(1))
-            avg_latency_ns = (latency_sum_ms * 1e6) / total_events
-            results['latency'] = f"{avg_latency_ns:.2f}"
+    # sysbench's time per event is a block copy, not a load; latency comes from the pointer chase (see parse_latency_file)
 
     return results
 
+def parse_latency_file(file_path):
+    """Rows of a pointer-chase sweep saved by run.py: ns per dependent load per working set, on one core."""
+    match = re.match(r'latency_(.+)_(.+)_(\d+)_(\d+)\.txt', os.path.basename(file_path))
+    if not match:
+        return []
+    with open(file_path, 'r') as file:
+        content = file.read()
+    core_type = re.search(r'core type: (.*)', content)
+    return [{
+        'cpu': match.group(4),
+        'core_type': core_type.group(1) if core_type else '',
+        'pages': pages,
+        'working_set': int(working_set),
+        'latency': latency,
+    } for working_set, pages, latency in re.findall(r'latency (\d+) bytes (\w+) ns per load: ([\d.]+)', content)]
+
+def save_latency_csv(output_dir, timestamp):
+    """The cache/TLB staircase of every core measured, latency in ns per load."""
+    rows = []
+    for filename in sorted(os.listdir(output_dir)):
+        if filename.startswith('latency_') and filename.endswith('.txt'):
+            rows.extend(parse_latency_file(os.path.join(output_dir, filename)))
+    if not rows:
+        return
+    csv_path = os.path.join(output_dir, f'latency_results_{timestamp}.csv')
+    with open(csv_path, 'w', newline='') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=['cpu', 'core_type', 'pages', 'working_set', 'latency'])
+        writer.writeheader()
+        writer.writerows(sorted(rows, key=lambda row: (int(row['cpu']), row['pages'], row['working_set'])))
+    print(f"CSV latency report generated: {csv_path}")
+
+def parse_stream_file(file_path):
+    """Rows of a STREAM run saved by run.py: aggregate and per-core GB/s of each kernel at one thread count."""
+    match = re.match(r'stream_(\w+?)_(.+)_(\d+)\.txt', os.path.basename(file_path))
+    if not match:
+        return []
+    with open(file_path, 'r') as file:
+        content = file.read()
+    threads = int(match.group(3))
+    rows = []
+    for kernel, aggregate in re.findall(r'(\w+) aggregate GB/s: ([\d.]+)', content):
+        per_thread = [float(rate) for rate in re.findall(rf'{kernel} thread \d+ cpu \d+ GB/s: ([\d.]+)', content)]
+        rows.append({
+            'backend': match.group(1),
+            'array_size': match.group(2),
+            'threads': threads,
+            'kernel': kernel,
+            'aggregate_GBps': aggregate,
+            'per_core_GBps': f"{sum(per_thread) / len(per_thread) if per_thread else float(aggregate) / threads:f}",
+            'min_core_GBps': f"{min(per_thread):f}" if per_thread else '',
+            'max_core_GBps': f"{max(per_thread):f}" if per_thread else '',
+        })
+    return rows
+
+def save_stream_csv(output_dir, timestamp):
+    """STREAM bandwidth over the thread-count sweep, per backend and kernel."""
+    rows = []
+    for filename in sorted(os.listdir(output_dir)):
+        if filename.startswith('stream_') and filename.endswith('.txt'):
+            rows.extend(parse_stream_file(os.path.join(output_dir, filename)))
+    if not rows:
+        return
+    csv_path = os.path.join(output_dir, f'stream_results_{timestamp}.csv')
+    with open(csv_path, 'w', newline='') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=['backend', 'array_size', 'threads', 'kernel', 'aggregate_GBps',
+                                                     'per_core_GBps', 'min_core_GBps', 'max_core_GBps'])
+        writer.writeheader()
+        writer.writerows(sorted(rows, key=lambda row: (row['backend'], row['array_size'], row['kernel'], row['threads'])))
+    print(f"CSV STREAM report generated: {csv_path}")
+
 def main():
     args = parse_arguments()
     metrics = json.loads(args.metrics)
@@ -76,5 +138,8 @@ def main():
     
     print(f"CSV report generated: {csv_path}")
 
+    save_latency_csv(output_dir, timestamp)
+    save_stream_csv(output_dir, timestamp)
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,8 +1,32 @@
 import argparse
 import os
+import re
 import subprocess
+import sys
 import datetime
 
+base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+if base_dir not in sys.path:
+    sys.path.append(base_dir)
+
+from benchmarks.packages.metrics import emit_metrics
+from benchmarks.packages.param_space import size as parse_size
+from benchmarks.packages.perf_counters import run_with_counters
+from benchmarks.packages.placement import parse_cpu_list
+
+LATENCY_ITEM = 'latency'
+'''Benchmark item of the pointer-chase latency engine; items other than it and STREAM_ITEM run sysbench'''
+POINTER_CHASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pointer_chase')
+CACHE_LINE = 64
+STREAM_ITEM = 'stream'
+'''Benchmark item of the STREAM bandwidth kernels'''
+STREAM_BACKENDS = {
+    'c': [os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stream')],
+    'numpy': [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bandwidth', 'stream_numpy.py')],
+}
+'''Command of each STREAM backend; both take [-a bytes per array] [-n times] cpu... and print the same lines'''
+
 def parse_arguments():
     parser = argparse.ArgumentParser(description='Run memory benchmark')
     parser.add_argument('--benchmark_items', type=str, help='Comma-separated list of benchmark items')
@@ -13,6 +37,16 @@ def parse_arguments():
     parser.add_argument('--threads', type=int, help='Number of threads')
     parser.add_argument('--time', type=int, help='Test duration in seconds')
     parser.add_argument('--metrics', type=str, help='JSON string of metrics to measure')
+    parser.add_argument('--min_working_set', type=str, default='4K', help='Smallest working set of the latency sweep')
+    parser.add_argument('--max_working_set', type=str, default='1G', help='Largest working set of the latency sweep')
+    parser.add_argument('--steps_per_octave', type=int, default=2, help='Working sets measured per doubling of the size')
+    parser.add_argument('--hugepages', type=int, default=0, help='Back the working sets with huge pages (hugetlbfs if reserved, else THP)')
+    parser.add_argument('--cpus', type=str, default='', help='Cores to measure latency on, one after the other, e.g. "0,4"; the first allowed core by default. STREAM fills them in this order')
+    parser.add_argument('--loads', type=int, default=1 << 24, help='Dependent loads timed per working set')
+    parser.add_argument('--stream_backend', type=str, default='c', choices=sorted(STREAM_BACKENDS), help='STREAM kernels compiled from C or vectorized with NumPy')
+    parser.add_argument('--stream_threads', type=str, default='', help='Comma-separated thread counts of the STREAM sweep; powers of two up to every allowed core by default')
+    parser.add_argument('--stream_array_size', type=str, default='32M', help='Size of each of the three STREAM arrays of every thread')
+    parser.add_argument('--stream_times', type=int, default=10, help='Repetitions of each STREAM kernel, the best after a warm-up is kept')
     
     return parser.parse_args()
 
@@ -32,6 +66,124 @@ def run_sysbench(args):
     result = subprocess.run(command, capture_output=True, text=True)
     return result.stdout
 
+def working_sets(minimum, maximum, steps_per_octave):
+    """Working-set sizes from `minimum` to `maximum` bytes, `steps_per_octave` per doubling, in whole cache lines."""
+    sizes = []
+    step = 0
+    while True:
+        size = int(minimum * 2 ** (step / steps_per_octave)) // CACHE_LINE * CACHE_LINE
+        if size > maximum:
+            return sizes
+        if not sizes or size != sizes[-1]:
+            sizes.append(size)
+        step += 1
+
+def core_type(cpu):
+    """
+    What kind of core `cpu` is, to tell the cores of a big.LITTLE or hybrid chip apart: its MIDR on Arm
+    (implementer, part and revision), cpu_core or cpu_atom on Intel hybrids, else its model name.
+    """
+    try:
+        with open(f'/sys/devices/system/cpu/cpu{cpu}/regs/identification/midr_el1', 'r') as f:
+            return f.read().strip()
+    except OSError:
+        pass
+    for pmu in ('cpu_core', 'cpu_atom'):
+        try:
+            with open(f'/sys/devices/{pmu}/cpus', 'r') as f:
+                if cpu in parse_cpu_list(f.read()):
+                    return pmu
+        except OSError:
+            pass
+    try:
+        with open('/proc/cpuinfo', 'r') as f:
+            for block in f.read().split('\n\n'):
+                fields = dict(line.split(':', 1) for line in block.splitlines() if ':' in line)
+                fields = {key.strip(): value.strip() for key, value in fields.items()}
+                if fields.get('processor') == str(cpu):
+                    return fields.get('model name') or fields.get('CPU part', '')
+    except OSError:
+        pass
+    return ''
+
+def run_latency(args):
+    """
+    Chase pointers through every working set on each of the requested cores and report the ns per dependent load:
+    flat while the set fits a cache level, stepping up as it outgrows L1, L2, the LLC and the TLB reach.
+    """
+    if not os.path.exists(POINTER_CHASE):
+        sys.exit(f"{POINTER_CHASE} is missing, run the memory benchmark's prepare.py first")
+    sizes = working_sets(parse_size(args.min_working_set), parse_size(args.max_working_set), args.steps_per_octave)
+    cpus = parse_cpu_list(args.cpus) if args.cpus else [min(os.sched_getaffinity(0))]
+
+    output_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'output')
+    os.makedirs(output_dir, exist_ok=True)
+    for cpu in cpus:
+        kind = core_type(cpu)
+        print(f"Measuring load latency on cpu {cpu} ({kind or 'unknown core'}) over {len(sizes)} working sets")
+        command = [POINTER_CHASE, '-c', str(cpu), '-l', str(args.loads)] + (['-H'] if args.hugepages else []) + [str(size) for size in sizes]
+        result, counters = run_with_counters(command, capture_output=True, text=True)
+        if result.returncode != 0:
+            print(f"pointer_chase failed on cpu {cpu}: {result.stderr.strip()}")
+            continue
+
+        filepath = os.path.join(output_dir, f"latency_{args.min_working_set}_{args.max_working_set}_{args.hugepages}_{cpu}.txt")
+        with open(filepath, 'w') as f:
+            f.write(f"core type: {kind}\n" + result.stdout)
+        print(f"Latency results saved to {filepath}")
+
+        for working_set, pages, latency in re.findall(r'latency (\d+) bytes (\w+) ns per load: ([\d.]+)', result.stdout):
+            emit_metrics({'latency': float(latency)}, benchmark_item=LATENCY_ITEM, working_set=int(working_set),
+                         pages=pages, cpu=cpu, core_type=kind)
+        if counters:
+            emit_metrics(counters, benchmark_item=LATENCY_ITEM, working_set='all', cpu=cpu, core_type=kind)
+
+def stream_thread_counts(spec, cores):
+    """Thread counts of the STREAM sweep: `spec` as given, else 1, 2, 4, ... and `cores` itself."""
+    if spec:
+        return [int(count) for count in spec.split(',')]
+    counts = [2 ** i for i in range(cores.bit_length()) if 2 ** i < cores]
+    return counts + [cores]
+
+def run_stream(args):
+    """
+    Run STREAM's copy, scale, add and triad with 1 to N threads, one per core, and report the aggregate GB/s and
+    the GB/s per core: the aggregate flattening while per-core bandwidth drops shows where the memory saturates.
+    """
+    command = STREAM_BACKENDS[args.stream_backend]
+    if not os.path.exists(command[-1]):
+        sys.exit(f"{command[-1]} is missing, run the memory benchmark's prepare.py first")
+    cpus = parse_cpu_list(args.cpus) if args.cpus else sorted(os.sched_getaffinity(0))
+    array_bytes = parse_size(args.stream_array_size)
+
+    output_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'output')
+    os.makedirs(output_dir, exist_ok=True)
+    for threads in stream_thread_counts(args.stream_threads, len(cpus)):
+        if threads > len(cpus):
+            print(f"Skipping {threads} STREAM threads, only {len(cpus)} cores are available")
+            continue
+        print(f"Running STREAM ({args.stream_backend}) with {threads} threads, {args.stream_array_size} per array")
+        result, counters = run_with_counters(command + ['-a', str(array_bytes), '-n', str(args.stream_times)] + [str(cpu) for cpu in cpus[:threads]],
+                                             capture_output=True, text=True)
+        if result.returncode != 0:
+            print(f"STREAM failed with {threads} threads: {result.stderr.strip()}")
+            continue
+
+        filepath = os.path.join(output_dir, f"stream_{args.stream_backend}_{args.stream_array_size}_{threads}.txt")
+        with open(filepath, 'w') as f:
+            f.write(result.stdout)
+        print(f"STREAM results saved to {filepath}")
+
+        for kernel, bandwidth in re.findall(r'(\w+) aggregate GB/s: ([\d.]+)', result.stdout):
+            emit_metrics({'bandwidth_GBps': float(bandwidth)},
+                         benchmark_item=STREAM_ITEM, backend=args.stream_backend, kernel=kernel, threads=threads)
+        # what each core measured over its own time, so one slow core or node stands out
+        for kernel, cpu, bandwidth in re.findall(r'(\w+) thread \d+ cpu (\d+) GB/s: ([\d.]+)', result.stdout):
+            emit_metrics({'per_core_bandwidth_GBps': float(bandwidth)}, benchmark_item=STREAM_ITEM,
+                         backend=args.stream_backend, kernel=kernel, threads=threads, cpu=int(cpu))
+        if counters:
+            emit_metrics(counters, benchmark_item=STREAM_ITEM, backend=args.stream_backend, kernel='all', threads=threads)
+
 def save_output(output, args):
     timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
     current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -50,7 +202,15 @@ def save_output(output, args):
 
 def main():
     args = parse_arguments()
-    
+
+    items = (args.benchmark_items or 'sysbench').split(',')
+    if LATENCY_ITEM in items:
+        run_latency(args)
+    if STREAM_ITEM in items:
+        run_stream(args)
+    if all(item in (LATENCY_ITEM, STREAM_ITEM) for item in items):
+        return
+
     print(f"Running memory benchmark with parameters:")
     print(f"  Benchmark items: {args.benchmark_items}")
     print(f"  Memory block size: {args.memory_block_size}")
@@ -64,5 +224,9 @@ def main():
     output = run_sysbench(args)
     save_output(output, args)
 
+    bandwidth_match = re.search(r'MiB transferred \(([\d.]+) MiB/sec\)', output)
+    if bandwidth_match:
+        emit_metrics({'bandwidth': bandwidth_match.group(1)})
+
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -1,16 +1,20 @@
 import argparse
 import os
+import sys
 # import mediapipe as mp
 # from mediapipe.tasks import python
 # from mediapipe.tasks.python.components import processors
 # from mediapipe.tasks.python import vision
 
-import cv2
-from tflite_support.task import core
-from tflite_support.task import processor
-from tflite_support.task import vision
 from time import perf_counter_ns
 
+base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+if base_dir not in sys.path:
+    sys.path.append(base_dir)
+
+from benchmarks.packages.metrics import emit_metrics
+
 
 N_ITERATIONS = 50
 
@@ -33,51 +37,62 @@ def parse_arguments():
     # print(args)
     return args
 
-args = parse_arguments()
+def main():
+    # imported here, cv2 and tflite take seconds to load on DPU cores
+    import cv2
+    from tflite_support.task import core
+    from tflite_support.task import processor
+    from tflite_support.task import vision
+
+    args = parse_arguments()
+
+    model_path=os.path.join(os.path.dirname(os.path.realpath(__file__)), f'classifier{args.data_type}.tflite')
+
+    # Initialize the image classification model
+    base_options = core.BaseOptions(
+        file_name=model_path, num_threads=args.num_threads)
 
-model_path=os.path.join(os.path.dirname(os.path.realpath(__file__)), f'classifier{args.data_type}.tflite')
+    classification_options = processor.ClassificationOptions()
+    options = vision.ImageClassifierOptions(
+        base_options=base_options, classification_options=classification_options)
 
-# Initialize the image classification model
-base_options = core.BaseOptions(
-    file_name=model_path, num_threads=args.num_threads)
+    classifier = vision.ImageClassifier.create_from_options(options)
 
-classification_options = processor.ClassificationOptions()
-options = vision.ImageClassifierOptions(
-    base_options=base_options, classification_options=classification_options)
+    # for all images
+    IMAGE_FILENAMES = [os.path.join(os.path.dirname(os.path.realpath(__file__)), 'burger.jpg')]
+    IMAGE_NAME = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'burger.jpg')
+    image = cv2.imread(IMAGE_NAME)
+    # resize the image to the expected size
+    image = cv2.resize(image, tuple(map(int, args.img_size.split('x'))))
+    img_size = image.shape
+    tensor_image = vision.TensorImage.create_from_array(image)
 
-classifier = vision.ImageClassifier.create_from_options(options)
+    start_time = perf_counter_ns()
+    for i in range(N_ITERATIONS):
+        categories = classifier.classify(tensor_image)
 
-# for all images
-IMAGE_FILENAMES = [os.path.join(os.path.dirname(os.path.realpath(__file__)), 'burger.jpg')]
-IMAGE_NAME = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'burger.jpg')
-image = cv2.imread(IMAGE_NAME)
-# resize the image to the expected size
-image = cv2.resize(image, tuple(map(int, args.img_size.split('x'))))
-img_size = image.shape
-tensor_image = vision.TensorImage.create_from_array(image)
+    end_time = perf_counter_ns()
 
-start_time = perf_counter_ns()
-for i in range(N_ITERATIONS):
-    categories = classifier.classify(tensor_image)
+    running_time_ms = (end_time - start_time) / 1000000
+    print(f"running time for {N_ITERATIONS}: {running_time_ms} ms")
 
-end_time = perf_counter_ns()
+    results_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), '../../output/ML/img_classification')
+    os.makedirs(results_dir, exist_ok=True)
 
-running_time_ms = (end_time - start_time) / 1000000
-print(f"running time for {N_ITERATIONS}: {running_time_ms} ms")
+    # write the results to a file
+    result_file = os.path.join(results_dir, "result.csv")
+    # print("result_file path: ", result_file)
+    if not os.path.exists(result_file):
+        # write the columns header
+        fp = open(result_file, 'w')
+        fp.write(','.join(ALL_METRICS) + '\n')
+    else:
+        fp = open(result_file, 'a')
 
-results_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), '../../output/ML/img_classification')
-os.makedirs(results_dir, exist_ok=True)
+    fp.write(f"{args.data_type},{args.num_threads},{img_size[1]}x{img_size[0]},{running_time_ms / N_ITERATIONS}\n")
+    fp.close()
+    emit_metrics({'avg_inference_time(ms)': running_time_ms / N_ITERATIONS})
 
-# write the results to a file
-result_file = os.path.join(results_dir, "result.csv")
-# print("result_file path: ", result_file)
-if not os.path.exists(result_file):
-    # write the columns header
-    fp = open(result_file, 'w')
-    fp.write(','.join(ALL_METRICS) + '\n')
-else:
-    fp = open(result_file, 'a')
 
-fp.write(f"{args.data_type},{args.num_threads},{img_size[1]}x{img_size[0]},{running_time_ms / N_ITERATIONS}\n")
-fp.close()
-   
\ No newline at end of file
+if __name__ == '__main__':
+    main()
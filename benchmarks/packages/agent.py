@@ -0,0 +1,370 @@
+import argparse
+import base64
+import hashlib
+import io
+import ipaddress
+import itertools
+import json
+import os
+import re
+import shutil
+import socket
+import socketserver
+import subprocess
+import tarfile
+import threading
+import time
+
+from .watchdog import KILL_GRACE_PERIOD, RunTimeout, kill_process_group, wait_process_group
+
+DEFAULT_PORT = 7070
+LOOPBACK = 'loopback'
+'''Agent address that starts an in-process agent on 127.0.0.1, for trying out multi-node benchmarks on one machine'''
+
+TOKEN_ENV = 'DPBENTO_AGENT_TOKEN'
+'''Shared secret clients must send if it is set where the agent runs; the agent executes arbitrary commands,
+so it only listens beyond the loopback interface with a token'''
+DEFAULT_BIND = '127.0.0.1'
+
+DEFAULT_ROOT = os.path.join('/tmp', 'dpbento-agent')
+
+
+class AgentError(Exception):
+    pass
+
+
+def is_loopback(host: str) -> bool:
+    '''Whether every address `host` resolves to is a loopback address; the wildcard address is not.'''
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, None)} if host else set()
+    except socket.gaierror:
+        return False
+    return bool(addresses) and all(ipaddress.ip_address(address.split('%')[0]).is_loopback for address in addresses)
+
+
+class _Job:
+    '''A command started by the agent, with its merged stdout/stderr collected line by line.'''
+    def __init__(self, command: list, cwd: str = None, env: dict = None, ready: str = None):
+        if shutil.which('stdbuf'):
+            # C programs block-buffer a pipe, the ready line would only show up once the server exits
+            command = ['stdbuf', '-oL', '-eL'] + command
+        self.process = subprocess.Popen(command, cwd=cwd, env={**os.environ, **(env or {})}, start_new_session=True,
+                                        stdout=subprocess.PIPE, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL)
+        self.started = time.time()
+        self.finished = None
+        self.lines = []
+        self.ready_pattern = re.compile(ready) if ready else None
+        self.ready = threading.Event()
+        self.matched = False
+        self._reader = threading.Thread(target=self._read, daemon=True)
+        self._reader.start()
+
+    def _read(self):
+        for line in iter(self.process.stdout.readline, b''):
+            self.lines.append(line)
+            if self.ready_pattern and not self.matched and self.ready_pattern.search(line.decode(errors='replace')):
+                self.matched = True
+                self.ready.set()
+        self.process.stdout.close()
+        # wake up whoever waits for readiness, `matched` tells that it never came
+        self.ready.set()
+
+    def wait(self, timeout: float = None) -> dict:
+        try:
+            returncode = wait_process_group(self.process, timeout)
+        finally:
+            self._reader.join()
+            self.finished = self.finished or time.time()
+        return self.result(returncode)
+
+    def kill(self, grace: float = KILL_GRACE_PERIOD) -> dict:
+        if self.process.poll() is None:
+            kill_process_group(self.process.pid, grace, self.process)
+        self.process.wait()
+        self._reader.join()
+        self.finished = self.finished or time.time()
+        return self.result(self.process.returncode)
+
+    def output(self) -> str:
+        return b''.join(self.lines).decode(errors='replace')
+
+    def result(self, returncode: int) -> dict:
+        return {'returncode': returncode, 'output': self.output(), 'started': self.started, 'finished': self.finished,
+                'duration': self.finished - self.started}
+
+
+class AgentServer(socketserver.ThreadingTCPServer):
+    '''
+    Long-lived agent that runs benchmark commands on its node on behalf of the orchestrator on another
+    node, e.g. the server half of a host/DPU benchmark. It replaces a fresh SSH session, a copy of the
+    benchmark directory and a fixed sleep per run with one connection and explicit synchronization.
+
+    The protocol is JSON lines over TCP, one request and one response per line. A request is
+    `{"id": ..., "op": ..., "token": ..., ...}`, the response `{"id": ..., "ok": true, ...}` or
+    `{"id": ..., "ok": false, "error": ...}`. Operations:
+
+    - `ping`: host name and the agent's clock
+    - `sync` {name, digest, archive}: unpack a gzipped tar (base64) of a directory under the agent's root,
+      once per content digest; without `archive` it only tells whether that digest is present
+    - `run` {command, cwd, env, timeout}: run a command to completion, returns its exit code, output and
+      start/finish times
+    - `spawn` {command, cwd, env, ready, ready_timeout}: start a command and return a handle once a line
+      of its output matches the `ready` regular expression (right away without one)
+    - `wait` {handle, timeout} and `kill` {handle}: result of a spawned command
+    - `barrier` {name, parties, timeout}: return once `parties` requests reached the barrier `name`
+
+    Connections are served concurrently, so clients on several nodes can meet at a barrier. Binding anything
+    but a loopback address needs a `token`: without one anyone who reaches the port could run commands.
+    '''
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address: tuple, root: str = DEFAULT_ROOT, token: str = None):
+        token = token if token is not None else os.environ.get(TOKEN_ENV)
+        if not token and not is_loopback(address[0]):
+            raise AgentError(f"refusing to listen on {address[0]} without a token, set ${TOKEN_ENV} or pass --token")
+        super().__init__(address, _AgentHandler)
+        self.root = root
+        self.token = token
+        self.jobs = {}
+        self.barriers = {}
+        self._handles = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def handle_request_message(self, request: dict) -> dict:
+        if self.token and request.get('token') != self.token:
+            raise AgentError('invalid token')
+        op = request.get('op')
+        handler = getattr(self, f"op_{op}", None)
+        if handler is None:
+            raise AgentError(f"unknown operation {op!r}")
+        return handler(**{k: v for k, v in request.items() if k not in ('id', 'op', 'token')})
+
+    def op_ping(self) -> dict:
+        return {'host': socket.gethostname(), 'time': time.time()}
+
+    def op_sync(self, name: str, digest: str, archive: str = None) -> dict:
+        path = os.path.join(self.root, f"{os.path.basename(name)}-{digest[:16]}")
+        if os.path.isdir(path):
+            return {'path': path, 'present': True}
+        if archive is None:
+            return {'path': path, 'present': False}
+        tmp_path = path + f".tmp{threading.get_ident()}"
+        with tarfile.open(fileobj=io.BytesIO(base64.b64decode(archive)), mode='r:gz') as tar:
+            # refuse absolute paths and links out of the directory where the Python supports it
+            tar.extractall(tmp_path, **({'filter': 'tar'} if hasattr(tarfile, 'tar_filter') else {}))
+        try:
+            os.replace(tmp_path, path)
+        except OSError:
+            # a concurrent sync of the same contents won
+            if not os.path.isdir(path):
+                raise
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        return {'path': path, 'present': True}
+
+    def op_run(self, command: list, cwd: str = None, env: dict = None, timeout: float = None) -> dict:
+        job = _Job(command, cwd, env)
+        try:
+            return job.wait(timeout)
+        except RunTimeout:
+            raise AgentError(f"{command} timed out after {timeout:g}s, output:\n{job.output()}")
+
+    def op_spawn(self, command: list, cwd: str = None, env: dict = None, ready: str = None,
+                 ready_timeout: float = 60) -> dict:
+        job = _Job(command, cwd, env, ready)
+        if ready and not (job.ready.wait(ready_timeout) and job.matched):
+            # the event is also set when the output ends without a match
+            exited = job.ready.is_set()
+            result = job.kill(grace=0)
+            reason = f"exited with {result['returncode']}" if exited else f"was not ready after {ready_timeout:g}s"
+            raise AgentError(f"{command} {reason}, output:\n{result['output']}")
+        handle = next(self._handles)
+        with self._lock:
+            self.jobs[handle] = job
+        return {'handle': handle, 'started': job.started}
+
+    def _pop_job(self, handle: int) -> _Job:
+        with self._lock:
+            job = self.jobs.pop(handle, None)
+        if job is None:
+            raise AgentError(f"no spawned command {handle}")
+        return job
+
+    def op_wait(self, handle: int, timeout: float = None) -> dict:
+        job = self._pop_job(handle)
+        try:
+            return job.wait(timeout)
+        except RunTimeout:
+            raise AgentError(f"spawned command {handle} timed out after {timeout:g}s, output:\n{job.output()}")
+
+    def op_kill(self, handle: int) -> dict:
+        return self._pop_job(handle).kill()
+
+    def op_barrier(self, name: str, parties: int, timeout: float = None) -> dict:
+        with self._lock:
+            barrier = self.barriers.get(name)
+            if barrier is None or barrier.parties != parties:
+                barrier = self.barriers[name] = threading.Barrier(parties)
+        try:
+            barrier.wait(timeout)
+        except threading.BrokenBarrierError:
+            barrier.reset()
+            raise AgentError(f"barrier {name} broken or timed out waiting for {parties} parties")
+        return {'time': time.time()}
+
+    def server_close(self):
+        with self._lock:
+            jobs, self.jobs = list(self.jobs.values()), {}
+        for job in jobs:
+            job.kill(grace=0)
+        super().server_close()
+
+
+class _AgentHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            request = None
+            try:
+                request = json.loads(line)
+                response = {'ok': True, **self.server.handle_request_message(request)}
+            except (AgentError, OSError, ValueError, TypeError, tarfile.TarError) as e:
+                request = request if isinstance(request, dict) else {}
+                response = {'ok': False, 'error': str(e)}
+            response['id'] = request.get('id')
+            self.wfile.write((json.dumps(response) + '\n').encode())
+            self.wfile.flush()
+
+
+def directory_archive(path: str):
+    '''Gzipped tar of a directory and a digest of its contents, which names it on the agent.'''
+    digest = hashlib.sha256()
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w:gz') as tar:
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                file_path = os.path.join(root, name)
+                relative = os.path.relpath(file_path, path)
+                with open(file_path, 'rb') as f:
+                    digest.update(relative.encode() + b'\0' + f.read())
+                tar.add(file_path, arcname=relative)
+    return buffer.getvalue(), digest.hexdigest()
+
+
+class AgentClient:
+    '''
+    Connection to the agent of another node, or to an in-process one for `address='loopback'`:
+
+        with AgentClient('10.10.10.10:7070') as agent:
+            remote_dir = agent.sync('benchmark_tcp', local_dir)
+            server = agent.spawn(['./server', '8080', '100', '1'], cwd=remote_dir, ready='listening')
+            subprocess.run(client_command)
+            result = agent.wait(server)
+
+    Requests block until the agent answers; failures raise AgentError.
+    '''
+    def __init__(self, address: str, token: str = None, timeout: float = None):
+        self.server = None
+        self.loopback = address == LOOPBACK
+        if self.loopback:
+            self.server = AgentServer(('127.0.0.1', 0), token='')
+            threading.Thread(target=self.server.serve_forever, daemon=True).start()
+            host, port = self.server.server_address
+        else:
+            host, _, port = address.rpartition(':') if ':' in address else (address, '', DEFAULT_PORT)
+        self.host = host
+        self.token = token if token is not None else os.environ.get(TOKEN_ENV)
+        self.sock = socket.create_connection((host, int(port)), timeout=timeout)
+        # requests wait as long as the commands they run, only connecting is bounded
+        self.sock.settimeout(None)
+        self.file = self.sock.makefile('rwb')
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def call(self, op: str, **fields) -> dict:
+        request = {'id': next(self._ids), 'op': op, **fields}
+        if self.token:
+            request['token'] = self.token
+        with self._lock:
+            self.file.write((json.dumps(request) + '\n').encode())
+            self.file.flush()
+            line = self.file.readline()
+        if not line:
+            raise AgentError(f"agent at {self.host} closed the connection")
+        response = json.loads(line)
+        if not response.get('ok'):
+            raise AgentError(response.get('error'))
+        return response
+
+    def ping(self) -> dict:
+        return self.call('ping')
+
+    def sync(self, name: str, path: str) -> str:
+        '''Make the directory `path` available on the agent's node, returns its path there.'''
+        archive, digest = directory_archive(path)
+        response = self.call('sync', name=name, digest=digest)
+        if not response['present']:
+            response = self.call('sync', name=name, digest=digest, archive=base64.b64encode(archive).decode())
+        return response['path']
+
+    def run(self, command: list, cwd: str = None, env: dict = None, timeout: float = None) -> dict:
+        return self.call('run', command=command, cwd=cwd, env=env, timeout=timeout)
+
+    def spawn(self, command: list, cwd: str = None, env: dict = None, ready: str = None,
+              ready_timeout: float = 60) -> int:
+        return self.call('spawn', command=command, cwd=cwd, env=env, ready=ready, ready_timeout=ready_timeout)['handle']
+
+    def wait(self, handle: int, timeout: float = None) -> dict:
+        return self.call('wait', handle=handle, timeout=timeout)
+
+    def kill(self, handle: int) -> dict:
+        return self.call('kill', handle=handle)
+
+    def barrier(self, name: str, parties: int, timeout: float = None) -> dict:
+        return self.call('barrier', name=name, parties=parties, timeout=timeout)
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='dpbento agent, runs benchmark commands for an orchestrator on another node')
+    parser.add_argument('--bind', type=str, default=DEFAULT_BIND,
+                        help='Address to listen on, e.g. 0.0.0.0 for every interface; anything but loopback needs a token')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='Port to listen on')
+    parser.add_argument('--token', type=str, default=os.environ.get(TOKEN_ENV),
+                        help=f'Shared secret clients must send, ${TOKEN_ENV} by default')
+    parser.add_argument('--root', type=str, default=DEFAULT_ROOT, help='Directory synced benchmark files are kept in')
+    parser.add_argument('--ping', type=str, metavar='HOST[:PORT]', help='Check that the agent at this address answers')
+    args = parser.parse_args()
+
+    if args.ping:
+        with AgentClient(args.ping, token=args.token, timeout=10) as agent:
+            print(agent.ping())
+        return
+
+    try:
+        server = AgentServer((args.bind, args.port), root=args.root, token=args.token or '')
+    except AgentError as e:
+        parser.exit(1, f"{e}\n")
+    os.makedirs(args.root, exist_ok=True)
+    with server:
+        print(f"dpbento agent listening on {args.bind}:{args.port}", flush=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,264 @@
+import argparse
+import json
+import math
+import os
+import random
+import re
+import statistics
+import sys
+
+from .result_store import query, to_records
+from .warmup import WARMUP_LABEL
+
+LOWER_IS_BETTER = re.compile(r'lat|time|duration|(^|_)(us|ns|ms)$|miss|wait|stall', re.IGNORECASE)
+'''Metrics whose names match are costs, e.g. `avg_latency` or `exec_time`; all others are rates such as IOPS'''
+
+VERDICT_PASS = 'pass'
+VERDICT_REGRESSION = 'regression'
+VERDICT_IMPROVEMENT = 'improvement'
+VERDICT_INSUFFICIENT = 'insufficient'
+VERDICT_NEW = 'new'
+
+
+class CompareConfig:
+    '''
+    How the measurements of one benchmark are compared, from the `compare` section of its config:
+
+        "compare": {"metrics": ["iops", "avg_latency"], "lower_is_better": ["avg_latency"],
+                    "threshold": 0.05, "alpha": 0.05, "confidence": 0.95, "resamples": 2000}
+
+    A metric regressed when its samples differ significantly (Mann-Whitney U p-value below `alpha`)
+    and its median got worse by more than `threshold`, relative to the baseline. Whether lower is better
+    is guessed from the metric name unless listed in `lower_is_better` or `higher_is_better`.
+    '''
+    def __init__(self, metrics: list = None, lower_is_better: list = None, higher_is_better: list = None,
+                 threshold: float = 0.05, alpha: float = 0.05, confidence: float = 0.95, resamples: int = 2000,
+                 min_samples: int = 2, seed: int = 0):
+        self.metrics = metrics
+        self.lower = set(lower_is_better or [])
+        self.higher = set(higher_is_better or [])
+        self.threshold = threshold
+        self.alpha = alpha
+        self.confidence = confidence
+        self.resamples = resamples
+        self.min_samples = min_samples
+        self.seed = seed
+
+    @classmethod
+    def from_config(cls, config: dict = None):
+        return cls(**(config or {}))
+
+    def lower_is_better(self, metric: str) -> bool:
+        if metric in self.lower:
+            return True
+        if metric in self.higher:
+            return False
+        return bool(LOWER_IS_BETTER.search(metric))
+
+
+def mann_whitney_u(a: list, b: list):
+    '''
+    Two-sided Mann-Whitney U test of `a` against `b`, returns (U of `b`, p-value).
+
+    The p-value is exact for small samples without ties and otherwise comes from the normal
+    approximation with tie and continuity correction.
+    '''
+    n1, n2 = len(a), len(b)
+    pooled = sorted([(value, 0) for value in a] + [(value, 1) for value in b])
+    ranks = [0.0] * len(pooled)
+    ties = []
+    i = 0
+    while i < len(pooled):
+        j = i
+        while j + 1 < len(pooled) and pooled[j + 1][0] == pooled[i][0]:
+            j += 1
+        for k in range(i, j + 1):
+            ranks[k] = (i + j) / 2 + 1
+        if j > i:
+            ties.append(j - i + 1)
+        i = j + 1
+    rank_sum = sum(rank for rank, (_, side) in zip(ranks, pooled) if side == 1)
+    u = rank_sum - n2 * (n2 + 1) / 2
+    mean = n1 * n2 / 2
+
+    if not ties and n1 * n2 <= 400:
+        counts = _u_distribution(n1, n2)
+        total = sum(counts)
+        extreme = min(u, n1 * n2 - u)
+        p = 2 * sum(counts[:int(extreme) + 1]) / total
+        return u, min(1.0, p)
+
+    n = n1 + n2
+    variance = n1 * n2 / 12 * ((n + 1) - sum(t ** 3 - t for t in ties) / (n * (n - 1)))
+    if variance <= 0:
+        return u, 1.0
+    z = (abs(u - mean) - 0.5) / math.sqrt(variance)
+    return u, min(1.0, 2 * (1 - statistics.NormalDist().cdf(max(z, 0.0))))
+
+
+def _u_distribution(n1: int, n2: int) -> list:
+    '''Number of orderings of n1 + n2 distinct values giving each U from 0 to n1 * n2.'''
+    # previous[m][u] counts the orderings of i - 1 and m values, the largest value comes from either sample
+    previous = [[1] for _ in range(n2 + 1)]
+    for i in range(1, n1 + 1):
+        current = [[1]]
+        for m in range(1, n2 + 1):
+            row = [0] * (i * m + 1)
+            for u, c in enumerate(current[m - 1]):
+                row[u] += c
+            for u, c in enumerate(previous[m]):
+                row[u + m] += c
+            current.append(row)
+        previous = current
+    return previous[n2]
+
+
+def cliffs_delta(a: list, b: list) -> float:
+    '''Probability that a value of `b` is larger than one of `a` minus the reverse, in [-1, 1].'''
+    greater = sum(1 for x in a for y in b if y > x)
+    less = sum(1 for x in a for y in b if y < x)
+    return (greater - less) / (len(a) * len(b))
+
+
+def relative_change(base: float, current: float) -> float:
+    if base == 0:
+        return 0.0 if current == 0 else math.copysign(math.inf, current)
+    return (current - base) / abs(base)
+
+
+def bootstrap_ci(a: list, b: list, confidence: float = 0.95, resamples: int = 2000, seed: int = 0):
+    '''Percentile bootstrap interval of the relative change of the median from `a` to `b`.'''
+    rng = random.Random(seed)
+    changes = sorted(relative_change(statistics.median(rng.choices(a, k=len(a))),
+                                     statistics.median(rng.choices(b, k=len(b))))
+                     for _ in range(resamples))
+    tail = (1 - confidence) / 2
+    return changes[int(tail * (resamples - 1))], changes[int((1 - tail) * (resamples - 1))]
+
+
+def samples(records: list) -> dict:
+    '''
+    Metric values of successful rows, grouped by (benchmark, params, labels, host, metric). Telemetry
+    rows are left out, they describe the machine and not the benchmark, and so are warm-up iterations.
+    '''
+    groups = {}
+    for record in records:
+        if (record['status'] != 'ok' or record['labels'].get('source') == 'telemetry'
+                or record['labels'].get(WARMUP_LABEL)):
+            continue
+        key = (record['benchmark'], tuple(sorted(record['params'].items())), tuple(sorted(record['labels'].items())),
+               record['host'])
+        for metric, value in record['metrics'].items():
+            if value is not None and not math.isnan(value):
+                groups.setdefault(key + (metric,), []).append(value)
+    return groups
+
+
+def compare(baseline: list, current: list, config_for=None) -> list:
+    '''
+    Compare the result rows of a sweep with those of a baseline sweep, one entry per benchmark, params,
+    labels, host and metric of the current sweep. `config_for(benchmark)` returns its CompareConfig.
+    '''
+    config_for = config_for or (lambda benchmark: CompareConfig())
+    base_groups = samples(baseline)
+    comparisons = []
+    for key, values in sorted(samples(current).items()):
+        benchmark, params, labels, host, metric = key
+        config = config_for(benchmark)
+        if config.metrics is not None and metric not in config.metrics:
+            continue
+        base = base_groups.get(key)
+        entry = {
+            'benchmark': benchmark, 'params': dict(params), 'labels': dict(labels), 'host': host, 'metric': metric,
+            'lower_is_better': config.lower_is_better(metric),
+            'n_baseline': len(base or []), 'n_current': len(values),
+            'baseline_median': statistics.median(base) if base else None, 'current_median': statistics.median(values),
+            'change': None, 'ci': None, 'p_value': None, 'cliffs_delta': None,
+        }
+        comparisons.append(entry)
+        if not base:
+            entry['verdict'] = VERDICT_NEW
+            continue
+
+        entry['change'] = relative_change(entry['baseline_median'], entry['current_median'])
+        if len(base) < config.min_samples or len(values) < config.min_samples:
+            entry['verdict'] = VERDICT_INSUFFICIENT
+            continue
+        _, entry['p_value'] = mann_whitney_u(base, values)
+        entry['cliffs_delta'] = cliffs_delta(base, values)
+        entry['ci'] = bootstrap_ci(base, values, config.confidence, config.resamples, config.seed)
+
+        # positive is worse, whichever way the metric goes
+        worse_by = -entry['change'] if not entry['lower_is_better'] else entry['change']
+        if entry['p_value'] < config.alpha and worse_by > config.threshold:
+            entry['verdict'] = VERDICT_REGRESSION
+        elif entry['p_value'] < config.alpha and -worse_by > config.threshold:
+            entry['verdict'] = VERDICT_IMPROVEMENT
+        else:
+            entry['verdict'] = VERDICT_PASS
+    return comparisons
+
+
+def _percent(value) -> str:
+    return '-' if value is None else f"{value * 100:+.1f}%"
+
+
+def format_report(comparisons: list, missing: list = ()) -> str:
+    '''Pass/fail table with medians, relative change, its confidence interval, p-value and Cliff's delta.'''
+    lines = [f"{'verdict':<12} {'benchmark':<16} {'metric':<24} {'baseline':>12} {'current':>12} {'change':>8} "
+             f"{'CI':>19} {'p':>7} {'delta':>6}  params"]
+    for c in sorted(comparisons, key=lambda c: (c['verdict'] != VERDICT_REGRESSION, c['benchmark'], c['metric'])):
+        ci = '-' if c['ci'] is None else f"[{_percent(c['ci'][0])}, {_percent(c['ci'][1])}]"
+        p = '-' if c['p_value'] is None else f"{c['p_value']:.3f}"
+        delta = '-' if c['cliffs_delta'] is None else f"{c['cliffs_delta']:+.2f}"
+        base = '-' if c['baseline_median'] is None else f"{c['baseline_median']:.4g}"
+        params = ' '.join(f"{k}={v}" for k, v in {**c['params'], **c['labels']}.items())
+        lines.append(f"{c['verdict'].upper() if c['verdict'] == VERDICT_REGRESSION else c['verdict']:<12} "
+                     f"{os.path.basename(c['benchmark']):<16} {c['metric']:<24} {base:>12} {c['current_median']:>12.4g} "
+                     f"{_percent(c['change']):>8} {ci:>19} {p:>7} {delta:>6}  {params}")
+
+    counts = {}
+    for c in comparisons:
+        counts[c['verdict']] = counts.get(c['verdict'], 0) + 1
+    lines.append('')
+    lines.append(', '.join(f"{count} {verdict}" for verdict, count in sorted(counts.items())) or 'Nothing to compare')
+    if missing:
+        lines.append(f"{len(missing)} baseline measurements were not repeated in this sweep")
+    lines.append('FAIL' if counts.get(VERDICT_REGRESSION) else 'PASS')
+    return '\n'.join(lines)
+
+
+def compare_stores(baseline_path: str, current_path: str, host: str = None, config_for=None):
+    '''
+    Compare two result stores (files, run ids or directories, see `result_files`), restricted to `host`
+    if given. Returns (comparisons, baseline groups missing from the current sweep).
+    '''
+    baseline = to_records(query(baseline_path, host=host))
+    current = to_records(query(current_path, host=host))
+    comparisons = compare(baseline, current, config_for)
+    current_keys = set(samples(current))
+    missing = [key for key in samples(baseline) if key not in current_keys]
+    return comparisons, missing
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare a dpbento sweep against a baseline sweep')
+    parser.add_argument('baseline', help='Result file, run id or directory of the baseline')
+    parser.add_argument('current', help='Result file, run id or directory to check')
+    parser.add_argument('--host', type=str, help='Only compare rows of this host fingerprint')
+    parser.add_argument('--threshold', type=float, default=0.05, help='Relative change that counts as a regression')
+    parser.add_argument('--alpha', type=float, default=0.05, help='Significance level of the Mann-Whitney U test')
+    parser.add_argument('--json', type=str, help='Also write the comparisons to this file')
+    args = parser.parse_args()
+
+    config = CompareConfig(threshold=args.threshold, alpha=args.alpha)
+    comparisons, missing = compare_stores(args.baseline, args.current, host=args.host, config_for=lambda b: config)
+    print(format_report(comparisons, missing))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(comparisons, f, indent=2)
+    sys.exit(1 if any(c['verdict'] == VERDICT_REGRESSION for c in comparisons) else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,216 @@
+import argparse
+import collections
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+
+from .planner import format_duration
+
+EVENTS_FILE = 'events.jsonl'
+'''Name of the event stream inside a sweep's log directory, `output/logs/<run_id>/`'''
+
+
+class EventLog:
+    '''
+    Structured, append-only JSON-lines record of what a sweep does, one object per event:
+
+    - `sweep_start` {total, jobs} and `sweep_finish` {counts, duration}
+    - `phase_start` / `phase_finish` {benchmark, phase, status, duration} for prepare, report and clean
+    - `run_start` {benchmark, params, key, repetition, cpus, log} and `run_finish` {..., status, duration}
+      for every repetition of a combination
+    - `metric` {benchmark, params, key, repetition, metrics, iteration, labels} for every reported record
+    - `combination_finish` {benchmark, params, key, status, repetitions, duration}, or `combination_skip`
+      for combinations `--resume` skips
+
+    Every event also carries `time`, `run_id` and the `pid` of the writer. Listeners, e.g. a ProgressView,
+    get each event as it is written. Without a `path` events only go to the listeners.
+    '''
+    def __init__(self, path: str, run_id: str):
+        self.path = path
+        self.run_id = run_id
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._file = None
+        if path:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            # line buffered, so `tail -f` and `--follow` see every event as soon as it happens
+            self._file = open(path, 'a', buffering=1)
+
+    def subscribe(self, listener):
+        self._listeners.append(listener)
+
+    def emit(self, event: str, **fields) -> dict:
+        record = {'time': time.time(), 'event': event, 'run_id': self.run_id, 'pid': os.getpid(), **fields}
+        with self._lock:
+            if self._file:
+                self._file.write(json.dumps(record, default=str) + '\n')
+            for listener in self._listeners:
+                listener(record)
+        return record
+
+    def close(self):
+        with self._lock:
+            if self._file:
+                self._file.close()
+
+
+class ProgressView:
+    '''
+    Compact progress of a sweep, fed with events: finished/total combinations by status, what is
+    running, elapsed time and an ETA from the mean duration of the combinations finished so far.
+
+    On a terminal the status line is redrawn in place, otherwise one line is printed per finished
+    combination so the output stays readable in a log file.
+    '''
+    def __init__(self, stream=None, live: bool = None):
+        self.stream = stream or sys.stderr
+        self.live = self.stream.isatty() if live is None else live
+        self.total = 0
+        self.jobs = 1
+        self.started = None
+        self.counts = collections.Counter()
+        self.running = {}
+        self.durations = []
+        self.now = None
+
+    @property
+    def done(self) -> int:
+        return sum(self.counts.values())
+
+    def eta(self):
+        remaining = self.total - self.done
+        if remaining <= 0:
+            return 0.0
+        if not self.durations:
+            return None
+        return statistics.fmean(self.durations) * remaining / max(1, min(self.jobs, remaining))
+
+    def status_line(self) -> str:
+        elapsed = (self.now - self.started) if self.started else 0.0
+        counts = ' '.join(f"{status} {count}" for status, count in sorted(self.counts.items()))
+        return (f"[{self.done}/{self.total}] {counts or 'nothing finished yet'} | running {len(self.running)} | "
+                f"elapsed {format_duration(elapsed)} | ETA {format_duration(self.eta())}")
+
+    def __call__(self, record: dict):
+        event = record['event']
+        self.now = record['time']
+        if event == 'sweep_start':
+            self.total += record['total']
+            self.jobs = record.get('jobs', 1)
+            self.started = self.started or record['time']
+        elif event == 'run_start':
+            self.running[record['key']] = record
+        elif event in ('combination_finish', 'combination_skip'):
+            self.running.pop(record['key'], None)
+            self.counts['skipped' if event == 'combination_skip' else record['status']] += 1
+            if event == 'combination_finish':
+                self.durations.append(record['duration'])
+        elif event not in ('sweep_finish', 'phase_finish'):
+            return
+        self.render(record)
+
+    def render(self, record: dict):
+        line = self.status_line()
+        if record['event'] in ('combination_finish', 'combination_skip'):
+            last = f"{os.path.basename(record['benchmark'])} {record['params']} {record.get('status', 'skipped')}"
+        else:
+            last = ''
+        if self.live:
+            self.stream.write('\r\x1b[K' + line + (f" | last: {last}" if last else ''))
+            if record['event'] == 'sweep_finish':
+                self.stream.write('\n')
+        elif last or record['event'] == 'sweep_finish':
+            self.stream.write(line + (f"  {last}" if last else '') + '\n')
+        self.stream.flush()
+
+
+def stream_output(pipe, log_path: str, echo=None, prefix: bytes = b'') -> threading.Thread:
+    '''
+    Copy a child's output line by line into `log_path` if given, and to the binary stream `echo` if given,
+    from a background thread. Long runs neither hold their whole output in memory nor lose it when they crash.
+    '''
+    if log_path:
+        os.makedirs(os.path.dirname(log_path) or '.', exist_ok=True)
+
+    def pump():
+        log = open(log_path, 'ab') if log_path else None
+        try:
+            for line in iter(pipe.readline, b''):
+                if log is not None:
+                    log.write(line)
+                    log.flush()
+                if echo is not None:
+                    echo.write(prefix + line)
+                    echo.flush()
+        finally:
+            if log is not None:
+                log.close()
+        pipe.close()
+
+    thread = threading.Thread(target=pump, daemon=True)
+    thread.start()
+    return thread
+
+
+def process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def read_events(path: str, follow: bool = False, poll_interval: float = 0.5, idle_timeout: float = None):
+    '''
+    Events of a sweep, optionally waiting for new ones until the sweep finishes. Following also stops
+    when the process writing the events is gone (it died before `sweep_finish`), which is only known on
+    the host it runs on, or after `idle_timeout` seconds without a new event.
+    '''
+    writer = None
+    last_event = time.monotonic()
+    with open(path, 'rb') as f:
+        while True:
+            line = f.readline()
+            if not line.endswith(b'\n'):
+                if not follow:
+                    return
+                if writer is not None and not process_alive(writer):
+                    return
+                if idle_timeout is not None and time.monotonic() - last_event > idle_timeout:
+                    return
+                # nothing new yet, or the writer is in the middle of this line
+                f.seek(-len(line), os.SEEK_CUR)
+                time.sleep(poll_interval)
+                continue
+            record = json.loads(line)
+            writer = record.get('pid', writer)
+            last_event = time.monotonic()
+            yield record
+            if follow and record['event'] == 'sweep_finish':
+                return
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Show the progress of a dpbento sweep from its event log')
+    parser.add_argument('path', help='Event log, or the sweep log directory output/logs/<run_id>')
+    parser.add_argument('--follow', action='store_true', help='Keep watching until the sweep finishes or its process is gone')
+    parser.add_argument('--idle_timeout', type=float, default=None,
+                        help='Stop following after this many seconds without a new event')
+    args = parser.parse_args()
+
+    path = os.path.join(args.path, EVENTS_FILE) if os.path.isdir(args.path) else args.path
+    view = ProgressView()
+    record = None
+    for record in read_events(path, follow=args.follow, idle_timeout=args.idle_timeout):
+        view(record)
+    if view.live and (record is None or record['event'] != 'sweep_finish'):
+        view.stream.write('\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+import math
+
+PLAT_BITS = 6
+'''Sub-buckets per power of two are 2^PLAT_BITS, so a bucket is at most 1/64 (1.6%) of its value wide'''
+PLAT_VAL = 1 << PLAT_BITS
+
+FIO_PERCENTILES = (1, 5, 10, 20, 30, 40, 50, 60, 70, 80, 90, 95, 99, 99.5, 99.9, 99.95, 99.99)
+'''Percentiles fio reports by default'''
+
+
+def value_to_index(value: int) -> int:
+    '''Bucket of a latency in nanoseconds, the same log-linear buckets as fio's clat histograms.'''
+    value = max(int(value), 0)
+    msb = value.bit_length() - 1
+    if msb <= PLAT_BITS:
+        return value
+    error_bits = msb - PLAT_BITS
+    return ((error_bits + 1) << PLAT_BITS) + ((value >> error_bits) & (PLAT_VAL - 1))
+
+
+def index_to_value(index: int) -> int:
+    '''Value a bucket stands for: its lower bound for exact buckets, its midpoint otherwise.'''
+    if index < (PLAT_VAL << 1):
+        return index
+    error_bits = (index >> PLAT_BITS) - 1
+    base = 1 << (error_bits + PLAT_BITS)
+    return int(base + ((index & (PLAT_VAL - 1)) + 0.5) * (1 << error_bits))
+
+
+class LatencyHistogram:
+    '''
+    Latency distribution in nanoseconds with log-linear buckets, cheap enough to record every I/O:
+
+        histogram = LatencyHistogram()
+        histogram.record(latency_ns)
+        histogram.percentile(99.9)
+
+    Histograms of several threads, jobs or repetitions are merged by adding bucket counts, which
+    gives exact percentiles of the combined samples (up to the bucket width); averaging the
+    percentiles of the parts does not. `bins()` are keyed like the `bins` of fio's json+ output,
+    so fio histograms load with `from_bins()` and merge with ours.
+    '''
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def record(self, value: int):
+        index = value_to_index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other: 'LatencyHistogram') -> 'LatencyHistogram':
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+        if other.max is not None:
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        return self
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else math.nan
+
+    def percentile(self, p: float) -> float:
+        '''Smallest bucket value that at least `p` percent of the samples do not exceed, NaN if empty.'''
+        if not self.count:
+            return math.nan
+        rank = max(math.ceil(p / 100 * self.count), 1)
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                value = index_to_value(index)
+                # the exact extremes are known, a bucket value never lies outside them
+                return float(min(max(value, self.min), self.max))
+        return float(self.max)
+
+    def percentiles(self, ps: list) -> dict:
+        return {p: self.percentile(p) for p in ps}
+
+    def bins(self) -> dict:
+        return {str(index_to_value(index)): count for index, count in sorted(self.counts.items())}
+
+    @classmethod
+    def from_bins(cls, bins: dict, total: float = None, minimum: int = None, maximum: int = None):
+        '''
+        Histogram of fio-style `bins` ({"<ns>": count}). Without the exact `total`, `minimum` and `maximum`
+        they are estimated from the bucket values.
+        '''
+        histogram = cls()
+        for value, count in bins.items():
+            if not count:
+                continue
+            index = value_to_index(int(float(value)))
+            histogram.counts[index] = histogram.counts.get(index, 0) + count
+            histogram.count += count
+        values = [index_to_value(index) for index in histogram.counts]
+        histogram.total = total if total is not None else sum(index_to_value(i) * c for i, c in histogram.counts.items())
+        histogram.min = minimum if minimum is not None else min(values, default=None)
+        histogram.max = maximum if maximum is not None else max(values, default=None)
+        return histogram
+
+    def to_dict(self, ps: list = FIO_PERCENTILES) -> dict:
+        '''Summary in the shape of fio's json+ `clat_ns` section.'''
+        return {
+            'N': self.count, 'min': self.min or 0, 'max': self.max or 0,
+            'mean': self.mean if self.count else 0.0,
+            'percentile': {f"{p:.6f}": self.percentile(p) for p in ps} if self.count else {},
+            'bins': self.bins(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        if not data.get('N'):
+            return cls()
+        return cls.from_bins(data.get('bins') or {}, total=data['mean'] * data['N'],
+                             minimum=data.get('min'), maximum=data.get('max'))
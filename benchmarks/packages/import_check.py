@@ -0,0 +1,109 @@
+import argparse
+import glob
+import json
+import os
+import subprocess
+import sys
+
+HEAVY_MODULES = ['pandas', 'numpy', 'scipy', 'matplotlib', 'seaborn', 'duckdb', 'pyarrow', 'zlib_ng', 'cv2',
+                 'tflite_support', 'tensorflow', 'mediapipe', 'paramiko', 'kuzu']
+'''Modules that take long to import on DPU cores; benchmark scripts import them lazily, where they are used'''
+
+DEFAULT_BUDGET_MS = 150
+
+_START_MARKER = 'dpbento import check start'
+
+_IMPORT_SCRIPT = f'''
+import importlib.util, json, sys, time
+path = sys.argv[1]
+sys.stderr.write("{_START_MARKER}\\n")
+sys.stderr.flush()
+before = set(sys.modules)
+start = time.perf_counter()
+error = missing = None
+try:
+    spec = importlib.util.spec_from_file_location('dpbento_import_check', path)
+    spec.loader.exec_module(importlib.util.module_from_spec(spec))
+except BaseException as e:
+    error = f"{{type(e).__name__}}: {{e}}"
+    missing = e.name if isinstance(e, ImportError) else None
+seconds = time.perf_counter() - start
+modules = sorted(set(sys.modules) - before)
+if missing:
+    modules.append(missing)
+print(json.dumps({{'seconds': seconds, 'modules': modules, 'error': error}}))
+'''
+
+
+def import_profile(path: str, top: int = 5) -> dict:
+    '''
+    Import a benchmark script in a fresh interpreter, without running its `__main__` block, and report
+    how long that took, which modules it pulled in and the `top` slowest of its direct imports.
+    A heavy module that failed to import counts as imported, the script asked for it.
+    '''
+    directory = os.path.dirname(os.path.abspath(path))
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', _IMPORT_SCRIPT, os.path.abspath(path)],
+                            cwd=directory, capture_output=True, text=True, timeout=600,
+                            env={**os.environ, 'PYTHONPATH': directory})
+    lines = result.stdout.strip().splitlines()
+    try:
+        profile = json.loads(lines[-1])
+    except (IndexError, json.JSONDecodeError):
+        return {'path': path, 'seconds': None, 'modules': [], 'slowest': [],
+                'error': 'the interpreter crashed: ' + ''.join(result.stderr.strip().splitlines()[-1:])}
+
+    # -X importtime lines: "import time: self [us] | cumulative | imported package", nesting by indentation;
+    # what the interpreter imported for itself comes before the marker
+    stderr = result.stderr.split(_START_MARKER, 1)[-1]
+    slowest = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if name.startswith('  '):
+            continue
+        slowest.append((name.strip(), int(cumulative) / 1e3))
+    profile['slowest'] = sorted(slowest, key=lambda entry: entry[1], reverse=True)[:top]
+    profile['path'] = path
+    return profile
+
+
+def heavy_imports(profile: dict) -> list:
+    return sorted({module.split('.')[0] for module in profile['modules']} & set(HEAVY_MODULES))
+
+
+def default_scripts(root: str) -> list:
+    return sorted(glob.glob(os.path.join(root, 'benchmarks', '*', 'run.py'))
+                  + glob.glob(os.path.join(root, 'benchmarks', '*', 'report.py')))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check that benchmark scripts start fast: import each one without '
+                                                 'running it and flag heavy imports and slow start-up')
+    parser.add_argument('scripts', nargs='*', help='Scripts to check, by default every benchmark run.py and report.py')
+    parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS,
+                        help='Longest acceptable import time of a script, in milliseconds')
+    parser.add_argument('--top', type=int, default=3, help='Show this many of the slowest imports of each script')
+    args = parser.parse_args()
+
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+    failures = 0
+    for path in args.scripts or default_scripts(root):
+        profile = import_profile(path, args.top)
+        heavy = heavy_imports(profile)
+        too_slow = profile['seconds'] is not None and profile['seconds'] * 1e3 > args.budget_ms
+        failed = bool(heavy) or too_slow
+        failures += failed
+        took = '?' if profile['seconds'] is None else f"{profile['seconds'] * 1e3:.0f} ms"
+        print(f"{'FAIL' if failed else 'ok':<4} {os.path.relpath(path, root):<40} {took:>8}"
+              + (f"  imports {', '.join(heavy)} at start-up" if heavy else ''))
+        if failed:
+            for name, ms in profile['slowest']:
+                print(f"       {ms:8.1f} ms  {name}")
+        if profile['error'] and not heavy:
+            print(f"       could not be imported: {profile['error']}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
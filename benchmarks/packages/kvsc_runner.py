@@ -1,6 +1,5 @@
 import os
 import time
-import pandas as pd
 from pathlib import Path
 from .runner import Runner
 import subprocess
@@ -0,0 +1,45 @@
+import importlib
+
+
+class LazyModule:
+    '''
+    Stand-in for a module that is imported the first time one of its attributes is used:
+
+        pd = lazy_import('pandas')
+        gzip_ng_threaded = lazy_import('zlib_ng.gzip_ng_threaded', install='pip3 install zlib-ng')
+
+    Benchmark scripts start once per parameter combination, and pandas alone takes seconds to import
+    on DPU cores. Code paths that never touch the module never pay for it, nor fail because it is missing.
+    '''
+    def __init__(self, name: str, install: str = None):
+        self.__dict__['_name'] = name
+        self.__dict__['_install'] = install
+        self.__dict__['_module'] = None
+
+    def _load(self):
+        module = self.__dict__['_module']
+        if module is None:
+            try:
+                module = importlib.import_module(self._name)
+            except ImportError as e:
+                hint = f", install it with '{self._install}'" if self._install else ''
+                raise ImportError(f"This benchmark needs {self._name}{hint}") from e
+            self.__dict__['_module'] = module
+        return module
+
+    def __getattr__(self, attribute: str):
+        return getattr(self._load(), attribute)
+
+    def __setattr__(self, attribute: str, value):
+        setattr(self._load(), attribute, value)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = 'loaded' if self.__dict__['_module'] is not None else 'not loaded yet'
+        return f"<lazy module {self._name!r}, {state}>"
+
+
+def lazy_import(name: str, install: str = None) -> LazyModule:
+    return LazyModule(name, install)
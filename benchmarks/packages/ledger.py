@@ -0,0 +1,135 @@
+import glob
+import hashlib
+import json
+import os
+import platform
+import threading
+import time
+
+STATUS_OK = 'ok'
+STATUS_FAILED = 'failed'
+STATUS_TIMEOUT = 'timeout'
+
+
+def host_fingerprint() -> str:
+    '''
+    Short hash identifying the machine a result was produced on.
+
+    Covers hostname, architecture, kernel release, CPU model and core count, so results from a
+    re-imaged DPU or a different kernel are not mistaken for results from the current one.
+    '''
+    cpu_model = ''
+    try:
+        with open('/proc/cpuinfo', 'r') as f:
+            for line in f:
+                # x86 reports 'model name', arm cores only report the implementer/part numbers
+                if line.startswith(('model name', 'CPU implementer', 'CPU part')):
+                    cpu_model += line.split(':', 1)[1].strip() + ';'
+                elif not line.strip() and cpu_model:
+                    break
+    except OSError:
+        pass
+
+    fields = [platform.node(), platform.machine(), platform.release(), cpu_model, str(os.cpu_count())]
+    return hashlib.sha256('|'.join(fields).encode()).hexdigest()[:16]
+
+
+def file_digest(path: str) -> str:
+    h = hashlib.sha256()
+    try:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 16), b''):
+                h.update(chunk)
+    except OSError:
+        return ''
+    return h.hexdigest()
+
+
+class RunLedger:
+    '''
+    Persistent record of which (benchmark, params) combinations already completed.
+
+    The ledger is an append-only JSON-lines file; when a key appears several times the last line wins.
+    Keys are content addresses over the benchmark path, the parameter combination, its benchmark items
+    and metrics, the contents of every Python file in the benchmark's directory (run.py and the modules it
+    imports) and the host fingerprint, so editing a script or moving to another host automatically makes
+    old entries stale.
+    '''
+    def __init__(self, path: str, host: str = None):
+        self.path = path
+        self.host = host or host_fingerprint()
+        self.entries = {}
+        self._script_digests = {}
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        self.entries = {}
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # a crash in the middle of a write leaves a truncated last line
+                    continue
+                self.entries[entry['key']] = entry
+
+    def scripts_digest(self, directory: str) -> str:
+        if directory not in self._script_digests:
+            h = hashlib.sha256()
+            for path in sorted(glob.glob(os.path.join(directory, '*.py'))):
+                h.update(f"{os.path.basename(path)}:{file_digest(path)}".encode())
+            self._script_digests[directory] = h.hexdigest()
+        return self._script_digests[directory]
+
+    def key_for(self, benchmark: str, params: list, directory: str, items: list = (), metrics: list = ()) -> str:
+        payload = json.dumps({
+            'benchmark': benchmark,
+            'params': sorted((str(k), str(v)) for k, v in params),
+            'items': [str(item) for item in items],
+            'metrics': [str(metric) for metric in metrics],
+            'scripts': self.scripts_digest(directory),
+            'host': self.host,
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def is_completed(self, key: str) -> bool:
+        entry = self.entries.get(key)
+        return entry is not None and entry['status'] == STATUS_OK
+
+    def record(self, key: str, benchmark: str, params: list, status: str, duration: float, **extra):
+        entry = {
+            'key': key,
+            'benchmark': benchmark,
+            'params': {str(k): v for k, v in params},
+            'host': self.host,
+            'status': status,
+            'duration': duration,
+            'finished_at': time.time(),
+        }
+        entry.update(extra)
+
+        with self._lock:
+            self.entries[key] = entry
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(entry) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+
+    def invalidate(self, benchmarks: list) -> int:
+        '''Forget every entry of the given benchmarks. Returns the number of entries removed.'''
+        with self._lock:
+            stale = [key for key, entry in self.entries.items() if entry['benchmark'] in benchmarks]
+            for key in stale:
+                del self.entries[key]
+
+            if stale:
+                tmp_path = self.path + '.tmp'
+                with open(tmp_path, 'w') as f:
+                    for entry in self.entries.values():
+                        f.write(json.dumps(entry) + '\n')
+                os.replace(tmp_path, self.path)
+        return len(stale)
@@ -0,0 +1,51 @@
+import json
+import os
+import time
+
+METRICS_FILE_ENV = 'DPBENTO_METRICS_FILE'
+'''Environment variable run_dpbento.py sets to the file a run should report its metrics to'''
+
+
+def emit_metrics(metrics: dict, iteration: int = None, warmup: bool = False, **labels):
+    '''
+    Report metric values of the current run to run_dpbento.py, e.g. `emit_metrics({'latency': 1.2})`.
+
+    Each call appends one JSON line to the file named by $DPBENTO_METRICS_FILE. `iteration` marks
+    measurements taken inside a run that loops on its own, `warmup=True` an iteration the benchmark knows
+    to be warm-up (see benchmarks/packages/warmup.py). Extra keyword arguments are kept as labels
+    that tell apart several measurements of one run (e.g. `op_type='add'`).
+    When the script runs outside the framework the variable is unset and this is a no-op.
+    '''
+    path = os.environ.get(METRICS_FILE_ENV)
+    if not path:
+        return
+
+    record = {'time': time.time(), 'metrics': {k: float(v) for k, v in metrics.items()}}
+    if iteration is not None:
+        record['iteration'] = iteration
+    if warmup:
+        record['warmup'] = True
+    if labels:
+        record['labels'] = {k: str(v) for k, v in labels.items()}
+
+    with open(path, 'a') as f:
+        f.write(json.dumps(record) + '\n')
+
+
+def read_metrics(path: str) -> list:
+    '''Returns the records emitted to `path`, skipping a truncated last line.'''
+    records = []
+    if not os.path.exists(path):
+        return records
+    with open(path, 'r') as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return records
+
+
+def metric_values(records: list, metric: str) -> list:
+    '''Values of `metric` in steady state, warm-up records are left out.'''
+    return [record['metrics'][metric] for record in records if metric in record['metrics'] and not record.get('warmup')]
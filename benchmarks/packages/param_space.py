@@ -0,0 +1,316 @@
+import ast
+import logging
+import math
+import operator
+import random
+import re
+
+SIZE_UNITS = {'': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3, 't': 1024 ** 4, 'p': 1024 ** 5}
+
+
+def size(value) -> int:
+    '''Bytes of a size like fio/sysbench take them: `4k`, `64K`, `1G`, `2MiB`, `512` -> int.'''
+    if isinstance(value, (int, float)):
+        return int(value)
+    match = re.fullmatch(r'\s*([0-9.]+)\s*([kKmMgGtTpP]?)(i?[bB])?\s*', str(value))
+    if not match:
+        raise ValueError(f"not a size: {value!r}")
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2).lower()])
+
+
+def seconds(value) -> float:
+    '''Seconds of a duration like `10s`, `2m`, `1h` or a plain number.'''
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = re.fullmatch(r'\s*([0-9.]+)\s*(ms|s|m|h)?\s*', str(value))
+    if not match:
+        raise ValueError(f"not a duration: {value!r}")
+    return float(match.group(1)) * {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600, None: 1}[match.group(2)]
+
+
+def count(value) -> int:
+    '''Number of entries of a comma separated value such as `test_lst`, e.g. `"read,write"` -> 2.'''
+    if isinstance(value, (list, tuple)):
+        return len(value)
+    return len([entry for entry in str(value).split(',') if entry.strip()])
+
+
+EXPRESSION_FUNCTIONS = {
+    'size': size, 'seconds': seconds, 'count': count,
+    'int': int, 'float': float, 'str': str, 'len': len, 'min': min, 'max': max, 'abs': abs,
+}
+'''Functions constraint expressions may call, nothing else is reachable from them'''
+
+_BINARY_OPS = {
+    ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv, ast.Mod: operator.mod, ast.Pow: operator.pow,
+}
+_UNARY_OPS = {ast.Not: operator.not_, ast.USub: operator.neg, ast.UAdd: operator.pos}
+_COMPARE_OPS = {
+    ast.Eq: operator.eq, ast.NotEq: operator.ne, ast.Lt: operator.lt, ast.LtE: operator.le,
+    ast.Gt: operator.gt, ast.GtE: operator.ge,
+    ast.In: lambda a, b: a in b, ast.NotIn: lambda a, b: a not in b,
+    ast.Is: operator.is_, ast.IsNot: operator.is_not,
+}
+
+
+class Expression:
+    '''
+    A constraint over parameter values, e.g. `threads > numProc` or `size(block_sizes) > size(size)`.
+
+    Expressions are parsed once and interpreted over a small whitelist of Python syntax: literals,
+    parameter names, arithmetic, comparisons, boolean operators, conditional expressions and calls of
+    `EXPRESSION_FUNCTIONS`. Parameter names that are not set in a combination evaluate to None.
+    '''
+    def __init__(self, source: str):
+        self.source = source
+        try:
+            self._tree = ast.parse(source, mode='eval').body
+        except SyntaxError as e:
+            raise ValueError(f"invalid expression {source!r}: {e.msg}")
+        self.names = set()
+        self._check(self._tree)
+        self._reported = False
+
+    def _check(self, node):
+        if isinstance(node, ast.Call):
+            if not isinstance(node.func, ast.Name) or node.func.id not in EXPRESSION_FUNCTIONS or node.keywords:
+                raise ValueError(f"expression {self.source!r} may only call {', '.join(EXPRESSION_FUNCTIONS)}")
+            for arg in node.args:
+                self._check(arg)
+            return
+        if isinstance(node, ast.Name):
+            self.names.add(node.id)
+            return
+        allowed = (ast.Constant, ast.BoolOp, ast.UnaryOp, ast.BinOp, ast.Compare, ast.IfExp, ast.List, ast.Tuple,
+                   ast.And, ast.Or, ast.Load) + tuple(_BINARY_OPS) + tuple(_UNARY_OPS) + tuple(_COMPARE_OPS)
+        if not isinstance(node, allowed):
+            raise ValueError(f"expression {self.source!r} uses unsupported syntax: {type(node).__name__}")
+        for child in ast.iter_child_nodes(node):
+            self._check(child)
+
+    def __call__(self, values: dict):
+        return self._eval(self._tree, values)
+
+    def holds(self, values: dict) -> bool:
+        '''
+        Whether the expression is true for `values`. An expression that cannot be evaluated, e.g. because
+        it compares a parameter that is unset in this combination with a number, does not hold; the first
+        such failure is logged.
+        '''
+        try:
+            return bool(self(values))
+        except (TypeError, ValueError, ArithmeticError) as e:
+            if not self._reported:
+                self._reported = True
+                logging.getLogger('dpbento').warning(
+                    f"Expression {self.source!r} failed for {values} and counts as false there: {e}")
+            return False
+
+    def _eval(self, node, values: dict):
+        if isinstance(node, ast.Constant):
+            return node.value
+        if isinstance(node, ast.Name):
+            return values.get(node.id)
+        if isinstance(node, ast.BoolOp):
+            if isinstance(node.op, ast.And):
+                result = True
+                for value in node.values:
+                    result = self._eval(value, values)
+                    if not result:
+                        return result
+                return result
+            result = False
+            for value in node.values:
+                result = self._eval(value, values)
+                if result:
+                    return result
+            return result
+        if isinstance(node, ast.UnaryOp):
+            return _UNARY_OPS[type(node.op)](self._eval(node.operand, values))
+        if isinstance(node, ast.BinOp):
+            return _BINARY_OPS[type(node.op)](self._eval(node.left, values), self._eval(node.right, values))
+        if isinstance(node, ast.Compare):
+            left = self._eval(node.left, values)
+            for op, comparator in zip(node.ops, node.comparators):
+                right = self._eval(comparator, values)
+                if not _COMPARE_OPS[type(op)](left, right):
+                    return False
+                left = right
+            return True
+        if isinstance(node, ast.IfExp):
+            return self._eval(node.body if self._eval(node.test, values) else node.orelse, values)
+        if isinstance(node, (ast.List, ast.Tuple)):
+            return [self._eval(element, values) for element in node.elts]
+        if isinstance(node, ast.Call):
+            return EXPRESSION_FUNCTIONS[node.func.id](*(self._eval(arg, values) for arg in node.args))
+        raise ValueError(f"cannot evaluate {type(node).__name__} in {self.source!r}")
+
+    def __repr__(self):
+        return f"Expression({self.source!r})"
+
+
+class ParamSpace:
+    '''
+    The parameter combinations of one benchmark, from its `parameters` and optional `param_space` config:
+
+        "param_space": {
+            "zip": [["threads", "numProc"]],
+            "conditions": {"iodepth": "io_engine != 'sync'"},
+            "exclude": ["threads > numProc", "size(block_sizes) > size(size)"],
+            "sample": {"method": "lhs", "budget": 50, "seed": 1}
+        }
+
+    Parameters in a `zip` group are walked in lockstep instead of crossed, so their lists must have the
+    same length. A parameter with a condition is only set when its expression holds; otherwise it is left
+    out of the combination (and its other values do not create duplicates). Combinations for which any
+    `exclude` expression holds are skipped. An expression that fails for a combination, e.g. one that
+    compares an unset conditional parameter with a number, does not hold for it. `sample` picks `budget` combinations at random or by Latin
+    hypercube sampling instead of running the whole grid.
+
+    The grid is never materialized: a combination is decoded from its index in the mixed-radix space of
+    the axes, so both iteration and sampling only touch the combinations they produce.
+    '''
+    SAMPLE_METHODS = ['random', 'lhs']
+
+    def __init__(self, parameters: dict, zip_groups: list = None, conditions: dict = None, exclude: list = None,
+                 sample: dict = None):
+        self.keys = list(parameters.keys())
+        values = {key: v if isinstance(v, list) else [v] for key, v in parameters.items()}
+
+        # an axis is a tuple of keys walked together, with one tuple of values per position
+        self.axes = []
+        zipped = set()
+        for group in zip_groups or []:
+            unknown = [key for key in group if key not in values]
+            if unknown:
+                raise ValueError(f"zip group {group} names unknown parameters {unknown}")
+            if len({len(values[key]) for key in group}) != 1:
+                raise ValueError(f"zip group {group} needs value lists of the same length")
+            zipped.update(group)
+            self.axes.append((tuple(group), list(zip(*(values[key] for key in group)))))
+        for key in self.keys:
+            if key not in zipped:
+                self.axes.append(((key,), [(value,) for value in values[key]]))
+
+        self.radices = [len(axis_values) for _, axis_values in self.axes]
+        self.grid_size = math.prod(self.radices)
+        '''Number of combinations before conditions and exclusions, i.e. the size of the full grid'''
+
+        self.conditions = {}
+        for key, source in (conditions or {}).items():
+            if key not in values:
+                raise ValueError(f"condition for unknown parameter {key}")
+            if key in zipped:
+                raise ValueError(f"parameter {key} is in a zip group and cannot have a condition")
+            self.conditions[key] = Expression(source)
+        self.exclude = [Expression(source) for source in exclude or []]
+
+        sample = dict(sample or {})
+        self.sample_method = sample.pop('method', 'random') if sample else None
+        if self.sample_method is not None and self.sample_method not in self.SAMPLE_METHODS:
+            raise ValueError(f"sample method must be one of {self.SAMPLE_METHODS}")
+        self.budget = sample.pop('budget', None)
+        if self.sample_method is not None and not self.budget:
+            raise ValueError("sampling the parameter space needs a 'budget'")
+        # without a seed one is drawn here, so that iterating the space again yields the same sample
+        self.seed = sample.pop('seed', None)
+        if self.seed is None:
+            self.seed = random.getrandbits(32)
+        if sample:
+            raise ValueError(f"unknown sample options {list(sample)}")
+
+    @classmethod
+    def from_config(cls, parameters: dict, config: dict = None):
+        config = dict(config or {})
+        space = cls(parameters, zip_groups=config.pop('zip', None), conditions=config.pop('conditions', None),
+                    exclude=config.pop('exclude', None), sample=config.pop('sample', None))
+        if config:
+            raise ValueError(f"unknown param_space options {list(config)}")
+        return space
+
+    def digits(self, index: int) -> list:
+        '''Position on every axis of the combination with grid `index`, the last axis varying fastest.'''
+        digits = []
+        for radix in reversed(self.radices):
+            index, digit = divmod(index, radix)
+            digits.append(digit)
+        return digits[::-1]
+
+    def combination(self, digits: list):
+        '''
+        The (key, value) pairs of the combination at `digits`, in config order, or None if it is excluded
+        or a duplicate of another combination because of an unset conditional parameter.
+        '''
+        values = {}
+        for (keys, axis_values), digit in zip(self.axes, digits):
+            values.update(zip(keys, axis_values[digit]))
+
+        for key, condition in self.conditions.items():
+            if not condition.holds(values):
+                # the first value stands for "unset", any other value would repeat the same combination
+                if digits[self._axis_of(key)] != 0:
+                    return None
+                del values[key]
+
+        if any(expression.holds(values) for expression in self.exclude):
+            return None
+        return [(key, values[key]) for key in self.keys if key in values]
+
+    def _axis_of(self, key: str) -> int:
+        for position, (keys, _) in enumerate(self.axes):
+            if key in keys:
+                return position
+        raise KeyError(key)
+
+    def __iter__(self):
+        if self.grid_size == 0:
+            return
+        if self.sample_method == 'lhs':
+            yield from self._latin_hypercube()
+        elif self.sample_method == 'random':
+            yield from self._random_subset()
+        else:
+            for index in range(self.grid_size):
+                combination = self.combination(self.digits(index))
+                if combination is not None:
+                    yield combination
+
+    def _random_subset(self):
+        '''Up to `budget` distinct valid combinations, drawn uniformly without replacement.'''
+        rng = random.Random(self.seed)
+        seen = set()
+        produced = 0
+        # give up after many rejections, the constraints may leave fewer valid points than the budget
+        attempts = 0
+        while produced < self.budget and len(seen) < self.grid_size and attempts < 100 * self.budget:
+            index = rng.randrange(self.grid_size)
+            attempts += 1
+            if index in seen:
+                continue
+            seen.add(index)
+            combination = self.combination(self.digits(index))
+            if combination is not None:
+                produced += 1
+                yield combination
+
+    def _latin_hypercube(self):
+        '''
+        `budget` points that cover every axis evenly: each axis is cut into `budget` strata and every
+        stratum is used exactly once. Points that collide or are excluded are dropped, not replaced.
+        '''
+        rng = random.Random(self.seed)
+        strata = []
+        for radix in self.radices:
+            order = list(range(self.budget))
+            rng.shuffle(order)
+            strata.append([int((s + rng.random()) * radix / self.budget) for s in order])
+        seen = set()
+        for point in range(self.budget):
+            digits = tuple(axis[point] for axis in strata)
+            if digits in seen:
+                continue
+            seen.add(digits)
+            combination = self.combination(list(digits))
+            if combination is not None:
+                yield combination
@@ -0,0 +1,107 @@
+import functools
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+PERF_EVENTS_ENV = 'DPBENTO_PERF_EVENTS'
+'''Environment variable run_dpbento.py sets to the comma separated counters a run should capture'''
+
+DEFAULT_EVENTS = ['cycles', 'instructions', 'cache-references', 'cache-misses', 'branches', 'branch-misses']
+
+
+def requested_events() -> list:
+    '''Counters requested through $DPBENTO_PERF_EVENTS, empty when capture is off.'''
+    value = os.environ.get(PERF_EVENTS_ENV, '')
+    return [event.strip() for event in value.split(',') if event.strip()]
+
+
+def events_from_config(config) -> list:
+    '''`"perf_counters": true` selects the default counters, a list selects specific perf events.'''
+    if not config:
+        return []
+    if config is True:
+        return list(DEFAULT_EVENTS)
+    if isinstance(config, str):
+        return [event.strip() for event in config.split(',') if event.strip()]
+    return list(config)
+
+
+@functools.lru_cache(maxsize=None)
+def perf_available(events: tuple) -> bool:
+    '''
+    Whether `perf stat` exists and may count `events` here, e.g. not blocked by perf_event_paranoid
+    or a container without access to the PMU.
+    '''
+    if shutil.which('perf') is None:
+        return False
+    try:
+        result = subprocess.run(['perf', 'stat', '-x', ',', '-e', ','.join(events), '--', 'true'],
+                                capture_output=True, text=True, timeout=30)
+    except (OSError, subprocess.TimeoutExpired):
+        return False
+    return result.returncode == 0 and bool(parse_perf_stat(result.stderr))
+
+
+def parse_perf_stat(text: str) -> dict:
+    '''
+    Counter values from `perf stat -x ,` output, keyed by event name without modifiers (`cycles:u` -> `cycles`).
+    Lines for counters the hardware does not support or did not schedule are skipped.
+    '''
+    counts = {}
+    for line in text.splitlines():
+        if not line or line.startswith('#'):
+            continue
+        # value,unit,event,run time,percentage running,...
+        fields = line.split(',')
+        if len(fields) < 3:
+            continue
+        try:
+            value = float(fields[0])
+        except ValueError:
+            # <not supported> / <not counted>
+            continue
+        event = fields[2].split(':')[0]
+        counts[event] = counts.get(event, 0.0) + value
+    return counts
+
+
+def derived_metrics(counts: dict) -> dict:
+    '''Counter values plus IPC and miss ratios, where the counters they need were captured.'''
+    metrics = dict(counts)
+    if counts.get('cycles') and 'instructions' in counts:
+        metrics['ipc'] = counts['instructions'] / counts['cycles']
+    if counts.get('cache-references') and 'cache-misses' in counts:
+        metrics['cache_miss_ratio'] = counts['cache-misses'] / counts['cache-references']
+    if counts.get('branches') and 'branch-misses' in counts:
+        metrics['branch_miss_ratio'] = counts['branch-misses'] / counts['branches']
+    return metrics
+
+
+def run_with_counters(command: list, events: list = None, **kwargs):
+    '''
+    `subprocess.run(command, **kwargs)` under `perf stat`, returning the completed process and a dict of
+    counter values and derived metrics.
+
+    `events` defaults to the counters requested through $DPBENTO_PERF_EVENTS. When none are requested,
+    or perf cannot count them on this machine, the command runs as is and the dict is empty.
+    '''
+    events = events if events is not None else requested_events()
+    if not events:
+        return subprocess.run(command, **kwargs), {}
+    if not perf_available(tuple(events)):
+        print(f"perf stat cannot count {','.join(events)} here, running without hardware counters", file=sys.stderr)
+        return subprocess.run(command, **kwargs), {}
+
+    # perf writes its counters to a separate file so the command's own output is left untouched
+    fd, stat_path = tempfile.mkstemp(prefix='dpbento-perf-', suffix='.csv')
+    os.close(fd)
+    try:
+        result = subprocess.run(['perf', 'stat', '-x', ',', '-o', stat_path, '-e', ','.join(events), '--'] + command,
+                                **kwargs)
+        with open(stat_path, 'r') as f:
+            counts = parse_perf_stat(f.read())
+    finally:
+        os.remove(stat_path)
+    return result, derived_metrics(counts)
@@ -0,0 +1,120 @@
+import functools
+import inspect
+import logging
+import os
+import shutil
+
+THREAD_ENV_VARS = ['OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'NUMEXPR_NUM_THREADS',
+                   'VECLIB_MAXIMUM_THREADS']
+'''Thread pool sizes of the usual native libraries, capped to the cores a run is pinned to'''
+
+MEMORY_POLICIES = {'bind': 'membind', 'interleave': 'interleave', 'preferred': 'preferred'}
+'''`memory` config values and the numactl option that applies them'''
+
+
+def parse_cpu_list(value) -> list:
+    '''Accepts the kernel's list format (`"0-3,8"`), a single number or a list of numbers.'''
+    if isinstance(value, int):
+        return [value]
+    if isinstance(value, (list, tuple)):
+        return sorted({int(v) for v in value})
+    cpus = set()
+    for part in str(value).split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            first, last = part.split('-', 1)
+            cpus.update(range(int(first), int(last) + 1))
+        else:
+            cpus.add(int(part))
+    return sorted(cpus)
+
+
+def format_cpu_list(cpus: list) -> str:
+    '''Inverse of `parse_cpu_list`, e.g. `[0, 1, 2, 3, 8]` -> `"0-3,8"`.'''
+    ranges = []
+    for cpu in sorted(cpus):
+        if ranges and cpu == ranges[-1][1] + 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+    return ','.join(str(first) if first == last else f"{first}-{last}" for first, last in ranges)
+
+
+def node_cpus(node: int) -> list:
+    path = f'/sys/devices/system/node/node{node}/cpulist'
+    try:
+        with open(path, 'r') as f:
+            return parse_cpu_list(f.read())
+    except OSError:
+        raise ValueError(f"NUMA node {node} does not exist on this host ({path} is missing)")
+
+
+@functools.lru_cache(maxsize=None)
+def numactl_available() -> bool:
+    return shutil.which('numactl') is not None
+
+
+class Placement:
+    '''
+    Where the runs of one benchmark execute, from the `placement` section of its config:
+
+        "placement": {"cpus": "0-7", "numa_node": 0, "memory": "bind", "thread_env": true}
+
+    `cpus` and `numa_node` restrict the cores a run is pinned to with sched_setaffinity, which the whole
+    process tree inherits. `memory` (bind/interleave/preferred) also applies a NUMA memory policy to
+    `numa_node`, which needs numactl and a fresh process. With `thread_env` the usual thread pool
+    variables (OMP_NUM_THREADS, ...) are set to the number of cores the run is pinned to.
+    '''
+    def __init__(self, cpus=None, numa_node=None, memory: str = None, thread_env: bool = True):
+        available = sorted(os.sched_getaffinity(0))
+        self.nodes = parse_cpu_list(numa_node) if numa_node is not None else []
+        candidates = parse_cpu_list(cpus) if cpus is not None else available
+        if self.nodes:
+            node_set = set().union(*(node_cpus(node) for node in self.nodes))
+            candidates = [cpu for cpu in candidates if cpu in node_set]
+
+        self.cpus = [cpu for cpu in candidates if cpu in available]
+        '''Cores runs of this benchmark may use, never outside the affinity dpbento itself was started with'''
+        if not self.cpus:
+            raise ValueError(f"placement leaves no usable cpus (cpus={cpus}, numa_node={numa_node}, "
+                             f"available={format_cpu_list(available)})")
+
+        if memory in (None, 'local'):
+            memory = None
+        elif memory not in MEMORY_POLICIES:
+            raise ValueError(f"placement memory policy must be one of local, {', '.join(MEMORY_POLICIES)}")
+        elif not self.nodes:
+            raise ValueError(f"placement memory policy '{memory}' needs a numa_node")
+        elif memory == 'preferred' and len(self.nodes) > 1:
+            raise ValueError("placement memory policy 'preferred' takes a single numa_node")
+        self.memory = memory
+        self.thread_env = thread_env
+
+        if self.memory and not numactl_available():
+            logging.getLogger('dpbento').warning(
+                f"numactl is not installed, runs are only pinned to cpus {format_cpu_list(self.cpus)} "
+                f"without the '{self.memory}' memory policy")
+
+    @classmethod
+    def from_config(cls, config: dict):
+        '''Returns None when the benchmark does not ask for a placement, i.e. runs are not pinned.'''
+        if not config:
+            return None
+        unknown = sorted(set(config) - set(inspect.signature(cls).parameters))
+        if unknown:
+            raise ValueError(f"unknown placement options {unknown}")
+        return cls(**config)
+
+    def command_prefix(self, cpus: list) -> list:
+        '''numactl invocation that applies the memory policy to a fresh process, empty if there is none.'''
+        if not self.memory or not numactl_available():
+            return []
+        return ['numactl', f"--physcpubind={format_cpu_list(cpus)}",
+                f"--{MEMORY_POLICIES[self.memory]}={format_cpu_list(self.nodes)}"]
+
+    def environment(self, cpus: list) -> dict:
+        if not self.thread_env:
+            return {}
+        return {var: str(len(cpus)) for var in THREAD_ENV_VARS}
@@ -0,0 +1,126 @@
+import os
+import statistics
+
+from .param_space import Expression, seconds
+from .repetition import RepetitionPolicy
+
+DURATION_PARAM_KEYS = ['runtime', 'time', 'seconds']
+'''Parameters benchmarks use for the duration of a measurement, e.g. fio's `runtime` or sysbench's `time`'''
+
+DEFAULT_DURATIONS = {
+    # every test of test_lst is run `runtimes` times for `runtime`, at each device count of the scaling mode
+    'storage': "seconds(runtime or '30s') * (runtimes or 5) * count(test_lst or 'randwrite,randread,write,read')"
+               " * count(device_counts or '1') * count(rate_iops or '1')",
+}
+'''Duration expressions per benchmark class, overridable with `"plan": {"duration": ...}` in the user config'''
+
+
+def declared_duration(params: dict, expression: Expression = None):
+    '''
+    Seconds one run of `params` declares it takes, from the benchmark's duration expression or the first
+    of `DURATION_PARAM_KEYS` it sets. None if it declares nothing (or the expression does not evaluate).
+    '''
+    if expression is not None:
+        try:
+            return float(expression(params))
+        except (TypeError, ValueError, ZeroDivisionError):
+            return None
+    for key in DURATION_PARAM_KEYS:
+        if key in params:
+            try:
+                return seconds(params[key])
+            except ValueError:
+                return None
+    return None
+
+
+class DurationEstimator:
+    '''
+    Estimates how long each combination of a benchmark takes, in order of preference from:
+
+    1. the ledger entry of the very same combination (same params, script and host),
+    2. the declared duration, scaled by how much longer than declared its earlier runs took on this host,
+    3. the declared duration times the expected number of repetitions,
+    4. the mean duration of the benchmark's earlier runs.
+
+    Combinations without any of these have an unknown (None) estimate.
+    '''
+    def __init__(self, ledger, benchmark: str, bench_class: str, config: dict):
+        self.ledger = ledger
+        source = config.get('plan', {}).get('duration', DEFAULT_DURATIONS.get(bench_class))
+        self.expression = Expression(source) if source else None
+
+        self.history = [entry for entry in ledger.entries.values()
+                        if entry['benchmark'] == benchmark and entry['host'] == ledger.host
+                        and entry.get('duration') is not None]
+
+        policy = RepetitionPolicy.from_config(config.get('repetition'))
+        repetitions = [entry['repetitions'] for entry in self.history if entry.get('repetitions')]
+        if policy is None:
+            self.repetitions = 1
+        else:
+            self.repetitions = statistics.fmean(repetitions) if repetitions else policy.min_runs
+
+        # how much longer than declared runs really take: start-up, preparing files, repetitions
+        declared_total = actual_total = 0.0
+        for entry in self.history:
+            declared = declared_duration(entry['params'], self.expression)
+            if declared:
+                declared_total += declared
+                actual_total += entry['duration']
+        self.scale = actual_total / declared_total if declared_total else None
+        self.mean = statistics.fmean(entry['duration'] for entry in self.history) if self.history else None
+
+    def estimate(self, key: str, params: list):
+        '''Returns (seconds or None, source of the estimate).'''
+        entry = self.ledger.entries.get(key)
+        if entry is not None and entry.get('duration') is not None:
+            return entry['duration'], 'history'
+
+        declared = declared_duration(dict(params), self.expression)
+        if declared is not None and self.scale is not None:
+            return declared * self.scale, 'declared+history'
+        if declared is not None:
+            return declared * self.repetitions, 'declared'
+        if self.mean is not None:
+            return self.mean, 'benchmark mean'
+        return None, 'unknown'
+
+
+def format_duration(seconds) -> str:
+    if seconds is None:
+        return '?'
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    return f"{hours}h{minutes:02d}m{seconds:02d}s" if hours else f"{minutes}m{seconds:02d}s"
+
+
+def format_plan(benchmarks: list, items: list, estimates: list, schedule: list, skipped: int = 0) -> str:
+    '''
+    Human readable plan: per benchmark totals, the overall wall time and the order the scheduler would
+    start the combinations in. Unknown estimates count as zero and are flagged.
+    '''
+    lines = ['Benchmark                              combinations  unknown  est. run time']
+    for benchmark in benchmarks:
+        own = [estimate for item, (estimate, _) in zip(items, estimates) if item.benchmark == benchmark]
+        unknown = sum(1 for estimate in own if estimate is None)
+        total = sum(estimate or 0 for estimate in own)
+        lines.append(f"{os.path.basename(benchmark):<38} {len(own):>12}  {unknown:>7}  {format_duration(total):>13}")
+
+    makespan = max((end for _, end, _, _ in schedule), default=0.0)
+    unknown = sum(1 for estimate, _ in estimates if estimate is None)
+    lines.append('')
+    lines.append(f"Estimated wall time: {format_duration(makespan)}"
+                 + (f" (+ {unknown} combinations without an estimate)" if unknown else ''))
+    if skipped:
+        lines.append(f"{skipped} combinations already completed and skipped by --resume")
+
+    source_of = {id(item): source for item, (_, source) in zip(items, estimates)}
+    lines.append('')
+    lines.append('Execution order:')
+    for start, end, item, cpus in schedule:
+        estimate = end - start if source_of[id(item)] != 'unknown' else None
+        lines.append(f"  +{format_duration(start):>9}  {format_duration(estimate):>9}  cpus {','.join(map(str, cpus)):<8} "
+                     f"{os.path.basename(item.benchmark)} {dict(item.params)}  [{source_of[id(item)]}]")
+    return '\n'.join(lines)
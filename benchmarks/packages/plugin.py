@@ -0,0 +1,250 @@
+import contextlib
+import importlib
+import importlib.util
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import traceback
+
+from .metrics import emit_metrics
+from .watchdog import RunTimeout, kill_process_group
+
+PLUGIN_FILE = 'plugin.py'
+'''Optional module in a benchmark directory exposing `prepare/run/report/clean(params)` callables, either
+as functions or as the methods of a `plugin` object such as a ScriptPlugin'''
+
+PLUGIN_PHASES = ['prepare', 'run', 'report', 'clean']
+
+SCRIPT_PLUGINS = ['compression', 'hashing']
+'''Benchmarks without a plugin.py whose run.py runs in process through a ScriptPlugin'''
+
+
+def params_to_argv(params: dict) -> list:
+    '''
+    Turn a plugin parameter dict back into the command line the benchmark's run.py would have received,
+    so plugins can reuse the argparse parser of their script.
+    '''
+    argv = []
+    for key, value in params.items():
+        if key == 'metrics':
+            argv.append(f"--metrics={json.dumps(value)}")
+            continue
+        if isinstance(value, list):
+            value = ','.join(map(str, value))
+        argv.extend([f"--{key}", str(value)])
+    return argv
+
+
+class ScriptPlugin:
+    '''
+    Runs a benchmark's run.py in process: `script` is the run.py module, whose `parse_arguments(argv)`
+    and `run_items(args)` do the work, `run_items` returning False on failure. Prepare, report and clean
+    still go through the scripts. Benchmarks listed in SCRIPT_PLUGINS get one without writing a plugin.py.
+    '''
+    def __init__(self, script):
+        self.script = script
+
+    def run(self, params: dict):
+        if self.script.run_items(self.script.parse_arguments(params_to_argv(params))) is False:
+            raise RuntimeError(f"benchmark run failed for {params}")
+
+
+def has_plugin(benchmark: str) -> bool:
+    return os.path.exists(os.path.join(benchmark, PLUGIN_FILE)) or os.path.basename(benchmark) in SCRIPT_PLUGINS
+
+
+def _load_plugin(benchmark: str):
+    '''The object whose methods, or the module whose functions, implement the benchmark's phases.'''
+    path = os.path.join(benchmark, PLUGIN_FILE)
+    if not os.path.exists(path):
+        return ScriptPlugin(importlib.import_module('run'))
+    spec = importlib.util.spec_from_file_location('dpbento_plugin', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return getattr(module, 'plugin', module)
+
+
+@contextlib.contextmanager
+def _redirect_output(log_path: str):
+    '''Point stdout and stderr of the worker, native children included, at `log_path` for one call.'''
+    if not log_path:
+        yield
+        return
+    os.makedirs(os.path.dirname(log_path) or '.', exist_ok=True)
+    sys.stdout.flush()
+    sys.stderr.flush()
+    saved = os.dup(1), os.dup(2)
+    log_fd = os.open(log_path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+    os.dup2(log_fd, 1)
+    os.dup2(log_fd, 2)
+    os.close(log_fd)
+    try:
+        yield
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.dup2(saved[0], 1)
+        os.dup2(saved[1], 2)
+        os.close(saved[0])
+        os.close(saved[1])
+
+
+def _worker_main(benchmark: str, conn):
+    '''
+    Entry point of a plugin worker process. Imports the plugin once and then serves phase calls until
+    it receives None. Runs in the benchmark directory's import context, like its scripts do.
+    '''
+    # own process group, so a timed out phase can be killed together with everything it started
+    os.setsid()
+    sys.path.insert(0, benchmark)
+    try:
+        plugin = _load_plugin(benchmark)
+    except Exception:
+        conn.send(('error', traceback.format_exc()))
+        return
+    conn.send(('ok', [phase for phase in PLUGIN_PHASES if callable(getattr(plugin, phase, None))]))
+
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            return
+        if request is None:
+            return
+
+        phase, params, cpus, env, log_path = request
+        saved_env = dict(os.environ)
+        # the next call may get other cpus or none at all
+        saved_cpus = os.sched_getaffinity(0)
+        try:
+            os.environ.update(env or {})
+            if cpus:
+                os.sched_setaffinity(0, cpus)
+            with _redirect_output(log_path):
+                result = getattr(plugin, phase)(params)
+            # returning a dict of metrics is shorthand for emit_metrics()
+            if isinstance(result, dict):
+                emit_metrics(result)
+            sys.stdout.flush()
+            conn.send(('ok', result))
+        except Exception:
+            conn.send(('error', traceback.format_exc()))
+        finally:
+            os.environ.clear()
+            os.environ.update(saved_env)
+            if cpus:
+                os.sched_setaffinity(0, saved_cpus)
+
+
+class PluginError(Exception):
+    pass
+
+
+class PluginWorker:
+    '''
+    A long-lived process that has imported one benchmark's plugin and runs its phases on request.
+    '''
+    # fork is unsafe while the scheduler's threads are running
+    _context = multiprocessing.get_context('spawn')
+
+    def __init__(self, benchmark: str):
+        self.benchmark = benchmark
+        self._conn, child_conn = self._context.Pipe()
+        self.process = self._context.Process(target=_worker_main, args=(benchmark, child_conn), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+        status, payload = self._receive()
+        if status != 'ok':
+            self.close()
+            raise PluginError(f"Failed to import plugin of {benchmark}:\n{payload}")
+        self.phases = payload
+        '''Phases the plugin implements, the others fall back to the benchmark's scripts'''
+
+    def _receive(self):
+        try:
+            return self._conn.recv()
+        except EOFError:
+            return 'error', f"plugin worker exited with code {self.process.exitcode}"
+
+    def call(self, phase: str, params: dict, cpus: list = None, env: dict = None, timeout: float = None,
+             log_path: str = None):
+        self._conn.send((phase, params, cpus, env, log_path))
+        if timeout is not None and not self._conn.poll(timeout):
+            # the worker is stuck in the phase, it cannot be reused
+            kill_process_group(self.process.pid, leader=self.process)
+            self.process.join()
+            raise RunTimeout(f"{phase} plugin of {self.benchmark}", timeout)
+        status, payload = self._receive()
+        if status != 'ok':
+            raise PluginError(payload)
+        return payload
+
+    def is_alive(self) -> bool:
+        return self.process.is_alive()
+
+    def close(self):
+        if self.process.is_alive():
+            try:
+                self._conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            self.process.join(timeout=5)
+        if self.process.is_alive():
+            kill_process_group(self.process.pid, grace=0)
+            self.process.join()
+        self._conn.close()
+
+
+class PluginPool:
+    '''
+    Keeps idle plugin workers per benchmark so consecutive combinations reuse an already warm
+    interpreter. Concurrent combinations of the same benchmark each get their own worker.
+    '''
+    def __init__(self):
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, benchmark: str) -> PluginWorker:
+        with self._lock:
+            idle = self._idle.setdefault(benchmark, [])
+            while idle:
+                worker = idle.pop()
+                if worker.is_alive():
+                    return worker
+                worker.close()
+        return PluginWorker(benchmark)
+
+    def release(self, worker: PluginWorker):
+        if not worker.is_alive():
+            worker.close()
+            return
+        with self._lock:
+            self._idle.setdefault(worker.benchmark, []).append(worker)
+
+    def call(self, benchmark: str, phase: str, params: dict, cpus: list = None, env: dict = None, on_start=None,
+             timeout: float = None, log_path: str = None):
+        '''
+        Run `phase` of the benchmark's plugin. Raises NotImplementedError if the plugin does not
+        implement the phase, so the caller can fall back to the script.
+        `on_start(pid)` is called with the pid of the worker process before the phase starts, the output
+        of the phase goes to `log_path` if given.
+        '''
+        worker = self.acquire(benchmark)
+        try:
+            if phase not in worker.phases:
+                raise NotImplementedError(phase)
+            if on_start:
+                on_start(worker.process.pid)
+            return worker.call(phase, params, cpus, env, timeout, log_path)
+        finally:
+            self.release(worker)
+
+    def close(self):
+        with self._lock:
+            for workers in self._idle.values():
+                for worker in workers:
+                    worker.close()
+            self._idle = {}
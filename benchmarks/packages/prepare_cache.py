@@ -0,0 +1,155 @@
+import glob
+import hashlib
+import importlib.metadata
+import json
+import os
+import shlex
+import subprocess
+import threading
+import time
+
+from .ledger import file_digest
+
+DEFAULT_PREPARE = {
+    'compute': {
+        'sources': ['int/*.c', 'float/*.c'],
+        'artifacts': ['int32', 'int8', 'int128', 'fp32', 'double'],
+        'toolchain': ['gcc --version'],
+        'deps': ['pandas'],
+    },
+    'memory': {
+        'sources': ['latency/*.c', 'bandwidth/*.c'],
+        'artifacts': ['pointer_chase', 'stream'],
+        'toolchain': ['gcc --version', 'sysbench --version'],
+        'deps': ['numpy', 'pandas', 'matplotlib'],
+    },
+    'BTree': {
+        'sources': ['YCSB-cpp/Makefile', 'YCSB-cpp/core/*.cc', 'YCSB-cpp/core/*.h', 'YCSB-cpp/lmdb/*.cc',
+                    'YCSB-cpp/lmdb/*.h', 'YCSB-cpp/utils/*'],
+        'artifacts': ['YCSB-cpp/ycsb'],
+        'toolchain': ['g++ --version', 'make --version'],
+    },
+    'KVS_BF3': {
+        'sources': ['YCSB/pom.xml', 'YCSB/core/src/**/*.java', 'YCSB/rocksdb/pom.xml', 'YCSB/rocksdb/src/**/*.java'],
+        'artifacts': ['YCSB/rocksdb/target/*.jar'],
+        'toolchain': ['mvn -v', 'java -version'],
+    },
+    'KVS_Farnet': {
+        'sources': ['YCSB/pom.xml', 'YCSB/core/src/**/*.java', 'YCSB/rocksdb/pom.xml', 'YCSB/rocksdb/src/**/*.java'],
+        'artifacts': ['YCSB/rocksdb/target/*.jar'],
+        'toolchain': ['mvn -v', 'java -version'],
+    },
+}
+'''
+What decides whether a benchmark's prepare.py must run again, per benchmark class. Overridable with a
+`prepare` section in the user config; benchmarks without one are prepared on every invocation.
+'''
+
+
+def prepare_spec(bench_class: str, config=None):
+    '''
+    The cache declaration of a benchmark: `sources` and `artifacts` (globs relative to the benchmark
+    directory), `toolchain` (commands printing the versions of the tools used) and `deps` (Python
+    distributions). `"prepare": false` in the config turns caching off, None means no caching.
+    '''
+    if config is False:
+        return None
+    if config is None:
+        return DEFAULT_PREPARE.get(bench_class)
+    return {**DEFAULT_PREPARE.get(bench_class, {}), **config}
+
+
+def expand(benchmark: str, patterns: list) -> list:
+    paths = set()
+    for pattern in patterns:
+        paths.update(path for path in glob.glob(os.path.join(benchmark, pattern), recursive=True) if os.path.isfile(path))
+    return sorted(paths)
+
+
+def tool_version(command: str) -> str:
+    '''Output of a version command such as `gcc --version`; 'missing' if the tool is not installed.'''
+    try:
+        result = subprocess.run(shlex.split(command), capture_output=True, text=True, timeout=60)
+    except (OSError, subprocess.TimeoutExpired):
+        return 'missing'
+    # java prints its version to stderr
+    return (result.stdout + result.stderr).strip()
+
+
+def dist_version(name: str) -> str:
+    try:
+        return importlib.metadata.version(name)
+    except importlib.metadata.PackageNotFoundError:
+        return 'missing'
+
+
+class PrepareCache:
+    '''
+    Remembers which benchmarks were prepared successfully, and with what inputs.
+
+    The key of a benchmark covers its prepare.py, the declared sources, the output of the toolchain
+    version commands, the versions of the declared Python dependencies and the host. Preparing is
+    skipped while the key is unchanged and every declared artifact still exists unmodified.
+    '''
+    def __init__(self, path: str, host: str = ''):
+        self.path = path
+        self.host = host
+        self.entries = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            try:
+                with open(path, 'r') as f:
+                    self.entries = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                self.entries = {}
+
+    def key_for(self, benchmark: str, spec: dict) -> str:
+        h = hashlib.sha256()
+        h.update(self.host.encode())
+        h.update(file_digest(os.path.join(benchmark, 'prepare.py')).encode())
+        for path in expand(benchmark, spec.get('sources', [])):
+            h.update(f"{os.path.relpath(path, benchmark)}:{file_digest(path)}".encode())
+        for command in spec.get('toolchain', []):
+            h.update(f"{command}:{tool_version(command)}".encode())
+        for dep in spec.get('deps', []):
+            h.update(f"{dep}:{dist_version(dep)}".encode())
+        return h.hexdigest()
+
+    def artifact_digests(self, benchmark: str, spec: dict):
+        '''Digests of the declared artifacts, or None if a pattern matches nothing.'''
+        digests = {}
+        for pattern in spec.get('artifacts', []):
+            paths = expand(benchmark, [pattern])
+            if not paths:
+                return None
+            for path in paths:
+                digests[os.path.relpath(path, benchmark)] = file_digest(path)
+        return digests
+
+    def is_up_to_date(self, name: str, key: str, benchmark: str, spec: dict) -> bool:
+        entry = self.entries.get(name)
+        if entry is None or entry['key'] != key:
+            return False
+        return self.artifact_digests(benchmark, spec) == entry['artifacts']
+
+    def record(self, name: str, key: str, benchmark: str, spec: dict):
+        artifacts = self.artifact_digests(benchmark, spec)
+        with self._lock:
+            if artifacts is None:
+                # prepare succeeded but did not produce what it declares, check again next time
+                self.entries.pop(name, None)
+            else:
+                self.entries[name] = {'key': key, 'artifacts': artifacts, 'prepared_at': time.time()}
+            self._save()
+
+    def invalidate(self, name: str):
+        with self._lock:
+            if self.entries.pop(name, None) is not None:
+                self._save()
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.entries, f, indent=2)
+        os.replace(tmp_path, self.path)
@@ -1,12 +1,15 @@
 import os
 import time
-import pandas as pd
-import duckdb
 from pathlib import Path
 from .runner import Runner
+from .lazy_import import lazy_import
+from .metrics import emit_metrics
 import subprocess
 import logging
 
+pd = lazy_import('pandas', install='pip3 install pandas')
+duckdb = lazy_import('duckdb', install='pip3 install duckdb')
+
 def drop_caches():
     try:
         # Sync the filesystem
@@ -67,6 +70,7 @@ class RDBRunner(Runner):
                 end_time = time.time()
 
                 run_time = end_time - start_time
+                emit_metrics({'run_time': run_time}, query=query_name, execution_mode=execution_mode)
                 results.append({
                     'Scale Factor': sf,
                     'Query': query_name,
@@ -88,6 +92,9 @@ class RDBRunner(Runner):
                     start_time = time.time()
                     conn.execute(cmd)
                     end_time = time.time()
+                    # every iteration is reported, the framework trims warm-up before aggregating
+                    emit_metrics({'run_time': end_time - start_time}, iteration=i, warmup=i == 0,
+                                 query=query_name, execution_mode=execution_mode)
                     if i > 0:  # Ignore the first run
                         run_times.append(end_time - start_time)
                 
@@ -0,0 +1,110 @@
+import inspect
+import math
+import statistics
+import time
+
+
+def t_critical(confidence: float, df: int) -> float:
+    '''
+    Two-sided Student t critical value, from the Cornish-Fisher expansion around the normal quantile.
+
+    Accurate to about 3% for df >= 2, which is plenty for deciding when to stop repeating.
+    '''
+    z = statistics.NormalDist().inv_cdf(0.5 + confidence / 2)
+    if df <= 0:
+        return math.inf
+    return (z
+            + (z ** 3 + z) / (4 * df)
+            + (5 * z ** 5 + 16 * z ** 3 + 3 * z) / (96 * df ** 2)
+            + (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / (384 * df ** 3))
+
+
+class RepetitionPolicy:
+    '''
+    When to stop repeating a combination, from the `repetition` section of a benchmark's config:
+
+        "repetition": {"metric": "latency", "target_ci": 0.05, "confidence": 0.95,
+                       "min_runs": 3, "max_runs": 20, "time_budget": 600}
+
+    Repetition stops once the confidence interval of the mean of `metric` is narrower than
+    `target_ci` times the mean, after `max_runs` runs, or once `time_budget` seconds were spent.
+    It also stops after `min_runs` if none of them reported `metric` at all.
+    '''
+    def __init__(self, metric: str = None, target_ci: float = 0.05, confidence: float = 0.95,
+                 min_runs: int = 3, max_runs: int = 20, time_budget: float = None):
+        self.metric = metric
+        self.target_ci = target_ci
+        self.confidence = confidence
+        # two samples give a single degree of freedom, the t value is far too large to ever converge
+        if min_runs < 3:
+            raise ValueError(f"'repetition' needs min_runs >= 3 to estimate a confidence interval, got {min_runs}")
+        self.min_runs = min_runs
+        self.max_runs = max(self.min_runs, max_runs)
+        self.time_budget = time_budget
+
+    @classmethod
+    def from_config(cls, config: dict):
+        '''Returns None when the benchmark did not ask for adaptive repetition, i.e. a single run.'''
+        if not config:
+            return None
+        if 'metric' not in config:
+            raise ValueError("'repetition' needs the name of the 'metric' that decides convergence")
+        unknown = sorted(set(config) - set(inspect.signature(cls).parameters))
+        if unknown:
+            raise ValueError(f"unknown repetition options {unknown}")
+        return cls(**config)
+
+
+class RepetitionController:
+    '''
+    Tracks the samples of the primary metric of one combination and decides whether to run it again.
+    '''
+    def __init__(self, policy: RepetitionPolicy):
+        self.policy = policy
+        self.samples = []
+        self.runs = 0
+        self.started = time.monotonic()
+        self.reason = None
+
+    def add(self, values: list):
+        '''Add the primary metric values reported by one run, runs without a value still count.'''
+        self.runs += 1
+        if values:
+            self.samples.append(statistics.fmean(values))
+
+    def relative_ci(self) -> float:
+        '''Half width of the confidence interval of the mean, relative to the mean.'''
+        n = len(self.samples)
+        if n < 2:
+            return math.inf
+        mean = statistics.fmean(self.samples)
+        if mean == 0:
+            return math.inf
+        half_width = t_critical(self.policy.confidence, n - 1) * statistics.stdev(self.samples) / math.sqrt(n)
+        return abs(half_width / mean)
+
+    def should_continue(self) -> bool:
+        if self.runs < self.policy.min_runs:
+            return True
+        if not self.samples:
+            # a misspelled metric, or output the benchmark's regex no longer matches: more runs won't help
+            self.reason = 'no_metric'
+            return False
+        if self.relative_ci() <= self.policy.target_ci:
+            self.reason = 'converged'
+            return False
+        if self.runs >= self.policy.max_runs:
+            self.reason = 'max_runs'
+            return False
+        if self.policy.time_budget is not None and time.monotonic() - self.started >= self.policy.time_budget:
+            self.reason = 'time_budget'
+            return False
+        return True
+
+    def summary(self) -> dict:
+        return {
+            'repetitions': self.runs,
+            'stop_reason': self.reason,
+            'mean': statistics.fmean(self.samples) if self.samples else None,
+            'relative_ci': self.relative_ci() if len(self.samples) > 1 else None,
+        }
@@ -0,0 +1,203 @@
+import argparse
+import csv
+import glob
+import os
+import threading
+import time
+import uuid
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.ipc as ipc
+except ImportError:
+    pa = None
+
+RESULT_FILE_SUFFIX = '.arrows'
+'''Each sweep writes one Arrow IPC stream, which stays readable even if the sweep dies mid-way'''
+
+
+def new_run_id() -> str:
+    return time.strftime('%Y%m%d-%H%M%S') + '-' + uuid.uuid4().hex[:6]
+
+
+def result_schema():
+    return pa.schema([
+        ('run_id', pa.string()),
+        ('timestamp', pa.timestamp('us')),
+        ('host', pa.string()),
+        ('benchmark', pa.string()),
+        ('status', pa.string()),
+        ('repetition', pa.int32()),
+        ('iteration', pa.int32()),
+        ('params', pa.map_(pa.string(), pa.string())),
+        ('labels', pa.map_(pa.string(), pa.string())),
+        ('metrics', pa.map_(pa.string(), pa.float64())),
+    ])
+
+
+class ResultStore:
+    '''
+    Typed, append-only result rows of one sweep, stored as `<directory>/<run_id>.arrows`.
+
+    A row is one measurement: run id, host, benchmark, parameter combination, status and a map of
+    metric values, plus the repetition/iteration it came from and optional labels that tell apart
+    several measurements of one run. Parameters and labels are stored as strings, metrics as floats.
+    Rows are buffered and written as record batches; `close()` (or `flush()`) makes them durable.
+    '''
+    def __init__(self, directory: str, run_id: str = None, host: str = None, batch_size: int = 256):
+        if pa is None:
+            raise ImportError("The result store needs pyarrow, install it with 'pip3 install pyarrow'")
+
+        self.directory = directory
+        self.run_id = run_id or new_run_id()
+        self.host = host or ''
+        self.batch_size = batch_size
+        self.path = os.path.join(directory, self.run_id + RESULT_FILE_SUFFIX)
+
+        self._schema = result_schema()
+        self._rows = []
+        self._writer = None
+        self._sink = None
+        self._lock = threading.Lock()
+
+    def append(self, benchmark: str, params: dict, metrics: dict, status: str = 'ok', repetition: int = 0,
+               iteration: int = None, labels: dict = None, timestamp: float = None):
+        row = {
+            'run_id': self.run_id,
+            'timestamp': int((timestamp or time.time()) * 1e6),
+            'host': self.host,
+            'benchmark': benchmark,
+            'status': status,
+            'repetition': repetition,
+            'iteration': iteration,
+            'params': {str(k): str(v) for k, v in params.items()},
+            'labels': {str(k): str(v) for k, v in (labels or {}).items()},
+            'metrics': {str(k): float(v) for k, v in metrics.items()},
+        }
+        with self._lock:
+            self._rows.append(row)
+            if len(self._rows) >= self.batch_size:
+                self._flush_locked()
+
+    def _flush_locked(self):
+        if not self._rows:
+            return
+        if self._writer is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._sink = open(self.path, 'wb')
+            self._writer = ipc.new_stream(self._sink, self._schema)
+        self._writer.write_batch(pa.RecordBatch.from_pylist(self._rows, schema=self._schema))
+        self._sink.flush()
+        self._rows = []
+
+    def flush(self):
+        '''Write the buffered rows and fsync them, e.g. before recording their combination as done.'''
+        with self._lock:
+            self._flush_locked()
+            if self._sink is not None:
+                os.fsync(self._sink.fileno())
+
+    def close(self):
+        with self._lock:
+            self._flush_locked()
+            if self._writer is not None:
+                self._writer.close()
+                self._sink.close()
+                self._writer = None
+
+
+def result_files(path: str) -> list:
+    '''`path` may be a single result file, a run id inside `output/results` or a directory of results.'''
+    if os.path.isdir(path):
+        return sorted(glob.glob(os.path.join(path, '*' + RESULT_FILE_SUFFIX)))
+    if not path.endswith(RESULT_FILE_SUFFIX) and os.path.exists(path + RESULT_FILE_SUFFIX):
+        path += RESULT_FILE_SUFFIX
+    return [path]
+
+
+def load_results(path: str):
+    '''Load every row under `path` (see `result_files`) into a single pyarrow Table.'''
+    if pa is None:
+        raise ImportError("Reading results needs pyarrow, install it with 'pip3 install pyarrow'")
+    tables = [ipc.open_stream(f).read_all() for f in result_files(path) if os.path.getsize(f) > 0]
+    if not tables:
+        return result_schema().empty_table()
+    return pa.concat_tables(tables)
+
+
+def query(path: str, benchmark: str = None, host: str = None, run_id: str = None, status: str = None,
+          params: dict = None, where=None):
+    '''
+    Rows under `path` matching all given predicates, as a pyarrow Table.
+
+    `params` matches parameter values by string equality, e.g. `{'block_sizes': '4k'}`.
+    `where` is an additional pyarrow compute expression, e.g. `pc.field('repetition') > 0`.
+    '''
+    table = load_results(path)
+    expression = None
+
+    def conjoin(condition):
+        nonlocal expression
+        expression = condition if expression is None else expression & condition
+
+    for column, value in (('benchmark', benchmark), ('host', host), ('run_id', run_id), ('status', status)):
+        if value is not None:
+            conjoin(pc.field(column) == value)
+    for key, value in (params or {}).items():
+        conjoin(pc.map_lookup(pc.field('params'), pa.scalar(str(key)), 'first') == str(value))
+    if where is not None:
+        conjoin(where)
+
+    return table if expression is None else table.filter(expression)
+
+
+def to_records(table) -> list:
+    '''Rows as plain dicts, with the map columns turned into dicts.'''
+    records = table.to_pylist()
+    for record in records:
+        for column in ('params', 'labels', 'metrics'):
+            record[column] = dict(record[column] or [])
+    return records
+
+
+def metric_column(table, metric: str):
+    '''Values of one metric as an array, null where a row did not report it.'''
+    return pc.map_lookup(table['metrics'], pa.scalar(metric), 'first')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Query dpbento result stores')
+    parser.add_argument('path', help='Result file, run id or directory, e.g. output/results')
+    parser.add_argument('--benchmark', type=str, help='Only rows of this benchmark, e.g. benchmarks/storage')
+    parser.add_argument('--host', type=str, help='Only rows of this host fingerprint')
+    parser.add_argument('--run_id', type=str, help='Only rows of this sweep')
+    parser.add_argument('--param', action='append', default=[], help='key=value parameter filter, repeatable')
+    parser.add_argument('--csv', type=str, help='Write the matching rows, one column per param/metric, to this file')
+    args = parser.parse_args()
+
+    params = dict(p.split('=', 1) for p in args.param)
+    records = to_records(query(args.path, benchmark=args.benchmark, host=args.host, run_id=args.run_id, params=params))
+
+    if not args.csv:
+        for record in records:
+            print(record)
+        return
+
+    param_keys = sorted({k for r in records for k in r['params']})
+    label_keys = sorted({k for r in records for k in r['labels']})
+    metric_keys = sorted({k for r in records for k in r['metrics']})
+    with open(args.csv, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['run_id', 'host', 'benchmark', 'status', 'repetition', 'iteration']
+                        + param_keys + label_keys + metric_keys)
+        for r in records:
+            writer.writerow([r['run_id'], r['host'], r['benchmark'], r['status'], r['repetition'], r['iteration']]
+                            + [r['params'].get(k, '') for k in param_keys]
+                            + [r['labels'].get(k, '') for k in label_keys]
+                            + [r['metrics'].get(k, '') for k in metric_keys])
+    print(f"Wrote {len(records)} rows to {args.csv}")
+
+
+if __name__ == '__main__':
+    main()
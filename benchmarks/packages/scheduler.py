@@ -0,0 +1,252 @@
+import heapq
+import os
+import threading
+import logging
+
+# Parameter names that benchmarks use for their degree of parallelism, used to guess how many
+# cores a combination needs when the config does not say so explicitly
+CORE_PARAM_KEYS = ['threads', 'thread', 'num_threads', 'numProc', 'multi']
+
+DEFAULT_RESOURCES = {
+    # fio hammers the disk, two storage runs on the same device measure each other
+    'storage': {'devices': ['disk']},
+    # lmdb / rocksdb / kuzu keep their databases on local disk
+    'BTree': {'devices': ['disk']},
+    'KVS_BF3': {'devices': ['disk']},
+    'KVS_Octeon': {'devices': ['disk']},
+    'GraphDB': {'devices': ['disk']},
+    # cold runs drop the page cache of the whole machine
+    'RDB': {'exclusive': True},
+    # talks to the host over the network and may prompt for a password
+    'communication': {'exclusive': True},
+}
+'''Resource requirements per benchmark class, overridable with `resources` in the user config'''
+
+
+class SweepItem:
+    '''
+    One parameter combination of a benchmark, i.e. one invocation of its run.py.
+    '''
+    def __init__(self, benchmark: str, params: list, opts: list, cores: int = 1, devices: list = None, exclusive: bool = False,
+                 key: str = None, allowed_cpus: list = None):
+        self.benchmark = benchmark
+        self.params = params
+        self.opts = opts
+        self.key = key
+        self.cores = cores
+        self.devices = devices or []
+        self.exclusive = exclusive
+        self.allowed_cpus = allowed_cpus
+        '''Cores the item's cpus must be picked from, e.g. one NUMA node; None allows any core'''
+
+    def __repr__(self):
+        return f"SweepItem({os.path.basename(self.benchmark)}, {dict(self.params)})"
+
+
+def resolve_resources(bench_class: str, params: list, resources: dict) -> dict:
+    '''
+    Work out the cores and devices a single combination needs.
+
+    `resources` comes from the user config and takes precedence over `DEFAULT_RESOURCES`.
+    A thread count of 0 conventionally means "use every core", which makes the item exclusive.
+    '''
+    merged = dict(DEFAULT_RESOURCES.get(bench_class, {}))
+    merged.update(resources)
+
+    cores = merged.get('cores')
+    exclusive = bool(merged.get('exclusive', False))
+    if cores is None:
+        cores = 1
+        for key, value in params:
+            if key not in CORE_PARAM_KEYS:
+                continue
+            try:
+                value = int(value)
+            except (TypeError, ValueError):
+                continue
+            if value == 0:
+                exclusive = True
+            cores = max(cores, value)
+
+    return {'cores': int(cores), 'devices': list(merged.get('devices', [])), 'exclusive': exclusive}
+
+
+class SweepScheduler:
+    '''
+    Runs sweep items concurrently on a bounded pool of worker threads.
+
+    Every item holds its cores and devices exclusively while it runs: an item only starts once enough
+    cores are free and none of its devices is in use. Items are started in submission order, but a
+    blocked item may be overtaken by later ones that fit (backfilling) at most `max_skips` times,
+    after which the scheduler waits for it so large items are not starved.
+    '''
+    def __init__(self, max_workers: int = 1, cpus: list = None, max_skips: int = None, logger=None):
+        self.max_workers = max(1, max_workers)
+        self.cpus = sorted(cpus if cpus is not None else os.sched_getaffinity(0))
+        self.max_skips = max_skips if max_skips is not None else 2 * self.max_workers
+        self.logger = logger or logging.getLogger('dpbento')
+
+        self._free_cpus = list(self.cpus)
+        self._busy_devices = set()
+        self._running = 0
+        self._cond = threading.Condition()
+
+    def _try_acquire(self, item: SweepItem):
+        '''Returns the list of cpus assigned to `item`, or None if it cannot start yet. Caller holds the lock.'''
+        if self._running >= self.max_workers:
+            return None
+        if any(device in self._busy_devices for device in item.devices):
+            return None
+
+        if item.exclusive:
+            if len(self._free_cpus) < len(self.cpus):
+                return None
+            cpus = list(self._free_cpus)
+        else:
+            usable = [cpu for cpu in self._free_cpus if cpu in item.allowed_cpus] if item.allowed_cpus else self._free_cpus
+            wanted = min(item.cores, len(item.allowed_cpus or self.cpus))
+            if len(usable) < wanted:
+                return None
+            cpus = usable[:wanted]
+
+        self._free_cpus = [cpu for cpu in self._free_cpus if cpu not in cpus]
+        self._busy_devices.update(item.devices)
+        self._running += 1
+        return cpus
+
+    def fits(self, item: SweepItem) -> bool:
+        '''Whether `item` can start at all on this scheduler's cores, given that nothing else runs.'''
+        if item.exclusive or not item.allowed_cpus:
+            return True
+        return len(set(item.allowed_cpus) & set(self.cpus)) >= min(item.cores, len(item.allowed_cpus))
+
+    def _release(self, item: SweepItem, cpus: list):
+        with self._cond:
+            self._free_cpus = sorted(self._free_cpus + cpus)
+            self._busy_devices.difference_update(item.devices)
+            self._running -= 1
+            self._cond.notify_all()
+
+    def _worker(self, index: int, item: SweepItem, cpus: list, execute, results: dict):
+        try:
+            results[index] = execute(item, cpus)
+        except Exception as e:
+            self.logger.error(f"Sweep item {item} raised: {e}")
+            results[index] = False
+        finally:
+            self._release(item, cpus)
+
+    def _start_next(self, pending: list, skips: int):
+        '''
+        Pick the next item of `pending`, a list of (index, item), that can start and acquire its resources.
+        Caller holds the lock.
+
+        Returns (position in pending, cpus), or None if nothing fits until a running item finishes.
+        '''
+        # only the head of the queue may be considered once it has been overtaken too often
+        candidates = pending[:1] if skips >= self.max_skips else pending
+        for idx, (_, item) in enumerate(candidates):
+            cpus = self._try_acquire(item)
+            if cpus is not None:
+                return idx, cpus
+        return None
+
+    def _reject(self, index: int, item: SweepItem, reason: str, results: dict, on_reject):
+        self.logger.error(f"Sweep item {item} cannot run: {reason}")
+        results[index] = False
+        if on_reject:
+            on_reject(item, reason)
+
+    def run(self, items, execute, on_reject=None) -> list:
+        '''
+        Run `execute(item, cpus)` for every item and block until all of them finished.
+
+        `items` may be any iterable, e.g. a generator expanding a parameter space: it is only read as far
+        ahead as backfilling can look, `max_workers + max_skips` items, so a large sweep is never held in
+        memory. Items that can never start, e.g. pinned to cores outside the scheduler's pool, fail without
+        running and are passed to `on_reject(item, reason)`. Returns the list of return values of `execute`,
+        False for rejected items, in the same order as `items`.
+        '''
+        items = iter(items)
+        lookahead = self.max_workers + self.max_skips
+        results = {}
+        read = 0
+        pending = []
+        threads = []
+        skips = 0
+
+        with self._cond:
+            while True:
+                while len(pending) < lookahead:
+                    item = next(items, None)
+                    if item is None:
+                        break
+                    index, read = read, read + 1
+                    if self.fits(item):
+                        pending.append((index, item))
+                    else:
+                        self._reject(index, item, f"needs {min(item.cores, len(item.allowed_cpus))} of cpus "
+                                                  f"{item.allowed_cpus}, but only cpus {self.cpus} are available",
+                                     results, on_reject)
+                if not pending:
+                    break
+
+                started = self._start_next(pending, skips)
+                if started is None and self._running == 0:
+                    # nothing running will free anything up, the head of the queue would wait forever
+                    self._reject(*pending.pop(0), "its cores and devices never became free", results, on_reject)
+                    skips = 0
+                    continue
+                if started is None:
+                    self._cond.wait()
+                    continue
+
+                idx, cpus = started
+                index, item = pending.pop(idx)
+                skips = skips + 1 if idx > 0 else 0
+                self.logger.debug(f"Starting {item} on cpus {cpus}")
+                thread = threading.Thread(target=self._worker, args=(index, item, cpus, execute, results), daemon=True)
+                threads.append(thread)
+                thread.start()
+                # finished threads have stored their result, only keep the running ones
+                threads = [thread for thread in threads if thread.is_alive()]
+
+        for thread in threads:
+            thread.join()
+
+        return [results.get(index, False) for index in range(read)]
+
+    def simulate(self, items: list, durations: list) -> list:
+        '''
+        Replay the scheduling decisions `run` would make if item i took `durations[i]` seconds,
+        without running anything.
+
+        Returns a list of (start, end, item, cpus) in the order the items would be started, leaving out
+        items that `run` would reject.
+        '''
+        pending = [(index, item) for index, item in enumerate(items) if self.fits(item)]
+        running = []
+        schedule = []
+        clock = 0.0
+        skips = 0
+
+        while pending or running:
+            started = self._start_next(pending, skips) if pending else None
+            if started is None and not running:
+                # would be rejected by `run`, it is not in the schedule
+                pending.pop(0)
+                skips = 0
+                continue
+            if started is None:
+                # advance to the next item that finishes and give its resources back
+                clock, _, item, cpus = heapq.heappop(running)
+                self._release(item, cpus)
+                continue
+
+            idx, cpus = started
+            index, item = pending.pop(idx)
+            skips = skips + 1 if idx > 0 else 0
+            end = clock + durations[index]
+            heapq.heappush(running, (end, len(schedule), item, cpus))
+            schedule.append((clock, end, item, cpus))
+        return schedule
@@ -0,0 +1,202 @@
+import collections
+import json
+import os
+import threading
+import time
+
+SECTOR_SIZE = 512
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+
+SERIES = ['time', 'cpu_util', 'cpu_iowait', 'mem_used', 'mem_available',
+          'disk_read_bps', 'disk_write_bps', 'net_rx_bps', 'net_tx_bps', 'proc_cpu_util', 'proc_rss']
+'''Columns of a telemetry time series; rates are per second, memory in bytes, utilisations in percent'''
+
+
+def read_cpu_times():
+    '''Returns (busy, iowait, total) jiffies summed over all cpus.'''
+    with open('/proc/stat', 'r') as f:
+        fields = [int(v) for v in f.readline().split()[1:]]
+    # user nice system idle iowait irq softirq steal [guest guest_nice are already in user/nice]
+    idle, iowait = fields[3], fields[4]
+    total = sum(fields[:8])
+    return total - idle - iowait, iowait, total
+
+
+def read_meminfo():
+    '''Returns (used, available) bytes.'''
+    info = {}
+    with open('/proc/meminfo', 'r') as f:
+        for line in f:
+            key, value = line.split(':', 1)
+            info[key] = int(value.split()[0]) * 1024
+    available = info.get('MemAvailable', info.get('MemFree', 0))
+    return info['MemTotal'] - available, available
+
+
+def read_diskstats():
+    '''Returns (read, written) bytes summed over whole disks, partitions would count twice.'''
+    read = written = 0
+    with open('/proc/diskstats', 'r') as f:
+        for line in f:
+            fields = line.split()
+            name = fields[2]
+            if name.startswith(('loop', 'ram')) or not os.path.exists(f'/sys/block/{name}'):
+                continue
+            read += int(fields[5]) * SECTOR_SIZE
+            written += int(fields[9]) * SECTOR_SIZE
+    return read, written
+
+
+def read_net_dev():
+    '''Returns (received, transmitted) bytes summed over all interfaces but loopback.'''
+    rx = tx = 0
+    with open('/proc/net/dev', 'r') as f:
+        for line in f.readlines()[2:]:
+            iface, data = line.split(':', 1)
+            if iface.strip() == 'lo':
+                continue
+            fields = data.split()
+            rx += int(fields[0])
+            tx += int(fields[8])
+    return rx, tx
+
+
+def process_tree(pid: int) -> list:
+    '''`pid` and all its live descendants.'''
+    pids = [pid]
+    i = 0
+    while i < len(pids):
+        try:
+            for task in os.listdir(f'/proc/{pids[i]}/task'):
+                with open(f'/proc/{pids[i]}/task/{task}/children', 'r') as f:
+                    pids.extend(int(child) for child in f.read().split())
+        except OSError:
+            pass
+        i += 1
+    return pids
+
+
+def read_process_tree(pid: int):
+    '''Returns (cpu jiffies, rss bytes) of the process tree rooted at `pid`, including reaped children.'''
+    cpu = rss = 0
+    for i, p in enumerate(process_tree(pid)):
+        try:
+            with open(f'/proc/{p}/stat', 'r') as f:
+                # the command name may contain spaces, the fixed fields start after its closing paren
+                fields = f.read().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        utime, stime, cutime, cstime = (int(v) for v in fields[11:15])
+        # only the root's cutime/cstime, otherwise children that exited are counted at every level
+        cpu += utime + stime + (cutime + cstime if i == 0 else 0)
+        rss += int(fields[21]) * PAGE_SIZE
+    return cpu, rss
+
+
+class TelemetrySampler:
+    '''
+    Samples system-wide CPU, memory, disk and network counters, plus CPU and RSS of one process tree,
+    from /proc in a background thread.
+
+    Each series is kept in its own ring buffer of `capacity` samples, so a long run keeps only the most
+    recent `capacity * interval` seconds. `pid` may be set after starting, once the process exists.
+    '''
+    def __init__(self, interval: float = 1.0, capacity: int = 3600, pid: int = None):
+        self.interval = interval
+        self.pid = pid
+        self.series = {name: collections.deque(maxlen=capacity) for name in SERIES}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._previous = None
+        self._lock = threading.Lock()
+
+    def _read(self):
+        busy, iowait, total = read_cpu_times()
+        disk_read, disk_written = read_diskstats()
+        net_rx, net_tx = read_net_dev()
+        proc_cpu, proc_rss = read_process_tree(self.pid) if self.pid else (0, 0)
+        return {
+            'time': time.monotonic(), 'busy': busy, 'iowait': iowait, 'total': total,
+            'disk_read': disk_read, 'disk_written': disk_written, 'net_rx': net_rx, 'net_tx': net_tx,
+            'proc_cpu': proc_cpu, 'proc_rss': proc_rss,
+        }
+
+    def sample(self):
+        '''Take one sample, the first one only sets the baseline for the rates.'''
+        with self._lock:
+            current = self._read()
+            previous, self._previous = self._previous, current
+        used, available = read_meminfo()
+        if previous is None:
+            return
+
+        elapsed = current['time'] - previous['time']
+        jiffies = max(current['total'] - previous['total'], 1)
+        values = {
+            'time': current['time'],
+            'cpu_util': 100.0 * (current['busy'] - previous['busy']) / jiffies,
+            'cpu_iowait': 100.0 * (current['iowait'] - previous['iowait']) / jiffies,
+            'mem_used': used,
+            'mem_available': available,
+            'disk_read_bps': (current['disk_read'] - previous['disk_read']) / elapsed,
+            'disk_write_bps': (current['disk_written'] - previous['disk_written']) / elapsed,
+            'net_rx_bps': (current['net_rx'] - previous['net_rx']) / elapsed,
+            'net_tx_bps': (current['net_tx'] - previous['net_tx']) / elapsed,
+            # relative to one core, like top: 200% is two busy cores
+            'proc_cpu_util': 100.0 * max(current['proc_cpu'] - previous['proc_cpu'], 0) / CLOCK_TICKS / elapsed,
+            'proc_rss': current['proc_rss'],
+        }
+        for name, value in values.items():
+            self.series[name].append(value)
+
+    def _run(self):
+        while True:
+            try:
+                self.sample()
+            except (OSError, ValueError, IndexError):
+                # counters of a process that just exited, or a /proc file missing in a container
+                pass
+            if self._stop.wait(self.interval):
+                return
+
+    def attach(self, pid: int):
+        '''Follow the process tree of `pid` from the next sample on.'''
+        with self._lock:
+            self.pid = pid
+            if self._previous is not None:
+                # the baseline must be the new tree's CPU time so far, or the next delta is all of it,
+                # minutes of CPU for a long-lived plugin worker
+                self._previous['proc_cpu'], self._previous['proc_rss'] = read_process_tree(pid)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        try:
+            self.sample()
+        except (OSError, ValueError, IndexError):
+            pass
+
+    def summary(self) -> dict:
+        '''Mean and maximum of every series, e.g. `cpu_util_mean` and `mem_used_max`.'''
+        summary = {}
+        for name, values in self.series.items():
+            if name == 'time' or not values:
+                continue
+            summary[f'{name}_mean'] = sum(values) / len(values)
+            summary[f'{name}_max'] = max(values)
+        return summary
+
+    def save(self, path: str):
+        '''Store the time series as JSON columns, with times relative to the first sample.'''
+        series = {name: list(values) for name, values in self.series.items()}
+        if series['time']:
+            start = series['time'][0]
+            series['time'] = [round(t - start, 6) for t in series['time']]
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump({'interval': self.interval, 'series': series}, f)
@@ -0,0 +1,102 @@
+import inspect
+import statistics
+
+WARMUP_LABEL = 'warmup'
+'''Label of result rows that were measured during warm-up and are left out of comparisons'''
+
+
+def mser_truncation(values: list, batch: int = 1, max_fraction: float = 0.5):
+    '''
+    Number of leading values to drop so the rest is in steady state, by the MSER rule: the truncation
+    point minimizes the squared standard error of the mean of what remains, sum((x - mean)^2) / (n - d)^2.
+
+    With `batch` > 1 the rule runs on means of consecutive batches (MSER-5 for batch=5), which smooths
+    noisy series. None if the truncation point lies beyond `max_fraction` of the series, i.e. it did not
+    reach a steady state.
+    '''
+    if batch > 1:
+        values = [statistics.fmean(values[i:i + batch]) for i in range(0, len(values) - batch + 1, batch)]
+    n = len(values)
+    if n < 4:
+        return 0
+    best, best_d = None, 0
+    # the last few values always look steady, they are no evidence on their own
+    for d in range(n - 3):
+        rest = values[d:]
+        mean = statistics.fmean(rest)
+        score = sum((x - mean) ** 2 for x in rest) / (n - d) ** 2
+        if best is None or score < best:
+            best, best_d = score, d
+    if best_d > n * max_fraction:
+        return None
+    return best_d * batch
+
+
+class WarmupPolicy:
+    '''
+    Which iterations of a run are warm-up, from the `warmup` section of a benchmark's config:
+
+        "warmup": {"discard": 2}
+        "warmup": {"method": "mser", "metric": "run_time", "batch": 1, "max_fraction": 0.5}
+
+    Benchmarks declare iteration boundaries by reporting metrics with `emit_metrics(..., iteration=i)`.
+    Records that share labels form one series, ordered by iteration; records without an iteration are
+    whole-run measurements and never trimmed. `fixed` marks the first `discard` iterations of every
+    series as warm-up, `mser` detects where the series of `metric` (default: the first reported metric)
+    becomes stationary. Iterations a benchmark reports with `warmup=True` are always warm-up.
+    '''
+    METHODS = ['fixed', 'mser']
+
+    def __init__(self, method: str = 'fixed', discard: int = 0, metric: str = None, batch: int = 1,
+                 max_fraction: float = 0.5):
+        if method not in self.METHODS:
+            raise ValueError(f"warmup method must be one of {self.METHODS}")
+        self.method = method
+        self.discard = discard
+        self.metric = metric
+        self.batch = batch
+        self.max_fraction = max_fraction
+        self.unsteady = []
+
+    @classmethod
+    def from_config(cls, config: dict):
+        '''Returns None when the benchmark keeps all its iterations.'''
+        if not config:
+            return None
+        unknown = sorted(set(config) - set(inspect.signature(cls).parameters))
+        if unknown:
+            raise ValueError(f"unknown warmup options {unknown}")
+        return cls(**config)
+
+    def warmup_count(self, series: list):
+        '''Leading iterations of `series` that are warm-up, None if it never reached a steady state.'''
+        if self.method == 'fixed':
+            return self.discard
+        metric = self.metric or next(iter(series[0]['metrics']), None)
+        values = [record['metrics'][metric] for record in series if metric in record['metrics']]
+        if len(values) != len(series):
+            # iterations without the metric cannot be placed in its time series
+            return 0
+        return mser_truncation(values, self.batch, self.max_fraction)
+
+    def mark(self, records: list) -> int:
+        '''
+        Flag the warm-up records of one run with `warmup`, returns how many were flagged. Labels of series
+        that never reached a steady state are left in `unsteady`, those series are kept whole.
+        '''
+        self.unsteady = []
+        series = {}
+        for record in records:
+            if record.get('iteration') is not None and not record.get('warmup'):
+                series.setdefault(tuple(sorted((record.get('labels') or {}).items())), []).append(record)
+        marked = 0
+        for records_of_series in series.values():
+            records_of_series.sort(key=lambda record: record['iteration'])
+            count = self.warmup_count(records_of_series)
+            if count is None:
+                self.unsteady.append(dict(records_of_series[0].get('labels') or {}))
+                continue
+            for record in records_of_series[:count]:
+                record['warmup'] = True
+                marked += 1
+        return marked
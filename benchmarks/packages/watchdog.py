@@ -0,0 +1,116 @@
+import os
+import signal
+import subprocess
+import time
+
+from .param_space import Expression, seconds
+
+KILL_GRACE_PERIOD = 10.0
+'''Seconds a timed out process group gets to exit after SIGTERM before it is killed'''
+
+
+class RunTimeout(Exception):
+    '''A benchmark phase ran longer than its timeout and was killed.'''
+    def __init__(self, command, timeout: float):
+        super().__init__(f"{command} timed out after {timeout:g}s")
+        self.command = command
+        self.timeout = timeout
+
+
+def resolve_timeout(value, params: dict):
+    '''
+    Seconds a run of `params` may take, from a `timeout` config value: a number, a duration such as
+    `"30m"`, or an expression over the parameters such as `"seconds(runtime) * runtimes * 2 + 120"`.
+    None means no timeout.
+    '''
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return seconds(value)
+    except ValueError:
+        return float(Expression(value)(params))
+
+
+def check_timeout(value):
+    '''
+    Return a `timeout` config value unchanged if `resolve_timeout` can use it, so that a typo fails when
+    the config is loaded rather than in every run; raises ValueError otherwise.
+    '''
+    if value is None:
+        return value
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise ValueError(f"not a timeout: {value!r}")
+    if isinstance(value, str):
+        try:
+            seconds(value)
+        except ValueError:
+            try:
+                Expression(value)
+            except ValueError as e:
+                raise ValueError(f"invalid timeout {value!r}: {e}")
+    elif value <= 0:
+        raise ValueError(f"timeout must be positive: {value!r}")
+    return value
+
+
+def group_exists(pgid: int) -> bool:
+    try:
+        os.killpg(pgid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def signal_group(pgid: int, sig):
+    try:
+        os.killpg(pgid, sig)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def kill_process_group(pgid: int, grace: float = KILL_GRACE_PERIOD, leader=None):
+    '''
+    SIGTERM every process of the group, then SIGKILL whatever is left after `grace` seconds.
+    `leader` is our Popen/Process of the group leader, reaped while waiting so its zombie does not keep
+    the group alive.
+    '''
+    signal_group(pgid, signal.SIGTERM)
+    deadline = time.monotonic() + grace
+    while time.monotonic() < deadline and group_exists(pgid):
+        if isinstance(leader, subprocess.Popen):
+            leader.poll()
+        elif leader is not None:
+            # a multiprocessing.Process
+            leader.join(0)
+        time.sleep(0.1)
+    signal_group(pgid, signal.SIGKILL)
+
+
+def wait_process_group(process: subprocess.Popen, timeout: float = None, grace: float = KILL_GRACE_PERIOD) -> int:
+    '''
+    Wait for `process`, which must lead its own process group (`start_new_session=True`), for at most
+    `timeout` seconds, and returns its exit code.
+
+    On timeout, or if the waiting is interrupted, the whole group is killed, so children started through
+    a shell go as well. Processes the run left behind in its group, e.g. background jobs of a script that
+    already exited, are killed once it exits.
+    '''
+    pgid = process.pid
+    try:
+        returncode = process.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        kill_process_group(pgid, grace, process)
+        process.wait()
+        raise RunTimeout(process.args, timeout)
+    except BaseException:
+        kill_process_group(pgid, grace, process)
+        process.wait()
+        raise
+
+    if group_exists(pgid):
+        signal_group(pgid, signal.SIGKILL)
+    return returncode
@@ -8,8 +8,6 @@ import io
 import subprocess
 import re
 import csv
-import zlib_ng
-from zlib_ng import gzip_ng_threaded, gzip_ng
 import zlib
 from time import perf_counter_ns
 
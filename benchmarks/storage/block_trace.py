@@ -0,0 +1,114 @@
+import threading
+import time
+
+TRACE_ALIGNMENT = 4096
+'''Offsets and lengths of a replayed trace are aligned to this for O_DIRECT'''
+FIO_IOLOG_HEADER = "fio version 3 iolog"
+FIO_IOLOG_FILE = "trace"
+'''File name in converted fio iologs; fio's --replay_redirect sends the I/O to the test file instead'''
+
+
+def read_trace(path: str):
+    '''
+    Records of a block trace, streamed from a file of `offset,len,op,timestamp` lines: byte offset and
+    length, `R` or `W` (or `read`, `write`), and a timestamp in seconds from any fixed point. Blank lines,
+    lines starting with `#` and a header line are skipped. Yields (offset, length, write, timestamp).
+    '''
+    with open(path, 'r') as f:
+        for number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            fields = [field.strip() for field in line.split(',')]
+            if number == 1 and not fields[0].isdigit():
+                continue
+            try:
+                offset, length, op, timestamp = fields
+                op = op.lower()
+                if op not in ('r', 'w', 'read', 'write'):
+                    raise ValueError(f"unknown op {op!r}")
+                yield int(offset), int(length), op[0] == 'w', float(timestamp)
+            except ValueError as e:
+                raise ValueError(f"{path}:{number}: expected offset,len,op,timestamp: {e}") from e
+
+
+class TraceReader:
+    '''
+    I/Os of a block trace for a test file of `file_size` bytes, read as they are needed rather than loaded.
+    Offsets wrap around the file; with `direct` offsets and lengths are aligned to TRACE_ALIGNMENT, as
+    O_DIRECT needs. With `timing` every I/O is due at its timestamp relative to the first one, otherwise
+    the I/Os go as fast as the slots allow. Several threads can take I/Os from one reader.
+
+    Opening a reader scans the trace once for its longest I/O, which sizes the buffers, and whether it writes.
+    '''
+    def __init__(self, path: str, file_size: int, direct: bool = True, timing: bool = True):
+        self.path = path
+        self.file_size = file_size
+        self.direct = direct
+        self.timing = timing
+        self.count = 0
+        self.max_length = 0
+        self.writes = False
+        for offset, length, write, timestamp in read_trace(path):
+            self.count += 1
+            self.max_length = max(self.max_length, self.align_length(length))
+            self.writes = self.writes or write
+        if not self.count:
+            raise ValueError(f"{path} has no I/O")
+        if self.max_length > file_size:
+            raise ValueError(f"{path} has an I/O of {self.max_length} bytes, larger than the size {file_size}")
+        self._records = read_trace(path)
+        self._lock = threading.Lock()
+        self._first = None
+        self._start = None
+
+    def align_length(self, length: int) -> int:
+        if self.direct:
+            return max(-(-length // TRACE_ALIGNMENT) * TRACE_ALIGNMENT, TRACE_ALIGNMENT)
+        return max(length, 1)
+
+    def place(self, offset: int, length: int) -> tuple:
+        '''Offset and length of a traced I/O in the test file.'''
+        length = self.align_length(length)
+        offset %= self.file_size
+        if offset + length > self.file_size:
+            offset = self.file_size - length
+        if self.direct:
+            offset -= offset % TRACE_ALIGNMENT
+        return offset, length
+
+    def next_io(self):
+        '''(offset, length, write, due) of the next I/O, None at the end of the trace; see `NativeJob.next_io`.'''
+        with self._lock:
+            record = next(self._records, None)
+            if record is None:
+                return None
+            offset, length, write, timestamp = record
+            if self._first is None:
+                self._first = timestamp
+                self._start = time.perf_counter_ns()
+        offset, length = self.place(offset, length)
+        due = self._start + int((timestamp - self._first) * 1e9) if self.timing else None
+        return offset, length, write, due
+
+    def close(self):
+        self._records.close()
+
+
+def write_fio_iolog(trace_path: str, iolog_path: str, file_size: int, direct: bool = True):
+    '''
+    Convert a trace to a version 3 fio iolog of the same I/Os, placed in the test file as `TraceReader` does.
+    fio's iolog timestamps are in milliseconds, finer timing in the trace is rounded to that.
+    '''
+    reader = TraceReader(trace_path, file_size, direct)
+    first = None
+    with open(iolog_path, 'w') as f:
+        f.write(f"{FIO_IOLOG_HEADER}\n0 {FIO_IOLOG_FILE} add\n0 {FIO_IOLOG_FILE} open\n")
+        for offset, length, write, timestamp in read_trace(trace_path):
+            first = timestamp if first is None else first
+            offset, length = reader.place(offset, length)
+            milliseconds = int(round((timestamp - first) * 1e3))
+            f.write(f"{milliseconds} {FIO_IOLOG_FILE} {'write' if write else 'read'} {offset} {length}\n")
+        f.write(f"{milliseconds} {FIO_IOLOG_FILE} close\n")
+    reader.close()
+    return iolog_path
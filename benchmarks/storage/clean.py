@@ -3,6 +3,8 @@ import shutil
 import subprocess
 import logging
 
+from file_pool import POOL_DIRECTORY
+
 def run_command(command, check=True, shell=False):
     """Run a shell command."""
     logging.info(f"Running command: {' '.join(command)}")
@@ -71,6 +73,9 @@ def main():
     output_path = os.path.join(script_dir, 'output')
     remove_directory(output_path)
 
+    # Remove the test-file pool, it is kept between runs and holds size x numProc bytes per combination
+    remove_directory(os.path.join(script_dir, POOL_DIRECTORY))
+
     # Uninstall packages
     remove_package('fio')
     remove_package('python3-pip')
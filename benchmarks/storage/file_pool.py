@@ -0,0 +1,88 @@
+import json
+import math
+import os
+import shutil
+import sys
+
+base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+if base_dir not in sys.path:
+    sys.path.append(base_dir)
+
+from benchmarks.packages.param_space import size as parse_size
+from native_engine import is_block_device, layout_file, run_native
+
+POOL_DIRECTORY = "fio_test"
+'''Directory of the test-file pool, in the storage benchmark's directory or on each of its devices'''
+POOL_NAME = "pool"
+'''Test files are <POOL_NAME>.<job>.0, fio's default naming for a job of that name'''
+FIO_FILENAME_FORMAT = f"{POOL_NAME}.$jobnum.$filenum"
+'''fio's --filename_format for pool files, whatever the job is called'''
+LAYOUT_FILE = ".layout.json"
+PRECONDITION_BLOCK_SIZE = "128k"
+
+
+def pool_directory(root: str, size, numjobs: int) -> str:
+    '''Where the files of `numjobs` jobs of `size` bytes each live in the pool at `root`.'''
+    return os.path.join(root, f"{parse_size(size)}_{numjobs}")
+
+
+def pool_file(directory: str, job: int) -> str:
+    return os.path.join(directory, f"{POOL_NAME}.{job}.0")
+
+
+def read_layout(directory: str) -> dict:
+    try:
+        with open(os.path.join(directory, LAYOUT_FILE), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def files_present(directory: str, file_size: int, numjobs: int) -> bool:
+    paths = [pool_file(directory, j) for j in range(numjobs)]
+    return all(os.path.exists(path) and os.path.getsize(path) >= file_size for path in paths)
+
+
+def prepare_pool(root: str, size, numjobs: int, precondition: int = 0, direct: bool = True) -> str:
+    '''
+    Directory of test files for `numjobs` jobs of `size` bytes, laid out on first use and reused by every
+    test, block size and repetition after that. Runs write into them in place and never remove them.
+
+    `precondition` passes of random writes over every file bring SSDs towards steady state before the first
+    measurement: a freshly trimmed drive writes faster than one whose flash has been written over. A pool is
+    preconditioned once; asking for more passes than it had adds the missing ones. `LAYOUT_FILE` is written
+    last, so a layout that was interrupted is redone. A block device is not a pool, it is returned as it is.
+    '''
+    if is_block_device(root):
+        return root
+    file_size = parse_size(size)
+    directory = pool_directory(root, size, numjobs)
+    layout = read_layout(directory)
+    if layout.get('size') == file_size and layout.get('numjobs') == numjobs and files_present(directory, file_size, numjobs):
+        if layout.get('preconditioned', 0) >= precondition:
+            return directory
+        passes = precondition - layout.get('preconditioned', 0)
+    else:
+        os.makedirs(directory, exist_ok=True)
+        if os.path.exists(os.path.join(directory, LAYOUT_FILE)):
+            os.remove(os.path.join(directory, LAYOUT_FILE))
+        for j in range(numjobs):
+            layout_file(pool_file(directory, j), file_size)
+        layout = {'size': file_size, 'numjobs': numjobs, 'preconditioned': 0}
+        passes = precondition
+
+    for _ in range(passes):
+        # one pass writes as many blocks as the files have, at random offsets
+        run_native('randwrite', PRECONDITION_BLOCK_SIZE, numjobs, file_size, math.inf, 32, directory,
+                   name=POOL_NAME, direct=direct, keep_files=True)
+        layout['preconditioned'] += 1
+
+    with open(os.path.join(directory, LAYOUT_FILE), 'w') as f:
+        json.dump(layout, f)
+    return directory
+
+
+def remove_pool(root: str):
+    if os.path.isdir(root):
+        shutil.rmtree(root)
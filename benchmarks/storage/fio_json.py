@@ -0,0 +1,68 @@
+import json
+import logging
+import os
+import sys
+
+base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+if base_dir not in sys.path:
+    sys.path.append(base_dir)
+
+from benchmarks.packages.histogram import LatencyHistogram
+
+DIRECTIONS = ('read', 'write')
+
+
+def load_fio_json(text: str) -> dict:
+    '''fio's --output-format=json+ output, skipping anything fio printed before the JSON document.'''
+    start = text.find('{')
+    if start < 0:
+        raise ValueError("fio printed no JSON")
+    return json.loads(text[start:])
+
+
+def latency_histogram(section: dict) -> LatencyHistogram:
+    '''Completion latency histogram of one direction of a fio job; fio before 3.0 reported it in usec.'''
+    if 'clat_ns' in section:
+        return LatencyHistogram.from_dict(section['clat_ns'])
+    clat = section.get('clat') or {}
+    if not clat.get('N'):
+        return LatencyHistogram()
+    bins = {str(int(float(value) * 1000)): count for value, count in (clat.get('bins') or {}).items()}
+    return LatencyHistogram.from_bins(bins, total=clat['mean'] * 1000 * clat['N'],
+                                      minimum=clat['min'] * 1000, maximum=clat['max'] * 1000)
+
+
+def run_summary(run: dict, directions: tuple = DIRECTIONS) -> dict:
+    '''
+    Totals of one fio (or native engine) run over all its jobs: IOPS and bandwidth (MiB/s) add up,
+    and the latency histograms of the jobs merge into one, with the mean latency in msec.
+    '''
+    histogram = LatencyHistogram()
+    iops = bw_bytes = 0.0
+    for job in run.get('jobs', []):
+        for direction in directions:
+            section = job.get(direction) or {}
+            if not section.get('total_ios'):
+                continue
+            iops += section['iops']
+            bw_bytes += section['bw_bytes'] if 'bw_bytes' in section else section['bw'] * 1024
+            histogram.merge(latency_histogram(section))
+    return {
+        'IOPS': iops,
+        'bandwidth': bw_bytes / 1024 / 1024,
+        'avg_clatency': histogram.mean / 1e6 if histogram.count else 0.0,
+        'histogram': histogram,
+    }
+
+
+def read_runs(filepath: str) -> list:
+    '''Runs appended to `filepath`, one JSON document per line; a truncated line is skipped.'''
+    runs = []
+    with open(filepath, 'r') as file:
+        for line in file:
+            try:
+                runs.append(json.loads(line))
+            except json.JSONDecodeError:
+                logging.warning(f"Skipping a truncated line of {filepath}")
+    return runs
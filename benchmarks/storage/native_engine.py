@@ -0,0 +1,720 @@
+import argparse
+import bisect
+import ctypes
+import errno
+import itertools
+import json
+import mmap
+import os
+import random
+import stat
+import sys
+import threading
+import time
+
+base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+if base_dir not in sys.path:
+    sys.path.append(base_dir)
+
+from benchmarks.packages.histogram import LatencyHistogram
+from benchmarks.packages.param_space import seconds, size as parse_size
+from block_trace import TraceReader
+
+NATIVE_ITEM = 'native'
+'''Benchmark item that selects this engine instead of running the item as a fio-compatible command'''
+
+ENGINE_URING = 'io_uring'
+ENGINE_PSYNC = 'psync'
+
+READ_PATTERNS = {'read': False, 'randread': True}
+WRITE_PATTERNS = {'write': False, 'randwrite': True}
+MIXED_PATTERNS = {'rw': False, 'readwrite': False, 'randrw': True}
+'''Access patterns, whether their offsets are random; mixed ones read `rwmixread` percent of the time'''
+TRACE_PATTERN = 'trace'
+'''Pattern of a job that replays a block trace'''
+
+SCATTER_PRIME = 2654435761
+'''Spreads the hot ranks of a zipf distribution over the file, as fio does, instead of packing them at its start'''
+
+RATE_PROCESSES = ['linear', 'poisson']
+'''Arrival processes of open-loop runs, as fio's rate_process: evenly spaced or exponential gaps'''
+
+LAYOUT_CHUNK = 1024 * 1024
+
+
+def layout_file(path: str, file_size: int):
+    '''
+    Allocate `path` with `fallocate` and write random content over all of it: reads of allocated but
+    unwritten blocks never reach the device, and zeros would flatter compressing or deduplicating SSDs.
+    '''
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        if hasattr(os, 'posix_fallocate'):
+            try:
+                os.posix_fallocate(fd, 0, file_size)
+            except OSError as e:
+                # some file systems cannot preallocate, writing still lays the file out
+                if e.errno not in (errno.EOPNOTSUPP, errno.EINVAL):
+                    raise
+        chunk = os.urandom(LAYOUT_CHUNK)
+        for offset in range(0, file_size, LAYOUT_CHUNK):
+            os.pwrite(fd, chunk[:min(LAYOUT_CHUNK, file_size - offset)], offset)
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+# io_uring kernel ABI, see include/uapi/linux/io_uring.h; the syscall numbers are the same on all
+# architectures we run on
+_SYS_IO_URING_SETUP = 425
+_SYS_IO_URING_ENTER = 426
+_IORING_OFF_SQ_RING = 0
+_IORING_OFF_CQ_RING = 0x8000000
+_IORING_OFF_SQES = 0x10000000
+_IORING_ENTER_GETEVENTS = 1
+_IORING_OP_READV = 1
+_IORING_OP_WRITEV = 2
+
+
+class _SqringOffsets(ctypes.Structure):
+    _fields_ = [(name, ctypes.c_uint32) for name in
+                ('head', 'tail', 'ring_mask', 'ring_entries', 'flags', 'dropped', 'array', 'resv1')] \
+        + [('user_addr', ctypes.c_uint64)]
+
+
+class _CqringOffsets(ctypes.Structure):
+    _fields_ = [(name, ctypes.c_uint32) for name in
+                ('head', 'tail', 'ring_mask', 'ring_entries', 'overflow', 'cqes', 'flags', 'resv1')] \
+        + [('user_addr', ctypes.c_uint64)]
+
+
+class _UringParams(ctypes.Structure):
+    _fields_ = [(name, ctypes.c_uint32) for name in
+                ('sq_entries', 'cq_entries', 'flags', 'sq_thread_cpu', 'sq_thread_idle', 'features', 'wq_fd')] \
+        + [('resv', ctypes.c_uint32 * 3), ('sq_off', _SqringOffsets), ('cq_off', _CqringOffsets)]
+
+
+class _Sqe(ctypes.Structure):
+    _fields_ = [('opcode', ctypes.c_uint8), ('flags', ctypes.c_uint8), ('ioprio', ctypes.c_uint16),
+                ('fd', ctypes.c_int32), ('off', ctypes.c_uint64), ('addr', ctypes.c_uint64), ('len', ctypes.c_uint32),
+                ('rw_flags', ctypes.c_uint32), ('user_data', ctypes.c_uint64), ('buf_index', ctypes.c_uint16),
+                ('personality', ctypes.c_uint16), ('splice_fd_in', ctypes.c_int32), ('addr3', ctypes.c_uint64),
+                ('pad', ctypes.c_uint64)]
+
+
+class _Cqe(ctypes.Structure):
+    _fields_ = [('user_data', ctypes.c_uint64), ('res', ctypes.c_int32), ('flags', ctypes.c_uint32)]
+
+
+class _Iovec(ctypes.Structure):
+    _fields_ = [('iov_base', ctypes.c_void_p), ('iov_len', ctypes.c_size_t)]
+
+
+_libc = None
+
+
+def _syscall(number: int, *args) -> int:
+    global _libc
+    if _libc is None:
+        _libc = ctypes.CDLL(None, use_errno=True)
+        _libc.syscall.restype = ctypes.c_long
+    while True:
+        result = _libc.syscall(ctypes.c_long(number), *args)
+        if result >= 0:
+            return result
+        error = ctypes.get_errno()
+        if error != errno.EINTR:
+            raise OSError(error, os.strerror(error))
+
+
+class _Uring:
+    '''
+    A minimal io_uring instance driven through the raw syscalls, for one thread. Python bindings of
+    liburing only take bytearrays, which cannot be aligned for O_DIRECT; this takes any address.
+    Every completion is reaped after an io_uring_enter call, which orders our reads of the rings
+    after the kernel's writes, so no memory barriers are needed on weakly ordered CPUs either.
+    '''
+    def __init__(self, entries: int):
+        params = _UringParams()
+        self.fd = _syscall(_SYS_IO_URING_SETUP, ctypes.c_long(entries), ctypes.byref(params))
+        try:
+            sq, cq = params.sq_off, params.cq_off
+            self._sq_map = mmap.mmap(self.fd, sq.array + params.sq_entries * 4, mmap.MAP_SHARED,
+                                     mmap.PROT_READ | mmap.PROT_WRITE, offset=_IORING_OFF_SQ_RING)
+            self._cq_map = mmap.mmap(self.fd, cq.cqes + params.cq_entries * ctypes.sizeof(_Cqe), mmap.MAP_SHARED,
+                                     mmap.PROT_READ | mmap.PROT_WRITE, offset=_IORING_OFF_CQ_RING)
+            self._sqe_map = mmap.mmap(self.fd, params.sq_entries * ctypes.sizeof(_Sqe), mmap.MAP_SHARED,
+                                      mmap.PROT_READ | mmap.PROT_WRITE, offset=_IORING_OFF_SQES)
+        except BaseException:
+            os.close(self.fd)
+            raise
+        self.sq_tail = ctypes.c_uint32.from_buffer(self._sq_map, sq.tail)
+        self.sq_mask = ctypes.c_uint32.from_buffer(self._sq_map, sq.ring_mask).value
+        self.sq_array = (ctypes.c_uint32 * params.sq_entries).from_buffer(self._sq_map, sq.array)
+        self.sqes = (_Sqe * params.sq_entries).from_buffer(self._sqe_map)
+        self.cq_head = ctypes.c_uint32.from_buffer(self._cq_map, cq.head)
+        self.cq_tail = ctypes.c_uint32.from_buffer(self._cq_map, cq.tail)
+        self.cq_mask = ctypes.c_uint32.from_buffer(self._cq_map, cq.ring_mask).value
+        self.cqes = (_Cqe * params.cq_entries).from_buffer(self._cq_map, cq.cqes)
+        self.pending = 0
+
+    def prepare(self, opcode: int, fd: int, iovec_address: int, offset: int, user_data: int):
+        tail = self.sq_tail.value
+        index = tail & self.sq_mask
+        sqe = self.sqes[index]
+        ctypes.memset(ctypes.addressof(sqe), 0, ctypes.sizeof(_Sqe))
+        sqe.opcode = opcode
+        sqe.fd = fd
+        sqe.off = offset
+        sqe.addr = iovec_address
+        sqe.len = 1
+        sqe.user_data = user_data
+        self.sq_array[index] = index
+        self.sq_tail.value = tail + 1
+        self.pending += 1
+
+    def submit_and_wait(self, wait_nr: int = 1):
+        submitted = _syscall(_SYS_IO_URING_ENTER, ctypes.c_long(self.fd), ctypes.c_long(self.pending),
+                             ctypes.c_long(wait_nr), ctypes.c_long(_IORING_ENTER_GETEVENTS if wait_nr else 0),
+                             ctypes.c_void_p(None), ctypes.c_long(0))
+        self.pending -= submitted
+
+    def completions(self) -> list:
+        '''(user_data, result) of the completed I/Os, a negative result is -errno.'''
+        head, tail = self.cq_head.value, self.cq_tail.value
+        completed = []
+        while head != tail:
+            cqe = self.cqes[head & self.cq_mask]
+            completed.append((cqe.user_data, cqe.res))
+            head = (head + 1) & 0xffffffff
+        self.cq_head.value = head
+        return completed
+
+    def close(self):
+        # the ctypes views export the maps' buffers, they have to go before the maps can be closed
+        del self.sq_tail, self.sq_array, self.sqes, self.cq_head, self.cq_tail, self.cqes
+        for m in (self._sq_map, self._cq_map, self._sqe_map):
+            m.close()
+        os.close(self.fd)
+
+
+_uring_supported = None
+
+
+def _zipf_rank(u: float, theta: float, n: int) -> int:
+    '''Rank in [0, n) of a Zipf draw, from the inverse CDF of the density x^-theta over [1, n + 1).'''
+    if theta == 1:
+        x = (n + 1) ** u
+    else:
+        x = (1 + u * ((n + 1) ** (1 - theta) - 1)) ** (1 / (1 - theta))
+    return min(int(x) - 1, n - 1)
+
+
+def block_sampler(distribution: str, blocks: int):
+    '''
+    Function from a random.Random to a block in [0, blocks), for fio's `random_distribution` values:
+    `random` is uniform, `zipf:<theta>` makes a few blocks hot (the larger theta, the hotter), and
+    `zoned:<access %>/<range %>:...` sends each access share to the next share of the file, e.g.
+    `zoned:80/10:20/90` puts 80% of the I/Os on the first 10% of the blocks.
+    '''
+    kind, _, spec = distribution.partition(':')
+    if kind == 'random':
+        return lambda rng: rng.randrange(blocks)
+    if kind == 'zipf':
+        theta = float(spec)
+        if theta <= 0:
+            raise ValueError(f"zipf theta must be positive, not {theta}")
+        return lambda rng: _zipf_rank(rng.random(), theta, blocks) * SCATTER_PRIME % blocks
+    if kind == 'zoned':
+        zones = [tuple(float(share) for share in zone.split('/')) for zone in spec.split(':')]
+        if any(len(zone) != 2 for zone in zones) or round(sum(a for a, _ in zones)) != 100 \
+                or round(sum(r for _, r in zones)) != 100:
+            raise ValueError(f"zoned distribution {distribution!r} needs access/range pairs that each add up to 100")
+        cumulative, ranges = [], []
+        access_total = range_total = 0.0
+        for access, extent in zones:
+            first = min(int(range_total / 100 * blocks), blocks - 1)
+            access_total += access
+            range_total += extent
+            cumulative.append(access_total)
+            ranges.append((first, max(int(range_total / 100 * blocks), first + 1)))
+
+        def sample(rng):
+            zone = min(bisect.bisect_right(cumulative, rng.random() * access_total), len(ranges) - 1)
+            return rng.randrange(*ranges[zone])
+        return sample
+    raise ValueError(f"Unsupported random_distribution {distribution!r}, expected random, zipf:<theta> or zoned:...")
+
+
+def uring_supported() -> bool:
+    '''Whether this kernel lets us set up an io_uring; it may be missing, or disabled by sysctl or seccomp.'''
+    global _uring_supported
+    if _uring_supported is None:
+        try:
+            _Uring(1).close()
+            _uring_supported = True
+        except (OSError, AttributeError):
+            _uring_supported = False
+    return _uring_supported
+
+
+def resolve_engine(ioengine: str) -> str:
+    '''
+    The engine behind a fio `ioengine` name: io_uring if asked for and supported, psync (a thread per
+    in-flight I/O) for everything else, libaio included.
+    '''
+    if ioengine == ENGINE_URING and uring_supported():
+        return ENGINE_URING
+    return ENGINE_PSYNC
+
+
+def is_block_device(path: str) -> bool:
+    try:
+        return stat.S_ISBLK(os.stat(path).st_mode)
+    except OSError:
+        return False
+
+
+def aligned_buffer(length: int, fill: bool = False) -> mmap.mmap:
+    '''Anonymous mapping of `length` bytes, page-aligned as O_DIRECT needs; `fill` writes random bytes.'''
+    buffer = mmap.mmap(-1, length)
+    if fill:
+        buffer[:] = os.urandom(length)
+    return buffer
+
+
+class _Directions:
+    '''Latency histograms and bytes transferred of the reads and writes of a job or thread.'''
+    def __init__(self):
+        self.histograms = {'read': LatencyHistogram(), 'write': LatencyHistogram()}
+        self.io_bytes = {'read': 0, 'write': 0}
+
+    def record(self, write: bool, latency: int, length: int):
+        direction = 'write' if write else 'read'
+        self.histograms[direction].record(latency)
+        self.io_bytes[direction] += length
+
+    def merge(self, other: '_Directions'):
+        for direction in self.histograms:
+            self.histograms[direction].merge(other.histograms[direction])
+            self.io_bytes[direction] += other.io_bytes[direction]
+
+
+class NativeJob:
+    '''
+    One fio-style job: its own file of `file_size` bytes, accessed with `block_size` I/Os of pattern
+    `rw`, `iodepth` of them in flight. Without `time_based` the job stops after transferring `file_size`
+    bytes or at the deadline, whichever comes first, like fio does. Random offsets follow
+    `random_distribution` (see `block_sampler`), drawn with replacement (fio's norandommap). Mixed patterns
+    read `rwmixread` percent of the time.
+
+    A job given a `TraceReader` replays its I/Os instead, until the trace or the runtime ends.
+
+    With `rate_iops` the job runs open-loop: I/Os arrive on a schedule of that rate, whether or not the
+    earlier ones completed, and wait for a free slot if `iodepth` are in flight. Their latency counts from
+    the scheduled arrival, so time spent queued behind a saturated device is part of it.
+    '''
+    def __init__(self, path: str, rw: str, block_size: int, file_size: int, iodepth: int, direct: bool = True,
+                 time_based: bool = False, seed: int = 0, rate_iops: float = 0, rate_process: str = 'linear',
+                 rwmixread: float = 50, random_distribution: str = 'random', trace: TraceReader = None):
+        if rate_process not in RATE_PROCESSES:
+            raise ValueError(f"rate_process must be one of {RATE_PROCESSES}")
+        patterns = {**READ_PATTERNS, **WRITE_PATTERNS, **MIXED_PATTERNS}
+        if trace is None and rw not in patterns:
+            raise ValueError(f"Unsupported pattern {rw!r}, expected one of {list(patterns)}")
+        self.path = path
+        self.rw = TRACE_PATTERN if trace is not None else rw
+        self.trace = trace
+        self.block_size = block_size
+        self.file_size = file_size
+        self.blocks = file_size // block_size
+        self.iodepth = iodepth
+        self.direct = direct
+        self.rwmixread = rwmixread
+        self.writes = trace.writes if trace is not None else rw in WRITE_PATTERNS or rw in MIXED_PATTERNS
+        '''Whether any I/O of the job writes'''
+        self.random = patterns.get(rw, False)
+        self.sample_block = block_sampler(random_distribution, self.blocks)
+        self.limit = None if time_based else self.blocks
+        self.seed = seed
+        self.directions = _Directions()
+        '''Completion latency of every read and write of the job, in nanoseconds, and the bytes they moved'''
+        self.elapsed = 0.0
+        '''Seconds from the start of the group until the job's last I/O completed'''
+        self.rate_iops = rate_iops
+        self.rate_process = rate_process
+        self.fd = None
+        self._issued = itertools.count()
+        self._errors = []
+        self._arrival_lock = threading.Lock()
+        self._arrival_rng = random.Random(seed + 0x5eed)
+        self._next_arrival = None
+
+    def layout(self):
+        '''
+        Create the file with random content, unless it is already there and large enough, as fio does.
+        A block device is used as it is, it only has to be large enough too.
+        '''
+        if is_block_device(self.path):
+            fd = os.open(self.path, os.O_RDONLY)
+            try:
+                device_size = os.lseek(fd, 0, os.SEEK_END)
+            finally:
+                os.close(fd)
+            if device_size < self.file_size:
+                raise ValueError(f"{self.path} has {device_size} bytes, less than the size {self.file_size}")
+            return
+        if os.path.exists(self.path) and os.path.getsize(self.path) >= self.file_size:
+            return
+        layout_file(self.path, self.file_size)
+
+    def open(self):
+        flags = (os.O_RDWR if self.writes else os.O_RDONLY) | (os.O_DIRECT if self.direct else 0)
+        try:
+            self.fd = os.open(self.path, flags)
+        except OSError as e:
+            if e.errno == errno.EINVAL and self.direct:
+                raise OSError(e.errno, f"{self.path} does not support O_DIRECT, run with direct=0") from e
+            raise
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def next_io(self, rng: random.Random):
+        '''
+        (offset, length, write, due) of the next I/O, None once the job transferred its `file_size` bytes or
+        its trace ended. `due` is the perf_counter_ns() an open-loop or timed trace I/O is scheduled for,
+        None if it goes as soon as a slot is free.
+        '''
+        if self.trace is not None:
+            return self.trace.next_io()
+        n = next(self._issued)
+        if self.limit is not None and n >= self.limit:
+            return None
+        block = self.sample_block(rng) if self.random else n % self.blocks
+        write = self.rw in WRITE_PATTERNS or (self.rw in MIXED_PATTERNS and rng.random() * 100 >= self.rwmixread)
+        return block * self.block_size, self.block_size, write, self.next_arrival() if self.rate_iops else None
+
+    def next_arrival(self) -> int:
+        '''perf_counter_ns() at which the next I/O of an open-loop job is due.'''
+        with self._arrival_lock:
+            if self._next_arrival is None:
+                self._next_arrival = float(time.perf_counter_ns())
+            due = self._next_arrival
+            gap = 1e9 / self.rate_iops
+            if self.rate_process == 'poisson':
+                gap *= self._arrival_rng.expovariate(1.0)
+            self._next_arrival += gap
+            return int(due)
+
+    def _check(self, done: int, length: int, offset: int, write: bool):
+        if done != length:
+            raise OSError(errno.EIO, f"short {'write' if write else 'read'} of {done} of {length} bytes at {offset} "
+                                     f"in {self.path}")
+
+    def _psync_worker(self, slot: int, deadline: float, directions: _Directions):
+        try:
+            buffer = memoryview(aligned_buffer(self.block_size, fill=self.writes))
+            rng = random.Random(self.seed * 1_000_003 + slot)
+            while time.monotonic() < deadline:
+                io = self.next_io(rng)
+                if io is None:
+                    break
+                offset, length, write, start = io
+                if start is not None:
+                    wait = (start - time.perf_counter_ns()) / 1e9
+                    if time.monotonic() + wait >= deadline:
+                        break
+                    if wait > 0:
+                        time.sleep(wait)
+                else:
+                    start = time.perf_counter_ns()
+                done = (os.pwritev if write else os.preadv)(self.fd, [buffer[:length]], offset)
+                directions.record(write, time.perf_counter_ns() - start, length)
+                self._check(done, length, offset, write)
+        except BaseException as e:
+            self._errors.append(e)
+
+    def run_psync(self, deadline: float):
+        '''`iodepth` threads each keep one preadv/pwritev in flight, the GIL is released while they wait.'''
+        directions = [_Directions() for _ in range(self.iodepth)]
+        threads = [threading.Thread(target=self._psync_worker, args=(slot, deadline, directions[slot]), daemon=True)
+                   for slot in range(self.iodepth)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for thread_directions in directions:
+            self.directions.merge(thread_directions)
+
+    def run_uring(self, deadline: float):
+        '''One thread keeps `iodepth` I/Os in flight on its own io_uring.'''
+        ring = _Uring(self.iodepth)
+        try:
+            buffers = [aligned_buffer(self.block_size, fill=self.writes) for _ in range(self.iodepth)]
+            iovecs = (_Iovec * self.iodepth)()
+            anchors = []
+            for slot, buffer in enumerate(buffers):
+                anchors.append(ctypes.c_char.from_buffer(buffer))
+                iovecs[slot].iov_base = ctypes.addressof(anchors[-1])
+                iovecs[slot].iov_len = self.block_size
+            rng = random.Random(self.seed)
+            started = [0] * self.iodepth
+            pending = [None] * self.iodepth
+
+            def issue(slot, io):
+                offset, length, write, due = io
+                pending[slot] = io
+                started[slot] = time.perf_counter_ns() if due is None else due
+                iovecs[slot].iov_len = length
+                ring.prepare(_IORING_OP_WRITEV if write else _IORING_OP_READV, self.fd,
+                             ctypes.addressof(iovecs[slot]), offset, slot)
+
+            def complete(slot, result, now):
+                offset, length, write, _ = pending[slot]
+                self.directions.record(write, now - started[slot], length)
+                if result < 0:
+                    raise OSError(-result, f"{os.strerror(-result)} at offset {offset} in {self.path}")
+                self._check(result, length, offset, write)
+
+            if self.rate_iops or (self.trace is not None and self.trace.timing):
+                self._run_uring_open_loop(ring, rng, issue, complete, deadline)
+                return
+
+            in_flight = 0
+            for slot in range(self.iodepth):
+                io = self.next_io(rng)
+                if io is None:
+                    break
+                issue(slot, io)
+                in_flight += 1
+            while in_flight:
+                ring.submit_and_wait(1)
+                now = time.perf_counter_ns()
+                for slot, result in ring.completions():
+                    in_flight -= 1
+                    complete(slot, result, now)
+                    io = self.next_io(rng) if time.monotonic() < deadline else None
+                    if io is not None:
+                        issue(slot, io)
+                        in_flight += 1
+            del anchors
+        finally:
+            ring.close()
+
+    def _run_uring_open_loop(self, ring: _Uring, rng: random.Random, issue, complete, deadline: float):
+        '''Issue I/Os as they come due while slots are free, reap without blocking while more are due.'''
+        deadline_ns = time.perf_counter_ns() + int((deadline - time.monotonic()) * 1e9)
+        free = list(range(self.iodepth))
+        in_flight = 0
+        io = self.next_io(rng)
+        due = io and io[3]
+        while io is not None or in_flight:
+            now = time.perf_counter_ns()
+            if now >= deadline_ns:
+                # a saturated device leaves arrivals behind schedule, they do not extend the run
+                io = None
+            while io is not None and free and due <= now:
+                issue(free.pop(), io)
+                in_flight += 1
+                io = self.next_io(rng)
+                due = io and io[3]
+                if io is not None and due >= deadline_ns:
+                    io = None
+
+            # block only when nothing could be issued before a completion anyway
+            ring.submit_and_wait(1 if in_flight and (io is None or not free) else 0)
+            completed = ring.completions()
+            now = time.perf_counter_ns()
+            for slot, result in completed:
+                in_flight -= 1
+                free.append(slot)
+                complete(slot, result, now)
+            if not completed and io is not None and due > now:
+                time.sleep(min((due - now) / 1e9, 0.001 if in_flight else 1.0))
+
+    def run(self, engine: str, start: float, deadline: float):
+        try:
+            if engine == ENGINE_URING:
+                self.run_uring(deadline)
+            else:
+                self.run_psync(deadline)
+        except BaseException as e:
+            self._errors.append(e)
+        self.elapsed = time.monotonic() - start
+
+    def summary(self, name: str, jobnum: int) -> dict:
+        '''Results of the job in the shape of a job of fio's json+ output.'''
+        return {
+            'jobname': name, 'jobnum': jobnum, 'elapsed': self.elapsed,
+            **{direction: direction_summary(self.directions.histograms[direction], self.directions.io_bytes[direction],
+                                            self.elapsed)
+               for direction in ('read', 'write')},
+        }
+
+    def raise_errors(self):
+        if self._errors:
+            raise self._errors[0]
+
+
+def direction_summary(histogram: LatencyHistogram, io_bytes: int, elapsed: float) -> dict:
+    '''Totals of one data direction, in the shape and units of a direction of fio's json+ job output.'''
+    return {
+        'io_bytes': io_bytes, 'total_ios': histogram.count,
+        'bw_bytes': io_bytes / elapsed if elapsed else 0.0,
+        'bw': io_bytes / 1024 / elapsed if elapsed else 0.0,
+        'iops': histogram.count / elapsed if elapsed else 0.0,
+        'runtime': elapsed * 1e3,
+        'clat_ns': histogram.to_dict(),
+    }
+
+
+def run_native(rw: str, block_size, numjobs: int, size, runtime, iodepth: int, directory: str, name: str = None,
+               direct: bool = True, ioengine: str = ENGINE_URING, time_based: bool = False, keep_files: bool = False,
+               rate_iops: float = 0, rate_process: str = 'linear', rwmixread: float = 50,
+               random_distribution: str = 'random'):
+    '''
+    Run `numjobs` jobs of pattern `rw` on files `<directory>/<name>.<job>.0` of `size` bytes each, like
+    `fio --rw=<rw> --bs=<block_size> --numjobs=<numjobs> --size=<size> --runtime=<runtime> --iodepth=<iodepth>`
+    does. Sizes and durations take fio's notation (`4k`, `1G`, `30s`). When `directory` is a block device,
+    all jobs access its first `size` bytes, like fio's `--filename=<device>`; writes destroy its contents.
+    `rate_iops` runs the jobs open-loop at that total rate, split evenly over the jobs (see `NativeJob`).
+    `rwmixread` and `random_distribution` are fio's options of the same names.
+
+    Returns the engine that ran, the elapsed seconds and, like fio's json+ output without group reporting,
+    `jobs` with a `read` and `write` section each: I/O totals, IOPS, bandwidth and the clat histogram.
+    Files are laid out before the clock starts and removed afterwards unless `keep_files`.
+    '''
+    name = name or rw
+    block_size = parse_size(block_size)
+    file_size = parse_size(size) // block_size * block_size
+    if file_size == 0:
+        raise ValueError(f"size {size} is smaller than the block size {block_size}")
+    engine = resolve_engine(ioengine)
+    if is_block_device(directory):
+        paths = [directory] * numjobs
+        keep_files = True
+    else:
+        os.makedirs(directory, exist_ok=True)
+        paths = [os.path.join(directory, f"{name}.{j}.0") for j in range(numjobs)]
+    jobs = [NativeJob(path, rw, block_size, file_size, iodepth, bool(int(direct)), time_based, seed=j,
+                      rate_iops=float(rate_iops) / numjobs, rate_process=rate_process, rwmixread=float(rwmixread),
+                      random_distribution=random_distribution)
+            for j, path in enumerate(paths)]
+    elapsed = run_jobs(jobs, engine, runtime, keep_files)
+
+    return {
+        'engine': engine, 'rw': rw, 'bs': block_size, 'size': file_size, 'numjobs': numjobs, 'iodepth': iodepth,
+        'direct': int(bool(int(direct))), 'rate_iops': float(rate_iops), 'rwmixread': float(rwmixread),
+        'random_distribution': random_distribution, 'elapsed': elapsed,
+        'jobs': [job.summary(name, j) for j, job in enumerate(jobs)],
+    }
+
+
+def run_trace(trace: str, size, runtime, iodepth: int, directory: str, name: str = TRACE_PATTERN, direct: bool = True,
+              ioengine: str = ENGINE_URING, replay_no_stall: bool = False, keep_files: bool = False):
+    '''
+    Replay the block trace `trace` (see `block_trace.read_trace`) on the file `<directory>/<name>.0.0` of `size`
+    bytes, or on a block device, with up to `iodepth` I/Os in flight, until the trace or `runtime` ends. I/Os are
+    issued at their traced times, their latency counting from then, or as fast as possible with `replay_no_stall`,
+    like fio's option of that name. Returns the same document as `run_native`, with one job.
+    '''
+    direct = bool(int(direct))
+    file_size = parse_size(size)
+    reader = TraceReader(trace, file_size, direct, timing=not int(replay_no_stall))
+    engine = resolve_engine(ioengine)
+    if is_block_device(directory):
+        path = directory
+        keep_files = True
+    else:
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{name}.0.0")
+    job = NativeJob(path, TRACE_PATTERN, reader.max_length, file_size, iodepth, direct, time_based=True, trace=reader)
+    try:
+        elapsed = run_jobs([job], engine, runtime, keep_files)
+    finally:
+        reader.close()
+
+    return {
+        'engine': engine, 'rw': TRACE_PATTERN, 'trace': trace, 'replay_no_stall': int(not reader.timing),
+        'size': file_size, 'numjobs': 1, 'iodepth': iodepth, 'direct': int(direct), 'elapsed': elapsed,
+        'jobs': [job.summary(name, 0)],
+    }
+
+
+def run_jobs(jobs: list, engine: str, runtime, keep_files: bool = False) -> float:
+    '''
+    Lay out and open the files of `jobs`, run them all at once on `engine` for at most `runtime`, and return the
+    seconds that took. Files are laid out before the clock starts and removed afterwards unless `keep_files`.
+    '''
+    try:
+        for job in jobs:
+            job.layout()
+            job.open()
+
+        start = time.monotonic()
+        deadline = start + seconds(runtime)
+        threads = [threading.Thread(target=job.run, args=(engine, start, deadline), daemon=True) for job in jobs]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - start
+        for job in jobs:
+            job.raise_errors()
+    finally:
+        for job in jobs:
+            job.close()
+            if not keep_files and os.path.exists(job.path):
+                os.remove(job.path)
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Built-in storage load generator, a fio subset in Python')
+    parser.add_argument('--rw', type=str, default='randread', help='read, write, randread, randwrite, rw, randrw or trace')
+    parser.add_argument('--bs', type=str, default='4k', help='Block size')
+    parser.add_argument('--size', type=str, default='1G', help='File size per job')
+    parser.add_argument('--numjobs', type=int, default=1, help='Number of jobs, each with its own file')
+    parser.add_argument('--iodepth', type=int, default=32, help='I/Os in flight per job')
+    parser.add_argument('--runtime', type=str, default='30s', help='Longest run time')
+    parser.add_argument('--time_based', action='store_true', help='Run for the whole runtime, wrapping around the file')
+    parser.add_argument('--direct', type=int, default=1, help='Use O_DIRECT')
+    parser.add_argument('--ioengine', type=str, default=ENGINE_URING, help='io_uring, or psync for threads')
+    parser.add_argument('--directory', type=str, default='.', help='Where the job files go, or a block device')
+    parser.add_argument('--name', type=str, default=None, help='Job files are <name>.<job>.0, by default <rw>.<job>.0')
+    parser.add_argument('--keep_files', action='store_true', help='Leave the job files for the next run')
+    parser.add_argument('--rate_iops', type=float, default=0, help='Run open-loop at this total rate')
+    parser.add_argument('--rate_process', type=str, default='linear', choices=RATE_PROCESSES,
+                        help='Arrival process of --rate_iops')
+    parser.add_argument('--rwmixread', type=float, default=50, help='Percentage of reads of rw and randrw')
+    parser.add_argument('--random_distribution', type=str, default='random',
+                        help='random, zipf:<theta> or zoned:<access %%>/<range %%>:...')
+    parser.add_argument('--trace', type=str, default=None, help='Block trace of offset,len,op,timestamp lines to replay with --rw=trace')
+    parser.add_argument('--replay_no_stall', type=int, default=0, help='Replay the trace as fast as possible instead of at its times')
+    parser.add_argument('--output-format', type=str, default='json', choices=['json', 'json+'],
+                        help='json+ adds the latency histogram bins, like fio')
+    args = parser.parse_args()
+
+    if args.rw == TRACE_PATTERN:
+        if not args.trace:
+            parser.error("--rw=trace needs --trace")
+        result = run_trace(args.trace, args.size, args.runtime, args.iodepth, args.directory, name=args.name or TRACE_PATTERN,
+                           direct=args.direct, ioengine=args.ioengine, replay_no_stall=args.replay_no_stall,
+                           keep_files=args.keep_files)
+    else:
+        result = run_native(args.rw, args.bs, args.numjobs, args.size, args.runtime, args.iodepth, args.directory,
+                            name=args.name, keep_files=args.keep_files, direct=args.direct, ioengine=args.ioengine,
+                            time_based=args.time_based, rate_iops=args.rate_iops, rate_process=args.rate_process,
+                            rwmixread=args.rwmixread, random_distribution=args.random_distribution)
+    if args.output_format == 'json':
+        for job in result['jobs']:
+            for direction in ('read', 'write'):
+                job[direction]['clat_ns'].pop('bins')
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,5 @@
 import os
+import argparse
 import subprocess
 import logging
 
@@ -7,16 +8,28 @@ def run_command(command, check=True, shell=False):
     logging.info(f"Running command: {' '.join(command)}")
     subprocess.run(command, check=check, shell=shell)
 
-def install_packages(requirements_path):
+def run_setup_command(command, required):
+    """Run an apt or pip command; one that is not `required` only logs a warning when it fails."""
+    try:
+        run_command(command)
+    except (subprocess.CalledProcessError, FileNotFoundError) as e:
+        if required:
+            raise
+        logging.warning(f"{' '.join(command)} failed, continuing for the native engine: {e}")
+
+def install_packages(requirements_path, required=True):
     """Install packages globally using pip."""
-    run_command(['pip3', 'install', '--upgrade', 'pip'])
+    run_setup_command(['pip3', 'install', '--upgrade', 'pip'], required)
     if os.path.exists(requirements_path):
-        run_command(['pip3', 'install', '-r', requirements_path])
+        run_setup_command(['pip3', 'install', '-r', requirements_path], required)
     else:
         logging.warning(f"requirements.txt not found at {requirements_path}")
 
 def main():
     logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description='Prepare the storage benchmark.')
+    parser.add_argument('--benchmark_items', type=str, default='fio', help='Comma-separated list of benchmark items')
+    args, _ = parser.parse_known_args()
 
     # Get the directory of the prepare.py script
     script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -25,18 +38,24 @@ def main():
     # Set the benchmark directory to the script directory
     benchmark_dir = script_dir
 
+    items = args.benchmark_items.split(',')
+    # The built-in native engine needs nothing but Python: with it among the items, a DPU image without
+    # fio, apt or pip access still prepares, and only the fio items fail later
+    setup_required = 'native' not in items
+
     # Update package list
-    run_command(['sudo', 'apt', 'update'])
+    run_setup_command(['sudo', 'apt', 'update'], setup_required)
 
     # Install fio
-    run_command(['sudo', 'apt', 'install', '-y', 'fio'])
+    if any(item != 'native' for item in items):
+        run_setup_command(['sudo', 'apt', 'install', '-y', 'fio'], setup_required)
 
     # Install python3-pip
-    run_command(['sudo', 'apt', 'install', '-y', 'python3-pip'])
+    run_setup_command(['sudo', 'apt', 'install', '-y', 'python3-pip'], setup_required)
 
     # Install packages globally from requirements.txt
     requirements_path = os.path.join(benchmark_dir, 'requirements.txt')
-    install_packages(requirements_path)
+    install_packages(requirements_path, setup_required)
 
     logging.info("Setup complete. Python packages have been installed globally.")
 
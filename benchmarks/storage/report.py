@@ -4,189 +4,247 @@ import os
 import re
 import csv
 import logging
-import numpy as np
-
-iops_pattern = re.compile(r'IOPS=([\d.]+[kM]?)')
-bw_pattern = re.compile(r'BW=([\d.]+[kM]?[KM]?iB/s)')
-
-# Updated pattern to correctly extract clat average and its unit
-clat_avg_pattern = re.compile(r'clat \((\w+)\):.*?avg=([\d.]+)', re.MULTILINE)
-clat_percentile_pattern = re.compile(r'clat percentiles.*?\((\w+)\):', re.MULTILINE)
-percentile_value_pattern = re.compile(r'\|\s*([\d.]+)\.00th=\[\s*(\d+)\]')
+import sys
+
+base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+if base_dir not in sys.path:
+    sys.path.append(base_dir)
+
+from benchmarks.packages.histogram import FIO_PERCENTILES, LatencyHistogram
+from benchmarks.packages.ledger import host_fingerprint
+from fio_json import read_runs, run_summary
+
+RESULT_FILES = [('fio', "fio_results.json"), ('native', "native_results.json")]
+'''Per benchmark item, the file of its runs in a result directory, one json+ document per line'''
+SCALING_RESULTS_FILE = "scaling_results.json"
+'''Runs of the multi-device mode, one line per device count and repetition with a json+ document per device'''
+RATE_RESULTS_FILE = "rate_results.json"
+'''Runs of the open-loop mode, one line per target rate and repetition'''
+RESULTS_DIRECTORY = "results"
+'''Directory of the result store in the output folder, every other directory holds the results of a test type'''
+PARAM_FIELDS = ['block_sizes', 'numProc', 'size', 'runtime', 'direct', 'iodepth', 'io_engine']
+SCALING_PERCENTILES = [50, 99, 99.9]
+KNEE_PERCENTILES = [50, 99, 99.9]
+KNEE_ACHIEVED_FRACTION = 0.95
+'''A rate step is sustained if the achieved IOPS are at least this fraction of its target'''
+KNEE_LATENCY_FACTOR = 2.0
+'''A rate step is past the knee once its p99 latency exceeds this multiple of the p99 at the lowest rate'''
+REPORT_RUN_ID = "storage-report"
 
 def parse_arguments():
     parser = argparse.ArgumentParser(description='Generate report from benchmark test results.')
     parser.add_argument('--metrics', type=str, required=True, help='JSON string of metrics to report')
     return parser.parse_args()
 
-def convert_value(value):
-    if isinstance(value, str):
-        if value.endswith('k'):
-            return float(value[:-1]) * 1e3
-        elif value.endswith('M'):
-            return float(value[:-1]) * 1e6
-        elif value.endswith('KiB/s'):
-            return float(value[:-5]) / 1024  # Convert KiB/s to MiB/s
-        elif value.endswith('MiB/s'):
-            return float(value[:-5])
-        elif value.endswith('KB/s'):
-            return float(value[:-4]) / 1024  # Convert KB/s to MiB/s
-        elif value.endswith('MB/s'):
-            return float(value[:-4])
-    return float(value)
-
-def convert_to_msec(value, unit):
-    """Convert latency values to milliseconds."""
-    value = float(value)
-    if unit == 'nsec':
-        return value / 1e6
-    elif unit == 'usec':
-        return value / 1e3
-    elif unit == 'msec':
-        return value
-    else:
-        logging.warning(f"Unknown unit: {unit}, treating as msec")
-        return value
-
-def extract_value(pattern, text):
-    match = pattern.search(text)
-    if match:
-        return match.group(1)
-    return None
-
-def extract_clat_percentiles(text, unit):
-    """Extract clatency percentiles and convert to msec."""
-    matches = percentile_value_pattern.findall(text)
-    return {float(match[0]): convert_to_msec(float(match[1]), unit) for match in matches}
-
-def parse_benchmark_output(filepath):
-    with open(filepath, 'r') as file:
-        content = file.read()
-
-    runs = content.split("\nRun #")
-    results = []
-    clat_percentile_results = []
-
-    for run in runs[1:]:  # Skip the first split part before 'Run1'
-        result = {}
-
-        # Extract clatency average and its unit, and convert to msec immediately
-        clat_avg_match = clat_avg_pattern.search(run)
-        if clat_avg_match:
-            unit = clat_avg_match.group(1)
-            avg_clatency = float(clat_avg_match.group(2))
-            avg_clatency = convert_to_msec(avg_clatency, unit)  # Convert to msec immediately
-            result['avg_clatency'] = avg_clatency
-        else:
-            logging.warning(f"Could not find clatency average in the run")
-            continue
-
-        # Extract clatency percentiles unit
-        clat_unit_match = clat_percentile_pattern.search(run)
-        if clat_unit_match:
-            clat_unit = clat_unit_match.group(1)
-            # Extract clatency percentiles and convert to msec immediately
-            clat_percentiles = extract_clat_percentiles(run, clat_unit)
-            if clat_percentiles:
-                clat_percentile_results.append(clat_percentiles)
-        else:
-            logging.warning(f"Could not find clatency percentiles in the run")
-
-        iops = extract_value(iops_pattern, run)
-        bw = extract_value(bw_pattern, run)
-        
-        result['IOPS'] = convert_value(iops) if iops else 0
-        result['bandwidth'] = convert_value(bw) if bw else 0
-        
-        results.append(result)
-
-    # Calculate the average for each percentile (already in msec)
-    if clat_percentile_results:
-        percentiles = clat_percentile_results[0].keys()
-        avg_clat_percentiles = {percentile: np.mean([run[percentile] for run in clat_percentile_results])
-                                for percentile in percentiles}
-    else:
-        avg_clat_percentiles = {}
-
-    return results, avg_clat_percentiles
+def requested_percentile(metric):
+    """Percentile of a metric such as "99.9 percentile"."""
+    return float(re.findall(r'\d+(?:\.\d+)?', metric)[0])
+
+def percentile_field(percentile):
+    return f'{percentile:g}th_percentile_clatency'
+
+def parse_results(filepath):
+    """
+    Per-run totals of a results file, and the latency histogram of all jobs of all runs. Bucket counts are
+    merged before percentiles are taken, so they are exact over every I/O; averaging them per run is not.
+    """
+    runs = []
+    histogram = LatencyHistogram()
+    for run in read_runs(filepath):
+        summary = run_summary(run)
+        histogram.merge(summary.pop('histogram'))
+        summary['engine'] = run.get('engine')
+        runs.append(summary)
+    return runs, histogram
+
+def parse_params(dir_name):
+    """Parameters of a combination from its result directory name, None if it is not one."""
+    params_match = re.match(r'(\w+)_(\d+)_(\w+)_(\w+)_(\d+)_(\d+)_(.+)', dir_name)
+    if not params_match:
+        logging.error(f"Unexpected directory name format: {dir_name}")
+        return None
+    return dict(zip(PARAM_FIELDS, params_match.groups()))
+
+def test_type_dirs(output_folder):
+    """(test type, directory) of every test that left results: a pattern such as randread, a mix such as randrw_mix70, or a trace."""
+    if not os.path.isdir(output_folder):
+        return []
+    return [(test_type, os.path.join(output_folder, test_type)) for test_type in sorted(os.listdir(output_folder))
+            if test_type != RESULTS_DIRECTORY and os.path.isdir(os.path.join(output_folder, test_type))]
 
 def process_files(output_folder, metrics):
     results = []
-    percentiles_to_calculate = [int(re.findall(r'\d+', metric)[0]) for metric in metrics if "percentile" in metric]
-
-    for test_type in ['randread', 'randwrite', 'read', 'write']:
-        test_type_dir = os.path.join(output_folder, test_type)
-        if not os.path.isdir(test_type_dir):
-            continue
+    percentiles_to_calculate = [requested_percentile(metric) for metric in metrics if "percentile" in metric]
 
+    for test_type, test_type_dir in test_type_dirs(output_folder):
         for dir_name in os.listdir(test_type_dir):
             dir_path = os.path.join(test_type_dir, dir_name)
             if not os.path.isdir(dir_path):
                 continue
 
-            filepath = os.path.join(dir_path, "combined_results.txt")
-            if not os.path.exists(filepath):
-                logging.warning(f"combined_results.txt not found in {dir_path}")
+            outputs = [(item, os.path.join(dir_path, filename)) for item, filename in RESULT_FILES
+                       if os.path.exists(os.path.join(dir_path, filename))]
+            if not outputs:
+                if not any(os.path.exists(os.path.join(dir_path, filename)) for filename in (SCALING_RESULTS_FILE, RATE_RESULTS_FILE)):
+                    logging.warning(f"No results found in {dir_path}")
                 continue
 
-            logging.info(f"Processing file: {filepath}")
-            
-            parsed_outputs, avg_clat_percentiles = parse_benchmark_output(filepath)
-            
-            if not parsed_outputs:
-                logging.warning(f"No data extracted from {filepath}")
-                continue
+            for benchmark_item, filepath in outputs:
+                result = process_output(benchmark_item, filepath, test_type, dir_name, percentiles_to_calculate)
+                if result:
+                    results.append(result)
+
+    return results
 
-            iops_list = [output.get('IOPS', 0) for output in parsed_outputs]
-            bw_list = [output.get('bandwidth', 0) for output in parsed_outputs]
-            clatency_list = [output.get('avg_clatency', 0) for output in parsed_outputs]
+def process_output(benchmark_item, filepath, test_type, dir_name, percentiles_to_calculate):
+    logging.info(f"Processing file: {filepath}")
 
-            avg_iops = sum(iops_list) / len(iops_list) if iops_list else 0
-            avg_bw = sum(bw_list) / len(bw_list) if bw_list else 0
-            avg_clatency = sum(clatency_list) / len(clatency_list) if clatency_list else 0
+    runs, histogram = parse_results(filepath)
 
-            # Parse directory name for parameters
-            params_match = re.match(r'(\w+)_(\d+)_(\w+)_(\w+)_(\d+)_(\d+)_(.+)', dir_name)
-            
-            if not params_match:
-                logging.error(f"Unexpected directory name format: {dir_name}")
+    if not runs:
+        logging.warning(f"No data extracted from {filepath}")
+        return None
+
+    params = parse_params(dir_name)
+    if params is None:
+        return None
+
+    result = {
+        'test_lst': 'storage',
+        'test_type': test_type,
+        'benchmark_item': benchmark_item,
+        **params,
+        'IOPS': sum(run['IOPS'] for run in runs) / len(runs),
+        'bandwidth': sum(run['bandwidth'] for run in runs) / len(runs),
+        'avg_clatency': histogram.mean / 1e6 if histogram.count else 0.0,  # msec, over every I/O of every run
+        'runs': runs,
+    }
+    for percentile in sorted(set(FIO_PERCENTILES) | set(percentiles_to_calculate)):
+        if histogram.count:
+            result[percentile_field(percentile)] = histogram.percentile(percentile) / 1e6
+
+    logging.info(f"Processed {benchmark_item} test: {test_type}, block size: {result['block_sizes']}, io_engine: {result['io_engine']}")
+    return result
+
+def scaling_row(test_type, benchmark_item, params, device_count, device, summaries, percentiles=SCALING_PERCENTILES):
+    """One device, or all of them, at one device count: mean IOPS and bandwidth over the repetitions, merged latencies."""
+    histogram = LatencyHistogram()
+    for summary in summaries:
+        histogram.merge(summary['histogram'])
+    row = {
+        'test_type': test_type, 'benchmark_item': benchmark_item, **params,
+        'device_count': device_count, 'device': device,
+        'IOPS': sum(summary['IOPS'] for summary in summaries) / len(summaries),
+        'bandwidth': sum(summary['bandwidth'] for summary in summaries) / len(summaries),
+        'avg_clatency': histogram.mean / 1e6 if histogram.count else 0.0,
+    }
+    for percentile in percentiles:
+        if histogram.count:
+            row[percentile_field(percentile)] = histogram.percentile(percentile) / 1e6
+    return row
+
+def process_scaling_files(output_folder):
+    """
+    Rows of the multi-device mode: per device count, one per device and one for all of them (device "all").
+    `scaling_efficiency` of the aggregate rows is their IOPS over N times the IOPS of a single device, when
+    one device was measured too; it drops where a shared controller, link or core becomes the bottleneck.
+    """
+    rows = []
+    for test_type, test_type_dir in test_type_dirs(output_folder):
+        for dir_name in sorted(os.listdir(test_type_dir)):
+            filepath = os.path.join(test_type_dir, dir_name, SCALING_RESULTS_FILE)
+            if not os.path.exists(filepath):
                 continue
+            params = parse_params(dir_name)
+            if params is None:
+                continue
+            logging.info(f"Processing file: {filepath}")
 
-            block_size, numProc, size, runtime, direct, iodepth, io_engine = params_match.groups()
-
-            result = {
-                'test_lst': 'storage',
-                'test_type': test_type,
-                'block_sizes': block_size,
-                'numProc': numProc,
-                'size': size,
-                'runtime': runtime,
-                'direct': direct,
-                'iodepth': iodepth,
-                'io_engine': io_engine,
-                'avg_clatency': avg_clatency,  # Already in msec
-            }
-
-            if "bandwidth" in metrics:
-                result['bandwidth'] = avg_bw
-            if "IOPS" in metrics:
-                result['IOPS'] = avg_iops
-
-            # Process percentile values
-            if avg_clat_percentiles and percentiles_to_calculate:
-                for percentile in percentiles_to_calculate:
-                    if percentile in avg_clat_percentiles:
-                        result[f'{percentile}th_percentile_clatency'] = avg_clat_percentiles[percentile]
-                    else:
-                        logging.warning(f"Percentile {percentile} not found in the data")
-
-            results.append(result)
-            logging.info(f"Processed test: {test_type}, block size: {block_size}, io_engine: {io_engine}")
+            groups = {}
+            for line in read_runs(filepath):
+                groups.setdefault((line['benchmark_item'], line['device_count']), []).append(line)
+
+            single_device_iops = {}
+            for (benchmark_item, device_count), lines in sorted(groups.items()):
+                per_device = {}
+                aggregates = []
+                for line in lines:
+                    for device, run in line['devices'].items():
+                        per_device.setdefault(device, []).append(run_summary(run))
+                    aggregates.append(run_summary({'jobs': [job for run in line['devices'].values() for job in run.get('jobs', [])]}))
+
+                for device, summaries in sorted(per_device.items()):
+                    rows.append(scaling_row(test_type, benchmark_item, params, device_count, device, summaries))
+                aggregate = scaling_row(test_type, benchmark_item, params, device_count, 'all', aggregates)
+                if device_count == 1:
+                    single_device_iops[benchmark_item] = aggregate['IOPS']
+                if single_device_iops.get(benchmark_item):
+                    aggregate['scaling_efficiency'] = aggregate['IOPS'] / (device_count * single_device_iops[benchmark_item])
+                rows.append(aggregate)
+    return rows
+
+def process_rate_files(output_folder):
+    """
+    Latency-throughput curves of the open-loop mode: per combination and target rate, the achieved IOPS and
+    latency percentiles of all repetitions merged. The `knee` row of a curve is its highest target rate that
+    was still sustained (KNEE_ACHIEVED_FRACTION) with a p99 within KNEE_LATENCY_FACTOR of the lowest rate's.
+    """
+    rows = []
+    for test_type, test_type_dir in test_type_dirs(output_folder):
+        for dir_name in sorted(os.listdir(test_type_dir)):
+            filepath = os.path.join(test_type_dir, dir_name, RATE_RESULTS_FILE)
+            if not os.path.exists(filepath):
+                continue
+            params = parse_params(dir_name)
+            if params is None:
+                continue
+            logging.info(f"Processing file: {filepath}")
 
-    return results
+            groups = {}
+            for line in read_runs(filepath):
+                groups.setdefault(line['benchmark_item'], {}).setdefault(line['rate_iops'], []).append(run_summary(line['run']))
+
+            for benchmark_item, steps in sorted(groups.items()):
+                curve = []
+                for rate_iops, summaries in sorted(steps.items()):
+                    row = scaling_row(test_type, benchmark_item, params, None, None, summaries, KNEE_PERCENTILES)
+                    row['rate_iops'] = rate_iops
+                    row['achieved_fraction'] = row['IOPS'] / rate_iops
+                    curve.append(row)
+
+                baseline = curve[0].get(percentile_field(99))
+                sustained = [row for row in curve if row['achieved_fraction'] >= KNEE_ACHIEVED_FRACTION
+                             and baseline and row.get(percentile_field(99), 0) <= KNEE_LATENCY_FACTOR * baseline]
+                for row in curve:
+                    row['knee'] = int(bool(sustained) and row is sustained[-1])
+                rows.extend(curve)
+    return rows
+
+def save_rate_csv(rows, output_folder):
+    fields = ['test_type', 'benchmark_item'] + PARAM_FIELDS + ['rate_iops', 'IOPS', 'achieved_fraction', 'bandwidth', 'avg_clatency'] \
+        + [percentile_field(percentile) for percentile in KNEE_PERCENTILES] + ['knee']
+    output_file = os.path.join(output_folder, 'knee.csv')
+    with open(output_file, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({field: row.get(field, '') for field in fields})
+    logging.info(f"Latency-throughput curves saved to {output_file}")
+
+def save_scaling_csv(rows, output_folder):
+    fields = ['test_type', 'benchmark_item'] + PARAM_FIELDS + ['device_count', 'device', 'IOPS', 'bandwidth', 'avg_clatency'] \
+        + [percentile_field(percentile) for percentile in SCALING_PERCENTILES] + ['scaling_efficiency']
+    output_file = os.path.join(output_folder, 'scaling.csv')
+    with open(output_file, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({field: row.get(field, '') for field in fields})
+    logging.info(f"Scaling results saved to {output_file}")
 
 def save_to_csv(results, output_folder, metrics):
-    base_fields = ['test_lst', 'test_type', 'block_sizes', 'numProc', 'size', 'runtime', 'direct', 'iodepth', 'io_engine']
+    base_fields = ['test_lst', 'test_type', 'benchmark_item', 'block_sizes', 'numProc', 'size', 'runtime', 'direct', 'iodepth', 'io_engine']
     
     metric_fields_map = {
         'avg_clatency': 'avg_clatency',
@@ -197,8 +255,7 @@ def save_to_csv(results, output_folder, metrics):
     required_fields = base_fields[:]
     for metric in metrics:
         if "percentile" in metric:
-            percentile = re.findall(r'\d+', metric)[0]
-            required_fields.append(f'{percentile}th_percentile_clatency')
+            required_fields.append(percentile_field(requested_percentile(metric)))
         elif metric in metric_fields_map:
             required_fields.append(metric_fields_map[metric])
     
@@ -208,22 +265,52 @@ def save_to_csv(results, output_folder, metrics):
         writer = csv.DictWriter(f, fieldnames=required_fields)
         writer.writeheader()
         for result in results:
-            # Convert all np.float64 types to standard Python float
-            for key, value in result.items():
-                if isinstance(value, np.float64):
-                    result[key] = float(value)  # Convert to standard float type
-
-            # Ensure all latency values are properly in msec
-            if 'avg_clatency' in result:
-                result['avg_clatency'] = float(result['avg_clatency'])
-            for percentile in [key for key in result if 'percentile_clatency' in key]:
-                result[percentile] = float(result[percentile])
-
             row = {field: result.get(field, '') for field in required_fields}
             writer.writerow(row)
     
     logging.info(f"Results saved to {output_file}")
 
+def save_to_store(results, output_folder, scaling_rows=(), rate_rows=()):
+    """
+    Write every run and the merged results of every combination to a typed result store,
+    `output/results/storage-report.arrows`, readable with `python3 -m benchmarks.packages.result_store`.
+    Merged rows carry the label aggregate=merged and all of fio's default percentiles, in msec.
+    Rows of the multi-device mode are labelled with their `device` and `device_count`, those of the
+    open-loop mode with their target `rate_iops`.
+    """
+    # pyarrow is slow to import, only the report needs it
+    from benchmarks.packages.result_store import ResultStore, pa
+    if pa is None:
+        logging.warning("pyarrow is not installed, results are only saved to CSV")
+        return
+    store = ResultStore(os.path.join(output_folder, RESULTS_DIRECTORY), run_id=REPORT_RUN_ID, host=host_fingerprint())
+    try:
+        for result in results:
+            params = {field: result[field] for field in PARAM_FIELDS}
+            labels = {'test_type': result['test_type'], 'benchmark_item': result['benchmark_item']}
+            for repetition, run in enumerate(result['runs'], start=1):
+                metrics = {key: run[key] for key in ('IOPS', 'bandwidth', 'avg_clatency')}
+                store.append('benchmarks/storage', params, metrics, repetition=repetition,
+                             labels={**labels, 'engine': run['engine'] or result['io_engine']})
+            metrics = {key: value for key, value in result.items()
+                       if key in ('IOPS', 'bandwidth', 'avg_clatency') or key.endswith('percentile_clatency')}
+            store.append('benchmarks/storage', params, metrics, labels={**labels, 'aggregate': 'merged'})
+        for row in scaling_rows:
+            params = {field: row[field] for field in PARAM_FIELDS}
+            labels = {key: row[key] for key in ('test_type', 'benchmark_item', 'device', 'device_count')}
+            metrics = {key: value for key, value in row.items()
+                       if key in ('IOPS', 'bandwidth', 'avg_clatency', 'scaling_efficiency') or key.endswith('percentile_clatency')}
+            store.append('benchmarks/storage', params, metrics, labels={**labels, 'aggregate': 'merged'})
+        for row in rate_rows:
+            params = {field: row[field] for field in PARAM_FIELDS}
+            labels = {key: row[key] for key in ('test_type', 'benchmark_item', 'rate_iops')}
+            metrics = {key: value for key, value in row.items()
+                       if key in ('IOPS', 'bandwidth', 'avg_clatency', 'achieved_fraction', 'knee') or key.endswith('percentile_clatency')}
+            store.append('benchmarks/storage', params, metrics, labels={**labels, 'aggregate': 'merged'})
+    finally:
+        store.close()
+    logging.info(f"Results saved to {store.path}")
+
 def main():
     logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
     try:
@@ -241,6 +328,8 @@ def main():
 
     try:
         results = process_files(output_folder, metrics)
+        scaling_rows = process_scaling_files(output_folder)
+        rate_rows = process_rate_files(output_folder)
     except Exception as e:
         logging.error(f"Error processing files: {e}", exc_info=True)
         return
@@ -250,6 +339,23 @@ def main():
     except Exception as e:
         logging.error(f"Error saving to CSV: {e}", exc_info=True)
 
+    if scaling_rows:
+        try:
+            save_scaling_csv(scaling_rows, output_folder)
+        except Exception as e:
+            logging.error(f"Error saving scaling results to CSV: {e}", exc_info=True)
+
+    if rate_rows:
+        try:
+            save_rate_csv(rate_rows, output_folder)
+        except Exception as e:
+            logging.error(f"Error saving latency-throughput curves to CSV: {e}", exc_info=True)
+
+    try:
+        save_to_store(results, output_folder, scaling_rows, rate_rows)
+    except Exception as e:
+        logging.error(f"Error saving to the result store: {e}", exc_info=True)
+
     print("Storage report.py successfully completed.")
 
 if __name__ == '__main__':
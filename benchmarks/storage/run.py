@@ -1,8 +1,31 @@
 import os
+import sys
+import json
 import argparse
+import re
 import subprocess
 import shutil
 
+base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+if base_dir not in sys.path:
+    sys.path.append(base_dir)
+
+from benchmarks.packages.metrics import emit_metrics
+from benchmarks.packages.param_space import size as parse_size
+from file_pool import FIO_FILENAME_FORMAT, POOL_DIRECTORY, POOL_NAME, pool_file, prepare_pool, remove_pool
+from fio_json import load_fio_json, run_summary
+from block_trace import write_fio_iolog
+from native_engine import MIXED_PATTERNS, NATIVE_ITEM, READ_PATTERNS, TRACE_PATTERN, WRITE_PATTERNS, is_block_device, run_native, run_trace
+
+FIO_RESULTS_FILE = "fio_results.json"
+NATIVE_RESULTS_FILE = "native_results.json"
+SCALING_RESULTS_FILE = "scaling_results.json"
+RATE_RESULTS_FILE = "rate_results.json"
+RATE_PROCESS = "poisson"
+NATIVE_ENGINE_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "native_engine.py")
+REPORTED_PERCENTILES = [50, 90, 99, 99.9]
+
 def parse_arguments():
     parser = argparse.ArgumentParser(description='Run storage benchmark tests.')
     
@@ -17,6 +40,15 @@ def parse_arguments():
     parser.add_argument('--test_lst', type=str, default="randwrite,randread,write,read", help='Comma-separated list of tests')
     parser.add_argument('--runtimes', type=int, default=5, help='Number of runtimes')
     parser.add_argument('--metrics', type=str, help='Metrics to collect')
+    parser.add_argument('--devices', type=str, default="", help='Comma-separated mount points or block devices to run on concurrently, instead of fio_test')
+    parser.add_argument('--device_counts', type=str, default="", help='Comma-separated numbers of devices to sweep, the first N of --devices; all of them by default')
+    parser.add_argument('--precondition', type=int, default=0, help='Passes of random writes over new test files before they are measured')
+    parser.add_argument('--clean_test_files', type=int, default=0, help='Remove the test-file pool when done instead of keeping it for the next run')
+    parser.add_argument('--rwmixread', type=int, default=50, help='Percentage of reads of the mixed tests rw and randrw')
+    parser.add_argument('--random_distribution', type=str, default="random", help='Offsets of random tests: random, zipf:<theta> or zoned:<access %%>/<range %%>:...')
+    parser.add_argument('--trace', type=str, default="", help='Block trace of offset,len,op,timestamp lines, replayed by the test trace')
+    parser.add_argument('--replay_no_stall', type=int, default=0, help='Replay the trace as fast as possible instead of at its times')
+    parser.add_argument('--rate_iops', type=str, default="", help='Comma-separated target IOPS (over all jobs) to step through open-loop, instead of running as fast as possible')
     
     return parser.parse_args()
 
@@ -30,46 +62,304 @@ def clean_directory(directory):
         shutil.rmtree(directory)
     create_directory(directory)
 
-def run_benchmark(test_name, block_size, numjobs, size, runtime, direct, iodepth, ioengine, test_dir, output_folder, log_file, runtimes, benchmark_item):
+def pool_root(target):
+    """Where the test-file pool of a device goes: a block device is used as it is, a mount point gets a pool directory."""
+    return target if is_block_device(target) else os.path.join(target, POOL_DIRECTORY)
+
+def test_files(pool, size, numjobs, precondition, direct, log_file):
+    """The pool directory for `numjobs` files of `size`, laid out (and preconditioned) if this is its first use; None if that failed."""
+    try:
+        target = prepare_pool(pool, size, numjobs, precondition, bool(int(direct)))
+    except (OSError, ValueError) as e:
+        print(f"Error laying out test files in {pool}: {e}", file=log_file)
+        return None
+    print(f"Using test files in {target}", file=log_file)
+    return target
+
+def workload_options(test_name, rwmixread, random_distribution):
+    """Options of a test beyond its pattern, by fio's names, which the native engine takes as well."""
+    options = {}
+    if test_name in MIXED_PATTERNS:
+        options['rwmixread'] = rwmixread
+    if random_distribution != 'random' and {**READ_PATTERNS, **WRITE_PATTERNS, **MIXED_PATTERNS}.get(test_name):
+        options['random_distribution'] = random_distribution
+    return options
+
+def test_type(test_name, options):
+    """Result directory of a test: its pattern, followed by its read mix and distribution if it has them, e.g. randrw_mix70_zipf-1.2."""
+    parts = [test_name]
+    if 'rwmixread' in options:
+        parts.append(f"mix{options['rwmixread']}")
+    if 'random_distribution' in options:
+        parts.append(re.sub(r'[^\w.]+', '-', options['random_distribution']))
+    return '_'.join(parts)
+
+def emit_run_metrics(run, iteration, test_name, benchmark_item, engine, **labels):
+    """Report one run to run_dpbento.py: totals over all jobs and percentiles of their merged histogram, in msec."""
+    summary = run_summary(run)
+    metrics = {key: summary[key] for key in ('IOPS', 'bandwidth', 'avg_clatency')}
+    for percentile in REPORTED_PERCENTILES:
+        if summary['histogram'].count:
+            metrics[f"{percentile:g}th_percentile_clatency"] = summary['histogram'].percentile(percentile) / 1e6
+    emit_metrics(metrics, iteration=iteration, test_type=test_name, benchmark_item=benchmark_item, engine=engine, **labels)
+
+def fio_command(benchmark_item, test_name, options, block_size, numjobs, size, runtime, direct, iodepth, ioengine, target):
+    # a block device is accessed directly, a directory holds a pool file per job, whatever the job is called
+    target_options = [f"--filename={target}"] if is_block_device(target) else [f"--directory={target}", f"--filename_format={FIO_FILENAME_FORMAT}"]
+    return [
+        benchmark_item,
+        f"--name={test_name}", 
+        f"--ioengine={ioengine}", 
+        f"--rw={test_name}", 
+        f"--bs={block_size}", 
+        f"--direct={direct}", 
+        f"--size={size}", 
+        f"--numjobs={numjobs}", 
+        f"--iodepth={iodepth}", 
+        f"--runtime={runtime}", 
+        "--output-format=json+",
+    ] + [f"--{key}={value}" for key, value in options.items()] + target_options
+
+def native_command(test_name, options, block_size, numjobs, size, runtime, direct, iodepth, ioengine, target):
+    """The native engine in its own process, so that engines on several devices do not share a GIL."""
+    return [
+        sys.executable, NATIVE_ENGINE_SCRIPT,
+        f"--rw={test_name}",
+        f"--bs={block_size}",
+        f"--numjobs={numjobs}",
+        f"--size={size}",
+        f"--runtime={runtime}",
+        f"--direct={direct}",
+        f"--iodepth={iodepth}",
+        f"--ioengine={ioengine}",
+        f"--directory={target}",
+        f"--name={POOL_NAME}",
+        "--keep_files",
+        "--output-format=json+",
+    ] + [f"--{key}={value}" for key, value in options.items()]
+
+def run_benchmark(test_name, options, block_size, numjobs, size, runtime, direct, iodepth, ioengine, pool, precondition, output_folder, log_file, runtimes, benchmark_item):
     print(f"Running {benchmark_item} test: {test_name} with block_size={block_size}, numjobs={numjobs}, size={size}, runtime={runtime}, direct={direct}, iodepth={iodepth}, ioengine={ioengine}", file=log_file)
     
-    test_run_dir = os.path.join(output_folder, test_name, f"{block_size}_{numjobs}_{size}_{runtime}_{direct}_{iodepth}_{ioengine}")
+    test_run_dir = os.path.join(output_folder, test_type(test_name, options), f"{block_size}_{numjobs}_{size}_{runtime}_{direct}_{iodepth}_{ioengine}")
     create_directory(test_run_dir)
-    
-    # Ensure test_dir exists
-    create_directory(test_dir)
-    
-    combined_output_file = os.path.join(test_run_dir, "combined_results.txt")
 
-    with open(combined_output_file, 'a') as combined_file:
+    test_dir = test_files(pool, size, numjobs, precondition, direct, log_file)
+    if test_dir is None:
+        return
+
+    # one json+ document per run and line; without group reporting every job keeps its own latency histogram
+    results_file = os.path.join(test_run_dir, FIO_RESULTS_FILE)
+
+    for i in range(1, runtimes + 1):
+        print(f"Run #{i}", file=log_file)
+        
+        command = fio_command(benchmark_item, test_name, options, block_size, numjobs, size, runtime, direct, iodepth, ioengine, test_dir)
+        
+        try:
+            result = subprocess.run(command, check=True, capture_output=True, text=True)
+            run = load_fio_json(result.stdout)
+        except subprocess.CalledProcessError as e:
+            print(f"Error during run {i}: {e}", file=log_file)
+            print(f"stderr: {e.stderr}", file=log_file)
+            print(f"stdout: {e.stdout}", file=log_file)
+            continue
+        except ValueError as e:
+            print(f"Error during run {i}: unreadable fio output: {e}", file=log_file)
+            print(f"stdout: {result.stdout}", file=log_file)
+            continue
+
+        with open(results_file, 'a') as f:
+            f.write(json.dumps(run) + '\n')
+        print(f"Results appended to {results_file}", file=log_file)
+        emit_run_metrics(run, i, test_type(test_name, options), benchmark_item, ioengine)
+
+def run_native_benchmark(test_name, options, block_size, numjobs, size, runtime, direct, iodepth, ioengine, pool, precondition, output_folder, log_file, runtimes):
+    '''Same sweep as `run_benchmark`, on the built-in engine of native_engine.py instead of fio.'''
+    print(f"Running {NATIVE_ITEM} test: {test_name} with block_size={block_size}, numjobs={numjobs}, size={size}, runtime={runtime}, direct={direct}, iodepth={iodepth}, ioengine={ioengine}", file=log_file)
+
+    test_run_dir = os.path.join(output_folder, test_type(test_name, options), f"{block_size}_{numjobs}_{size}_{runtime}_{direct}_{iodepth}_{ioengine}")
+    create_directory(test_run_dir)
+
+    test_dir = test_files(pool, size, numjobs, precondition, direct, log_file)
+    if test_dir is None:
+        return
+
+    # one JSON line per run, in the shape of fio's json+ output
+    results_file = os.path.join(test_run_dir, NATIVE_RESULTS_FILE)
+    for i in range(1, runtimes + 1):
+        print(f"Run #{i}", file=log_file)
+        try:
+            run = run_native(test_name, block_size, numjobs, size, runtime, iodepth, test_dir, name=POOL_NAME,
+                             direct=direct, ioengine=ioengine, keep_files=True, **options)
+        except (OSError, ValueError) as e:
+            print(f"Error during run {i}: {e}", file=log_file)
+            continue
+
+        with open(results_file, 'a') as f:
+            f.write(json.dumps(run) + '\n')
+        print(f"Results appended to {results_file} (engine {run['engine']})", file=log_file)
+        emit_run_metrics(run, i, test_type(test_name, options), NATIVE_ITEM, run['engine'])
+
+def run_scaling_benchmark(test_name, options, block_size, numjobs, size, runtime, direct, iodepth, ioengine, devices, device_counts, precondition, output_folder, log_file, runtimes, benchmark_item):
+    """
+    Run the test on the first N of `devices` at once, for every N of `device_counts`: one fio (or native engine)
+    process per device, each with `numjobs` jobs. Reports every device and the aggregate over the devices.
+    """
+    print(f"Running {benchmark_item} scaling test: {test_name} on {device_counts} of {devices} with block_size={block_size}, numjobs={numjobs}, size={size}, runtime={runtime}, direct={direct}, iodepth={iodepth}, ioengine={ioengine}", file=log_file)
+
+    test_run_dir = os.path.join(output_folder, test_type(test_name, options), f"{block_size}_{numjobs}_{size}_{runtime}_{direct}_{iodepth}_{ioengine}")
+    create_directory(test_run_dir)
+
+    # every device gets its own pool, laid out before any of them is measured
+    pools = {}
+    for device in devices[:max(device_counts)]:
+        pools[device] = test_files(pool_root(device), size, numjobs, precondition, direct, log_file)
+        if pools[device] is None:
+            return
+
+    # one JSON line per device count and run, holding the json+ document of every device
+    results_file = os.path.join(test_run_dir, SCALING_RESULTS_FILE)
+    for count in device_counts:
+        targets = devices[:count]
+        for i in range(1, runtimes + 1):
+            print(f"Run #{i} on {count} devices: {', '.join(targets)}", file=log_file)
+            if benchmark_item == NATIVE_ITEM:
+                commands = [native_command(test_name, options, block_size, numjobs, size, runtime, direct, iodepth, ioengine, pools[target]) for target in targets]
+            else:
+                commands = [fio_command(benchmark_item, test_name, options, block_size, numjobs, size, runtime, direct, iodepth, ioengine, pools[target]) for target in targets]
+            processes = [subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True) for command in commands]
+
+            runs = {}
+            for target, process in zip(targets, processes):
+                # the engines print their results only once they are done, reading one after the other is fine
+                stdout, stderr = process.communicate()
+                if process.returncode != 0:
+                    print(f"Error during run {i} on {target}: exit code {process.returncode}", file=log_file)
+                    print(f"stderr: {stderr}", file=log_file)
+                    continue
+                try:
+                    runs[target] = load_fio_json(stdout)
+                except ValueError as e:
+                    print(f"Error during run {i} on {target}: unreadable output: {e}", file=log_file)
+            if len(runs) != len(targets):
+                # an aggregate over fewer devices than asked for would understate the scaling
+                print(f"Skipping run {i} on {count} devices, not every device completed", file=log_file)
+                continue
+
+            with open(results_file, 'a') as f:
+                f.write(json.dumps({'benchmark_item': benchmark_item, 'device_count': count, 'repetition': i, 'devices': runs}) + '\n')
+            print(f"Results appended to {results_file}", file=log_file)
+
+            engines = {run.get('engine', ioengine) for run in runs.values()}
+            for target, run in runs.items():
+                emit_run_metrics(run, i, test_type(test_name, options), benchmark_item, run.get('engine', ioengine), device=target, device_count=count)
+            aggregate = {'jobs': [job for run in runs.values() for job in run.get('jobs', [])]}
+            emit_run_metrics(aggregate, i, test_type(test_name, options), benchmark_item, ','.join(sorted(engines)), device='all', device_count=count)
+
+def run_rate_benchmark(test_name, options, block_size, numjobs, size, runtime, direct, iodepth, ioengine, rates, pool, precondition, output_folder, log_file, runtimes, benchmark_item):
+    """
+    Drive the test open-loop at each target rate of `rates` in turn, I/Os arriving as a Poisson process whether or
+    not earlier ones completed, for a latency-throughput curve. Every step runs for the full `runtime`.
+    """
+    print(f"Running {benchmark_item} rate test: {test_name} at {rates} IOPS with block_size={block_size}, numjobs={numjobs}, size={size}, runtime={runtime}, direct={direct}, iodepth={iodepth}, ioengine={ioengine}", file=log_file)
+
+    test_run_dir = os.path.join(output_folder, test_type(test_name, options), f"{block_size}_{numjobs}_{size}_{runtime}_{direct}_{iodepth}_{ioengine}")
+    create_directory(test_run_dir)
+
+    test_dir = test_files(pool, size, numjobs, precondition, direct, log_file)
+    if test_dir is None:
+        return
+
+    # one JSON line per rate and run, holding its json+ document
+    results_file = os.path.join(test_run_dir, RATE_RESULTS_FILE)
+    for rate in rates:
         for i in range(1, runtimes + 1):
-            print(f"Run #{i}", file=log_file)
-            print(f"\nRun #{i}\n{'-'*10}\n", file=combined_file)
-            
-            command = [
-                benchmark_item,
-                f"--name={test_name}", 
-                f"--ioengine={ioengine}", 
-                f"--rw={test_name}", 
-                f"--bs={block_size}", 
-                f"--direct={direct}", 
-                f"--size={size}", 
-                f"--numjobs={numjobs}", 
-                f"--iodepth={iodepth}", 
-                f"--runtime={runtime}", 
-                "--group_reporting", 
-                f"--directory={test_dir}",
-                "--unlink=1"  # This option tells fio to delete the test file after the job completes
-            ]
-            
+            print(f"Run #{i} at {rate} IOPS", file=log_file)
             try:
-                result = subprocess.run(command, check=True, capture_output=True, text=True)
-                combined_file.write(result.stdout)
-                print(f"Results appended to {combined_output_file}", file=log_file)
+                if benchmark_item == NATIVE_ITEM:
+                    run = run_native(test_name, block_size, numjobs, size, runtime, iodepth, test_dir, name=POOL_NAME, direct=direct,
+                                     ioengine=ioengine, time_based=True, keep_files=True, rate_iops=rate, rate_process=RATE_PROCESS, **options)
+                else:
+                    # fio's rate_iops applies to every job
+                    command = fio_command(benchmark_item, test_name, options, block_size, numjobs, size, runtime, direct, iodepth, ioengine, test_dir) \
+                        + [f"--rate_iops={max(1, round(rate / numjobs))}", f"--rate_process={RATE_PROCESS}", "--time_based"]
+                    result = subprocess.run(command, check=True, capture_output=True, text=True)
+                    run = load_fio_json(result.stdout)
             except subprocess.CalledProcessError as e:
-                print(f"Error during run {i}: {e}", file=log_file)
+                print(f"Error during run {i} at {rate} IOPS: {e}", file=log_file)
                 print(f"stderr: {e.stderr}", file=log_file)
-                print(f"stdout: {e.stdout}", file=log_file)
+                continue
+            except (OSError, ValueError) as e:
+                print(f"Error during run {i} at {rate} IOPS: {e}", file=log_file)
+                continue
+
+            with open(results_file, 'a') as f:
+                f.write(json.dumps({'benchmark_item': benchmark_item, 'rate_iops': rate, 'repetition': i, 'run': run}) + '\n')
+            print(f"Results appended to {results_file}", file=log_file)
+            emit_run_metrics(run, i, test_type(test_name, options), benchmark_item, run.get('engine', ioengine), rate_iops=rate)
+
+def trace_fio_command(benchmark_item, iolog, replay_no_stall, runtime, direct, iodepth, ioengine, target):
+    # the iolog names a placeholder file, fio redirects its I/O to the test file or device
+    return [
+        benchmark_item,
+        f"--name={TRACE_PATTERN}",
+        f"--ioengine={ioengine}",
+        f"--direct={direct}",
+        f"--iodepth={iodepth}",
+        f"--runtime={runtime}",
+        f"--read_iolog={iolog}",
+        f"--replay_redirect={target}",
+        f"--replay_no_stall={replay_no_stall}",
+        "--output-format=json+",
+    ]
+
+def run_trace_benchmark(trace, replay_no_stall, size, runtime, direct, iodepth, ioengine, pool, precondition, output_folder, log_file, runtimes, benchmark_item):
+    """
+    Replay the block trace `trace` on one test file of `size` bytes, at its recorded times or, with `replay_no_stall`,
+    as fast as `iodepth` allows. fio replays it from a version 3 iolog written next to the results, the native
+    engine streams the trace itself. Results go to `trace_<trace name>`, with `_nostall` when not timed.
+    """
+    print(f"Running {benchmark_item} trace replay: {trace} with size={size}, runtime={runtime}, direct={direct}, iodepth={iodepth}, ioengine={ioengine}, replay_no_stall={replay_no_stall}", file=log_file)
+
+    name = f"{TRACE_PATTERN}_{os.path.splitext(os.path.basename(trace))[0]}" + ("_nostall" if replay_no_stall else "")
+    test_run_dir = os.path.join(output_folder, name, f"trace_1_{size}_{runtime}_{direct}_{iodepth}_{ioengine}")
+    create_directory(test_run_dir)
+
+    test_dir = test_files(pool, size, 1, precondition, direct, log_file)
+    if test_dir is None:
+        return
+    if benchmark_item != NATIVE_ITEM:
+        try:
+            iolog = write_fio_iolog(trace, os.path.join(test_run_dir, "trace.iolog"), parse_size(size), bool(int(direct)))
+        except (OSError, ValueError) as e:
+            print(f"Error converting {trace} to a fio iolog: {e}", file=log_file)
+            return
+        target = test_dir if is_block_device(test_dir) else pool_file(test_dir, 0)
+
+    results_file = os.path.join(test_run_dir, NATIVE_RESULTS_FILE if benchmark_item == NATIVE_ITEM else FIO_RESULTS_FILE)
+    for i in range(1, runtimes + 1):
+        print(f"Run #{i}", file=log_file)
+        try:
+            if benchmark_item == NATIVE_ITEM:
+                run = run_trace(trace, size, runtime, iodepth, test_dir, name=POOL_NAME, direct=direct, ioengine=ioengine,
+                                replay_no_stall=replay_no_stall, keep_files=True)
+            else:
+                command = trace_fio_command(benchmark_item, iolog, replay_no_stall, runtime, direct, iodepth, ioengine, target)
+                result = subprocess.run(command, check=True, capture_output=True, text=True)
+                run = load_fio_json(result.stdout)
+        except subprocess.CalledProcessError as e:
+            print(f"Error during run {i}: {e}", file=log_file)
+            print(f"stderr: {e.stderr}", file=log_file)
+            continue
+        except (OSError, ValueError) as e:
+            print(f"Error during run {i}: {e}", file=log_file)
+            continue
+
+        with open(results_file, 'a') as f:
+            f.write(json.dumps(run) + '\n')
+        print(f"Results appended to {results_file}", file=log_file)
+        emit_run_metrics(run, i, name, benchmark_item, run.get('engine', ioengine))
 
 def main():
     args = parse_arguments()
@@ -83,8 +373,10 @@ def main():
     
     log_file_path = os.path.join(storage_output_dir, "benchmark_test_log.txt")
 
-    # Create test directory in the current directory
-    test_directory = os.path.join(current_dir, "fio_test")
+    devices = [device for device in args.devices.split(',') if device]
+
+    # test files are laid out once in a pool in the current directory and kept between runs
+    test_directory = os.path.join(current_dir, POOL_DIRECTORY)
     create_directory(test_directory)
 
     try:
@@ -92,9 +384,39 @@ def main():
             benchmark_items = args.benchmark_items.split(',')
             test_lst = args.test_lst.split(',')
 
+            missing = [device for device in devices if not os.path.exists(device)]
+            if missing:
+                sys.exit(f"Devices not found: {', '.join(missing)}")
+            device_counts = [int(count) for count in args.device_counts.split(',') if count] or [len(devices)]
+            if devices and any(count < 1 or count > len(devices) for count in device_counts):
+                sys.exit(f"device_counts must be between 1 and the {len(devices)} devices given")
+            rates = [int(rate) for rate in args.rate_iops.split(',') if rate]
+            if rates and devices:
+                sys.exit("rate_iops steps a single target, it cannot be combined with devices")
+            if any(rate < 1 for rate in rates):
+                sys.exit("rate_iops must be positive")
+            if TRACE_PATTERN in test_lst:
+                if not args.trace or not os.path.isfile(args.trace):
+                    sys.exit(f"The test {TRACE_PATTERN} needs a trace file, not found: {args.trace!r}")
+                if devices or rates:
+                    sys.exit(f"The test {TRACE_PATTERN} runs on a single target, it cannot be combined with devices or rate_iops")
+
             for benchmark_item in benchmark_items:
                 for test in test_lst:
-                    run_benchmark(test, args.block_sizes, args.numProc, args.size, args.runtime, args.direct, args.iodepth, args.io_engine, test_directory, storage_output_dir, log_file, args.runtimes, benchmark_item)
+                    if test == TRACE_PATTERN:
+                        run_trace_benchmark(args.trace, args.replay_no_stall, args.size, args.runtime, args.direct, args.iodepth, args.io_engine, test_directory, args.precondition, storage_output_dir, log_file, args.runtimes, benchmark_item)
+                        continue
+                    options = workload_options(test, args.rwmixread, args.random_distribution)
+                    if devices:
+                        run_scaling_benchmark(test, options, args.block_sizes, args.numProc, args.size, args.runtime, args.direct, args.iodepth, args.io_engine, devices, device_counts, args.precondition, storage_output_dir, log_file, args.runtimes, benchmark_item)
+                        continue
+                    if rates:
+                        run_rate_benchmark(test, options, args.block_sizes, args.numProc, args.size, args.runtime, args.direct, args.iodepth, args.io_engine, rates, test_directory, args.precondition, storage_output_dir, log_file, args.runtimes, benchmark_item)
+                        continue
+                    if benchmark_item == NATIVE_ITEM:
+                        run_native_benchmark(test, options, args.block_sizes, args.numProc, args.size, args.runtime, args.direct, args.iodepth, args.io_engine, test_directory, args.precondition, storage_output_dir, log_file, args.runtimes)
+                        continue
+                    run_benchmark(test, options, args.block_sizes, args.numProc, args.size, args.runtime, args.direct, args.iodepth, args.io_engine, test_directory, args.precondition, storage_output_dir, log_file, args.runtimes, benchmark_item)
 
         # Ensure the results.csv file can be created
         results_file = os.path.join(storage_output_dir, "results.csv")
@@ -102,10 +424,10 @@ def main():
             f.write("This file is created to ensure the directory exists.\n")
 
     finally:
-        # Clean up the test directory
-        if os.path.exists(test_directory):
-            shutil.rmtree(test_directory)
-            print(f"Test directory {test_directory} has been removed.")
+        if args.clean_test_files:
+            for pool in [test_directory] + [pool_root(device) for device in devices if not is_block_device(device)]:
+                remove_pool(pool)
+                print(f"Test directory {pool} has been removed.")
 
 if __name__ == '__main__':
     main()
@@ -1,16 +1,38 @@
+import collections
+import itertools
 import json
 import os
+import shutil
 import subprocess
-from itertools import product
+import sys
+import time
 import argparse
 import logging
-from typing import List
+from typing import Iterator
+
+from benchmarks.packages.compare import VERDICT_REGRESSION, CompareConfig, compare_stores, format_report
+from benchmarks.packages.events import EVENTS_FILE, EventLog, ProgressView, stream_output
+from benchmarks.packages.metrics import METRICS_FILE_ENV, metric_values, read_metrics
+from benchmarks.packages.param_space import ParamSpace
+from benchmarks.packages.perf_counters import PERF_EVENTS_ENV, events_from_config
+from benchmarks.packages.placement import Placement
+from benchmarks.packages.planner import DurationEstimator, format_plan
+from benchmarks.packages.prepare_cache import PrepareCache, prepare_spec
+from benchmarks.packages.plugin import PluginError, PluginPool, has_plugin
+from benchmarks.packages.ledger import RunLedger, STATUS_OK, STATUS_FAILED, STATUS_TIMEOUT
+from benchmarks.packages.repetition import RepetitionController, RepetitionPolicy
+from benchmarks.packages.result_store import RESULT_FILE_SUFFIX, ResultStore, load_results, new_run_id, result_files
+from benchmarks.packages.scheduler import SweepItem, SweepScheduler, resolve_resources
+from benchmarks.packages.telemetry import TelemetrySampler
+from benchmarks.packages.warmup import WARMUP_LABEL, WarmupPolicy
+from benchmarks.packages.watchdog import RunTimeout, check_timeout, resolve_timeout, wait_process_group
 
 # These scripts need to be executable in the benchmark item directory
 BENCH_ITEM_SCRIPTS = ['prepare.py', 'run.py', 'report.py', 'clean.py']
 
 class ExperimentRunner:
-    def __init__(self, config_file):
+    def __init__(self, config_file, jobs=1, resume=False, force=False, use_plugins=True, telemetry_interval=None,
+                 reprepare=False, timeout=None, progress=False):
         # Set up logging
         self.logger = self.setup_logging()
 
@@ -38,6 +60,60 @@ class ExperimentRunner:
         self.bench_hints = {}
         '''Dictionary mapping benchmark class's path to (report/plot) hints from the user config'''
 
+        self.bench_configs = {}
+        '''Dictionary mapping benchmark class's path to its whole entry in the user config, for the optional sections'''
+
+        self.bench_placements = {}
+        '''Dictionary mapping benchmark class's path to its Placement, for benchmarks with a `placement` config'''
+
+        self.jobs = jobs
+        '''Maximum number of parameter combinations to run concurrently'''
+
+        self.resume = resume
+        '''Skip combinations the ledger records as completed'''
+
+        self.force = force
+        '''Invalidate the ledger entries of the configured benchmarks before running'''
+
+        self.ledger = RunLedger(os.path.join(self.output_dir, 'ledger.jsonl'))
+        '''Persistent record of completed combinations, used by `--resume`'''
+
+        self.timeout = timeout
+        '''Default timeout of a single run in seconds, for benchmarks without a `timeout` config'''
+
+        self.reprepare = reprepare
+        '''Run every prepare.py even if the prepare cache says the benchmark is up to date'''
+
+        self.prepare_cache = PrepareCache(os.path.join(self.output_dir, 'prepare_cache.json'), host=self.ledger.host)
+        '''Inputs of the last successful prepare per benchmark, see benchmarks/packages/prepare_cache.py'''
+
+        self.use_plugins = use_plugins
+        '''Call the phases a benchmark's plugin.py implements in a long-lived worker instead of its scripts'''
+
+        self.plugins = PluginPool()
+
+        self.telemetry_interval = telemetry_interval
+        '''Sampling interval in seconds for system telemetry of every run, None unless a benchmark asks for it'''
+
+        self.run_id = new_run_id()
+        '''Identifies this sweep in the ledger and the result store'''
+
+        self.log_dir = os.path.join(self.output_dir, 'logs', self.run_id)
+        '''Event stream, orchestrator log and the output of every run of this sweep'''
+
+        self.events = EventLog(None, self.run_id)
+        '''Only written to a file once a sweep runs (see `open_sweep_log`), `--plan` and `--clean` leave no logs'''
+
+        self.progress = progress
+        '''Show a live progress line instead of the console log and the benchmarks' output'''
+
+        try:
+            self.results = ResultStore(os.path.join(self.output_dir, 'results'), self.run_id, host=self.ledger.host)
+            '''Typed rows of every metric reported during this sweep, in output/results/<run_id>.arrows'''
+        except ImportError as e:
+            self.logger.warning(f"{e}; metrics are only kept in the benchmarks' own output files")
+            self.results = None
+
         # Get the list of benchmark paths to run, and then find scripts in these paths
         self.benchmarks_to_run = []
         self.collect_all_benchmarks_to_run()
@@ -89,16 +165,78 @@ class ExperimentRunner:
             raise PermissionError(f"Cannot access benchmark directory '{self.benchmarks_dir}'. Please check your permissions.")
         self.logger.info(f"Benchmark directory and permissions verified.")
 
-    def run_benchmark_script(self, script_name: str, benchmark: str, opts: list=[]):
+    def run_benchmark_script(self, script_name: str, benchmark: str, opts: list=[], cpus: list=None, env: dict=None,
+                             on_start=None, prefix: list=None, timeout: float=None, log_path: str=None):
+            '''
+            Run a benchmark script in its own process group. Raises RunTimeout if it runs longer than
+            `timeout` seconds, after killing the group.
+            Its output is streamed into `log_path` (by default `<log_dir>/<benchmark>-<phase>.log` during a sweep)
+            and, unless the progress view is on, echoed to the console.
+            '''
             script_path = os.path.join(benchmark, script_name)
-            commands = ['python3', script_path] + opts
+            commands = (prefix or []) + ['python3', script_path] + opts
+            phase = script_name.split('.')[0]
+            # pin concurrent runs to the cores the scheduler handed out, children inherit the affinity
+            preexec_fn = (lambda: os.sched_setaffinity(0, cpus)) if cpus else None
             try:
-                subprocess.run(commands, check=True)
+                # a session of its own lets the watchdog kill everything the script started, shells included
+                process = subprocess.Popen(commands, preexec_fn=preexec_fn, start_new_session=True,
+                                           env={**os.environ, 'PYTHONUNBUFFERED': '1', **(env or {})},
+                                           stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+                # concurrent runs interleave on the console, tell them apart
+                prefix_bytes = f"[{os.path.basename(benchmark)}] ".encode() if self.jobs > 1 else b''
+                pump = stream_output(process.stdout, log_path or self.phase_log_path(benchmark, phase),
+                                     echo=None if self.progress else sys.stdout.buffer, prefix=prefix_bytes)
+                if on_start:
+                    on_start(process.pid)
+                try:
+                    returncode = wait_process_group(process, timeout)
+                finally:
+                    pump.join()
+                if returncode != 0:
+                    raise subprocess.CalledProcessError(process.returncode, commands)
             except subprocess.CalledProcessError as e:
                 self.logger.error(f"Running {script_name.split('.')[0]} for {benchmark} failed, error: {e}")
                 return False
             return True
 
+    def run_benchmark_phase(self, phase: str, benchmark: str, params: dict, opts: list=[], cpus: list=None, env: dict=None,
+                            on_start=None, prefix: list=None, timeout: float=None, log_path: str=None):
+        '''
+        Run one phase (prepare/run/report/clean) of a benchmark, through its plugin if it has one that
+        implements the phase, otherwise through the `<phase>.py` script with the equivalent `opts`.
+        A command `prefix` (e.g. numactl) needs a fresh process, so it always goes through the script.
+        Raises RunTimeout if the phase takes longer than `timeout` seconds.
+        '''
+        if self.use_plugins and has_plugin(benchmark) and not prefix:
+            try:
+                self.plugins.call(benchmark, phase, params, cpus=cpus, env=env, on_start=on_start, timeout=timeout,
+                                  log_path=log_path or self.phase_log_path(benchmark, phase))
+                return True
+            except NotImplementedError:
+                pass
+            except PluginError as e:
+                self.logger.error(f"Running {phase} plugin for {benchmark} failed, error: {e}")
+                return False
+        return self.run_benchmark_script(f"{phase}.py", benchmark, opts=opts, cpus=cpus, env=env, on_start=on_start,
+                                         prefix=prefix, timeout=timeout, log_path=log_path)
+
+    def phase_log_path(self, benchmark: str, phase: str) -> str:
+        '''None outside a sweep, e.g. for `--clean`, whose output only goes to the console.'''
+        if self.events.path is None:
+            return None
+        return os.path.join(self.log_dir, f"{os.path.basename(benchmark)}-{phase}.log")
+
+    def run_setup_phase(self, phase: str, benchmark: str, params: dict, opts: list=[]) -> bool:
+        '''Run prepare/report/clean of a benchmark, with start and finish events.'''
+        name = self.ledger_name(benchmark)
+        start = time.monotonic()
+        self.events.emit('phase_start', benchmark=name, phase=phase)
+        ok = self.run_benchmark_phase(phase, benchmark, params, opts=opts)
+        self.events.emit('phase_finish', benchmark=name, phase=phase, status=STATUS_OK if ok else STATUS_FAILED,
+                         duration=time.monotonic() - start)
+        return ok
+
     def collect_all_benchmarks_to_run(self):
         '''
         Check the user JSON config file and collect all benchmarks to run, including user-provided benchmarks.
@@ -111,7 +249,7 @@ class ExperimentRunner:
         '''
         # NOTE: right now it params, metrics and hints are shared across items in the same class, let's still
         # store them in the dictionaries with its own item path as the key
-        def add_bench_item_if_ok(item_path: str, bench_items: list, bench_params: dict, metrics: list, hints: dict):
+        def add_bench_item_if_ok(item_path: str, bench_items: list, bench_params: dict, metrics: list, hints: dict, config: dict):
             '''
             Add benchmark items (paths) to the list of benchmarks to run,
             and add parameters from the user config to the `bench_params` dictionary where the key is the item path,
@@ -124,6 +262,7 @@ class ExperimentRunner:
                 self.bench_params[item_path] = bench_params
                 self.bench_metrics[item_path] = metrics
                 self.bench_hints[item_path] = hints
+                self.bench_configs[item_path] = config
                 self.logger.debug(f"bench_params: {bench_params}")
             else:
                 self.logger.warning(f"Benchmark '{item_path}' missing executable scripts, ignoring...")
@@ -139,11 +278,21 @@ class ExperimentRunner:
             bench_params = benchmark.get("parameters", {})
             metrics = benchmark.get("metrics", [])
             hints = benchmark.get("report_hints", {})
+            # a bad section fails here rather than in every run of the sweep
+            try:
+                check_timeout(benchmark.get('timeout'))
+                RepetitionPolicy.from_config(benchmark.get('repetition'))
+                WarmupPolicy.from_config(benchmark.get('warmup'))
+                placement = Placement.from_config(benchmark.get('placement'))
+            except ValueError as e:
+                raise ValueError(f"Benchmark '{bench_class}' has an invalid config: {e}")
 
             bench_class_path = os.path.join(self.benchmarks_dir, bench_class)
             if not os.access(bench_class_path, os.X_OK):
                 self.logger.warning(f"Cannot access benchmark class '{bench_class}', ignoring...")
                 continue
+            if placement:
+                self.bench_placements[bench_class_path] = placement
 
             # if not specified, try to get all benchmark items in the class
             # TODO: may need a more robust method to get all benchmark items
@@ -155,14 +304,14 @@ class ExperimentRunner:
                                 if (os.path.isdir(os.path.join(bench_class_path, item_dir)) and not item_dir.endswith('env'))]
 
 
-                add_bench_item_if_ok(bench_class_path, bench_items, bench_params, metrics, hints)
+                add_bench_item_if_ok(bench_class_path, bench_items, bench_params, metrics, hints, benchmark)
                 # bench_items_paths = [item_path for item_dir in os.listdir(bench_class_path)
                 #                     if os.path.isdir(item_path:=os.path.join(bench_class_path, item_dir))]
                 # for bench_items_path in bench_items_paths:
                 #     # get the benchmark scripts and check if executable
                 #     add_bench_item_if_ok(bench_items_path, {}, [], {})
             else:
-                add_bench_item_if_ok(bench_class_path, bench_items, bench_params, metrics, hints)
+                add_bench_item_if_ok(bench_class_path, bench_items, bench_params, metrics, hints, benchmark)
                 for bench_item in bench_items:
                     bench_item_path = os.path.join(bench_class_path, bench_item)
                     if not os.access(bench_item_path, os.X_OK):
@@ -170,40 +319,315 @@ class ExperimentRunner:
 
         self.logger.info(f"Collected benchmarks to run: {self.benchmarks_to_run}")
 
+    def open_sweep_log(self):
+        '''Create the sweep's log directory with its event stream and the orchestrator's log.'''
+        self.events = EventLog(os.path.join(self.log_dir, EVENTS_FILE), self.run_id)
+        file_handler = logging.FileHandler(os.path.join(self.log_dir, 'dpbento.log'))
+        file_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+        self.logger.addHandler(file_handler)
+        if self.progress:
+            for handler in self.logger.handlers:
+                if type(handler) is logging.StreamHandler:
+                    handler.setLevel(logging.WARNING)
+            self.events.subscribe(ProgressView())
+
     def run_dpbento(self):
         '''
         This is the main function for the dpbento framework.
         '''
 
+        self.open_sweep_log()
         self.create_and_check_directories()
 
-        for benchmark in self.benchmarks_to_run:
-            if not self.run_benchmark_script('prepare.py', benchmark):
-                continue
-
-            bench_params = self.bench_params[benchmark]
-            keys = bench_params.keys()
-            values = (v if isinstance(v, list) else [v] for v in bench_params.values())
-            combinations = list(product(*values))
+        if self.force:
+            removed = self.ledger.invalidate([self.ledger_name(b) for b in self.benchmarks_to_run])
+            self.logger.info(f"Invalidated {removed} ledger entries")
 
+        try:
+            prepared = [benchmark for benchmark in self.benchmarks_to_run if self.prepare_benchmark(benchmark)]
+
+            # the combinations are counted up front but only expanded into sweep items as the scheduler needs them
+            spaces = {benchmark: self.param_space(benchmark) for benchmark in prepared}
+            total = sum(sum(1 for _ in space) for space in spaces.values())
+            sweep_items = itertools.chain.from_iterable(self.collect_sweep_items(benchmark, spaces[benchmark])
+                                                        for benchmark in prepared)
+
+            self.logger.info(f"Running {total} combinations with up to {self.jobs} concurrent jobs")
+            self.events.emit('sweep_start', total=total, jobs=self.jobs,
+                             benchmarks=[self.ledger_name(b) for b in prepared])
+            sweep_start = time.monotonic()
+            scheduler = SweepScheduler(max_workers=self.jobs, logger=self.logger)
+            statuses = scheduler.run(sweep_items, self.run_sweep_item, on_reject=self.reject_sweep_item)
+            self.events.emit('sweep_finish', duration=time.monotonic() - sweep_start,
+                             counts=collections.Counter(s if isinstance(s, str) else STATUS_FAILED for s in statuses))
+
+            for benchmark in prepared:
+                # Add metrics parameters and run report.py
+                # TODO: maybe just use comma separated values instead of json
+                metrics_opts = [f"--metrics={json.dumps(self.bench_metrics[benchmark])}"]
+                self.run_setup_phase('report', benchmark, {'metrics': self.bench_metrics[benchmark]}, opts=metrics_opts)
+        finally:
+            self.plugins.close()
+            self.events.close()
+            if self.results:
+                self.results.close()
+                self.logger.info(f"Results of sweep {self.run_id} stored in {self.results.path}")
+
+    def resolve_baseline(self, baseline: str) -> str:
+        '''A baseline given as a bare run id refers to output/results/<run_id>.arrows.'''
+        if not os.path.exists(baseline) and not os.path.exists(baseline + RESULT_FILE_SUFFIX):
+            baseline = os.path.join(self.output_dir, 'results', baseline)
+        if not all(os.path.exists(path) for path in result_files(baseline)):
+            raise FileNotFoundError(f"No results of baseline {baseline}")
+        return baseline
+
+    def compare_results(self, baseline: str) -> bool:
+        '''
+        Compare the results of this sweep with those of a baseline sweep on the same host, print a pass/fail
+        report and save it as compare.json next to the logs of the sweep. Returns False if a metric regressed.
+        '''
+        if self.results is None or not os.path.exists(self.results.path):
+            self.logger.error("This sweep stored no results to compare")
+            return False
+        baseline = self.resolve_baseline(baseline)
+        configs = {self.ledger_name(b): CompareConfig.from_config(self.bench_configs[b].get('compare'))
+                   for b in self.benchmarks_to_run}
+        comparisons, missing = compare_stores(baseline, self.results.path, host=self.ledger.host,
+                                              config_for=lambda b: configs.get(b) or CompareConfig())
+        if not any(c['n_baseline'] for c in comparisons) and not missing:
+            hosts = sorted(set(load_results(baseline)['host'].to_pylist()))
+            self.logger.warning(f"Baseline {baseline} has no results of this host ({self.ledger.host}), "
+                                f"only of {', '.join(hosts) or 'no host'}")
+
+        print(format_report(comparisons, missing))
+        report_path = os.path.join(self.log_dir, 'compare.json')
+        with open(report_path, 'w') as f:
+            json.dump({'baseline': baseline, 'run_id': self.run_id, 'comparisons': comparisons}, f, indent=2)
+        self.logger.info(f"Comparison with {baseline} stored in {report_path}")
+        return not any(c['verdict'] == VERDICT_REGRESSION for c in comparisons)
+
+    def prepare_benchmark(self, benchmark: str) -> bool:
+        '''
+        Run the prepare phase of a benchmark, unless it declares its inputs (see `prepare_spec`) and
+        none of them changed since the last successful prepare.
+        '''
+        spec = prepare_spec(os.path.basename(benchmark), self.bench_configs[benchmark].get('prepare'))
+        params = {'benchmark_items': self.bench_items[benchmark]}
+        # prepare scripts pick what to install from the items, e.g. storage needs no fio for `native` alone
+        opts = ['--benchmark_items', ','.join(self.bench_items[benchmark])]
+        if spec is None:
+            return self.run_setup_phase('prepare', benchmark, params, opts=opts)
+
+        name = self.ledger_name(benchmark)
+        key = self.prepare_cache.key_for(benchmark, spec)
+        if not self.reprepare and self.prepare_cache.is_up_to_date(name, key, benchmark, spec):
+            self.logger.info(f"Prepare of {benchmark} is up to date, skipping")
+            return True
 
-            metrics_opt = f"--metrics={json.dumps(self.bench_metrics[benchmark])}"
-
-            for combination in combinations:
-                params = list(zip(keys, combination))
-                opts = self.kv_list_to_opts(self.bench_items[benchmark], params)
-
-                opts.append(metrics_opt)
-                
-                self.logger.info(f"Running benchmark {benchmark} with: {' '.join(opts)}")
-                if not self.run_benchmark_script('run.py', benchmark, opts=opts):
-                    continue
+        ok = self.run_setup_phase('prepare', benchmark, params, opts=opts)
+        if ok:
+            # prepare may have installed the toolchain or built the artifacts the key hashes, record them as they are now
+            self.prepare_cache.record(name, self.prepare_cache.key_for(benchmark, spec), benchmark, spec)
+        else:
+            self.prepare_cache.invalidate(name)
+        return ok
 
-            # Add metrics parameters and run report.py
-            # TODO: maybe just use comma separated values instead of json
-            metrics_opts = [f"--metrics={json.dumps(self.bench_metrics[benchmark])}"]
-            if not self.run_benchmark_script('report.py', benchmark, opts=metrics_opts):
-                continue
+    def plan_dpbento(self):
+        '''
+        Print the combinations a sweep would run, their estimated durations and the order the scheduler
+        would start them in, without running anything.
+        '''
+        sweep_items = []
+        for benchmark in self.benchmarks_to_run:
+            sweep_items.extend(self.collect_sweep_items(benchmark))
+
+        skipped = 0
+        if self.resume:
+            remaining = [item for item in sweep_items if not self.ledger.is_completed(item.key)]
+            skipped = len(sweep_items) - len(remaining)
+            sweep_items = remaining
+
+        estimators = {benchmark: DurationEstimator(self.ledger, self.ledger_name(benchmark), os.path.basename(benchmark),
+                                                   self.bench_configs[benchmark])
+                      for benchmark in self.benchmarks_to_run}
+        estimates = [estimators[item.benchmark].estimate(item.key, item.params) for item in sweep_items]
+        scheduler = SweepScheduler(max_workers=self.jobs, logger=self.logger)
+        schedule = scheduler.simulate(sweep_items, [estimate or 0.0 for estimate, _ in estimates])
+        print(format_plan(self.benchmarks_to_run, sweep_items, estimates, schedule, skipped=skipped))
+
+    def param_space(self, benchmark: str) -> ParamSpace:
+        '''The Cartesian product of the benchmark's parameters, shaped by its optional `param_space` config.'''
+        return ParamSpace.from_config(self.bench_params[benchmark], self.bench_configs[benchmark].get('param_space'))
+
+    def collect_sweep_items(self, benchmark: str, space: ParamSpace = None) -> Iterator[SweepItem]:
+        '''
+        Expand the benchmark's parameter space into sweep items for the scheduler, one at a time as they
+        are consumed.
+        '''
+        if space is None:
+            space = self.param_space(benchmark)
+
+        metrics_opt = f"--metrics={json.dumps(self.bench_metrics[benchmark])}"
+        placement = self.bench_placements.get(benchmark)
+
+        produced = 0
+        for params in space:
+            opts = self.kv_list_to_opts(self.bench_items[benchmark], params)
+            opts.append(metrics_opt)
+
+            resources = resolve_resources(os.path.basename(benchmark), params,
+                                           self.bench_configs[benchmark].get('resources', {}))
+            key = self.ledger.key_for(self.ledger_name(benchmark), params, benchmark, items=self.bench_items[benchmark],
+                                      metrics=self.bench_metrics[benchmark])
+            produced += 1
+            yield SweepItem(benchmark, params, opts, key=key, allowed_cpus=placement.cpus if placement else None,
+                            **resources)
+        self.logger.info(f"{benchmark}: {produced} of {space.grid_size} combinations in the parameter grid")
+
+    def ledger_name(self, benchmark: str) -> str:
+        '''Benchmark path relative to the dpbento root, so the ledger survives moving the checkout'''
+        return os.path.relpath(benchmark, self.dpbento_root)
+
+    def reject_sweep_item(self, item: SweepItem, reason: str):
+        '''Record a combination the scheduler could never start as failed.'''
+        name = self.ledger_name(item.benchmark)
+        self.ledger.record(item.key, name, item.params, STATUS_FAILED, 0.0, run_id=self.run_id, error=reason)
+        self.events.emit('combination_finish', benchmark=name, params=dict(item.params), key=item.key,
+                         status=STATUS_FAILED, duration=0.0, error=reason)
+
+    def run_sweep_item(self, item: SweepItem, cpus: list) -> str:
+        '''Run one combination, repeated as its `repetition` config asks, and return its status.'''
+        name = self.ledger_name(item.benchmark)
+        if self.resume and self.ledger.is_completed(item.key):
+            self.logger.info(f"Skipping completed combination of {item.benchmark}: {dict(item.params)}")
+            self.events.emit('combination_skip', benchmark=name, params=dict(item.params), key=item.key)
+            return STATUS_OK
+
+        self.logger.info(f"Running benchmark {item.benchmark} with: {' '.join(item.opts)}")
+        start = time.monotonic()
+        plugin_params = {'benchmark_items': self.bench_items[item.benchmark], **dict(item.params),
+                         'metrics': self.bench_metrics[item.benchmark]}
+
+        policy = RepetitionPolicy.from_config(self.bench_configs[item.benchmark].get('repetition'))
+        controller = RepetitionController(policy) if policy else None
+        warmup = WarmupPolicy.from_config(self.bench_configs[item.benchmark].get('warmup'))
+
+        # a single job keeps the old behaviour of not pinning anything
+        run_cpus = cpus if self.jobs > 1 else None
+        run_env = {}
+        prefix = None
+        placement = self.bench_placements.get(item.benchmark)
+        if placement:
+            # alone (or exclusive) a run gets the whole placement, concurrent runs their share of it
+            if self.jobs == 1 or item.exclusive:
+                run_cpus = placement.cpus
+            run_env.update(placement.environment(run_cpus))
+            prefix = placement.command_prefix(run_cpus)
+
+        perf_events = events_from_config(self.bench_configs[item.benchmark].get('perf_counters'))
+        if perf_events:
+            # the benchmark wraps its native binaries with perf stat, see benchmarks/packages/perf_counters.py
+            run_env[PERF_EVENTS_ENV] = ','.join(perf_events)
+
+        timeout = resolve_timeout(self.bench_configs[item.benchmark].get('timeout', self.timeout), dict(item.params))
+
+        # every repetition reports to its own metrics file, a rerun starts from scratch
+        metrics_dir = os.path.join(self.output_dir, 'metrics', item.key)
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+        os.makedirs(metrics_dir)
+
+        repetition = 0
+        while True:
+            metrics_file = os.path.join(metrics_dir, f"rep-{repetition}.jsonl")
+            log_path = os.path.join(self.log_dir, f"{os.path.basename(item.benchmark)}-{item.key[:16]}-rep{repetition}.log")
+            self.events.emit('run_start', benchmark=name, params=dict(item.params), key=item.key, repetition=repetition,
+                             cpus=run_cpus, log=os.path.relpath(log_path, self.output_dir))
+            run_start = time.monotonic()
+            sampler = self.start_telemetry(item.benchmark)
+            try:
+                ok = self.run_benchmark_phase('run', item.benchmark, plugin_params, opts=item.opts, cpus=run_cpus,
+                                              env={**run_env, METRICS_FILE_ENV: metrics_file},
+                                              on_start=sampler.attach if sampler else None, prefix=prefix,
+                                              timeout=timeout, log_path=log_path)
+                status = STATUS_OK if ok else STATUS_FAILED
+            except RunTimeout as e:
+                # a stuck combination is recorded and the sweep moves on
+                self.logger.error(f"Running {item} killed: {e}")
+                ok, status = False, STATUS_TIMEOUT
+            self.events.emit('run_finish', benchmark=name, params=dict(item.params), key=item.key, repetition=repetition,
+                             status=status, duration=time.monotonic() - run_start)
+            records = read_metrics(metrics_file)
+            trimmed = warmup.mark(records) if warmup else 0
+            if trimmed:
+                self.logger.debug(f"{item} repetition {repetition}: {trimmed} warm-up iterations trimmed")
+            for labels in warmup.unsteady if warmup else []:
+                self.logger.warning(f"{item} repetition {repetition} {labels or ''} did not reach a steady state, "
+                                    f"consider more iterations")
+            self.store_results(item, repetition, records, status)
+            if sampler:
+                sampler.stop()
+                self.store_telemetry(item, repetition, sampler, status)
+            repetition += 1
+            if not ok or controller is None:
+                break
+            controller.add(metric_values(records, policy.metric))
+            if not controller.should_continue():
+                break
+
+        summary = controller.summary() if controller else {'repetitions': repetition}
+        if controller and controller.reason == 'no_metric':
+            self.logger.error(f"{item} never reported the repetition metric '{policy.metric}', "
+                              f"stopped after {controller.runs} repetitions")
+        elif controller:
+            self.logger.info(f"{item} stopped after {controller.runs} repetitions ({controller.reason}), "
+                             f"relative CI {summary['relative_ci']}")
+        duration = time.monotonic() - start
+        # --resume skips combinations the ledger has, so their rows must be on disk before it records them
+        if self.results is not None:
+            self.results.flush()
+        self.ledger.record(item.key, name, item.params, status, duration, run_id=self.run_id, **summary)
+        self.events.emit('combination_finish', benchmark=name, params=dict(item.params), key=item.key, status=status,
+                         duration=duration, **summary)
+        return status
+
+    def start_telemetry(self, benchmark: str):
+        '''
+        Start sampling /proc for one run if the benchmark's `telemetry` config or `--telemetry` asks for it.
+        '''
+        config = self.bench_configs[benchmark].get('telemetry')
+        if config is None and self.telemetry_interval is None:
+            return None
+        config = config or {}
+        return TelemetrySampler(interval=config.get('interval', self.telemetry_interval or 1.0),
+                                capacity=config.get('capacity', 3600)).start()
+
+    def store_telemetry(self, item: SweepItem, repetition: int, sampler: TelemetrySampler, status: str):
+        '''Save the time series next to the results and add its summary as a row with source=telemetry.'''
+        series_path = os.path.join(self.output_dir, 'telemetry', self.run_id, f"{item.key[:16]}-rep{repetition}.json")
+        sampler.save(series_path)
+        if self.results is not None:
+            self.results.append(self.ledger_name(item.benchmark), dict(item.params), sampler.summary(),
+                                status=status, repetition=repetition,
+                                labels={'source': 'telemetry', 'series': os.path.relpath(series_path, self.output_dir)})
+
+    def store_results(self, item: SweepItem, repetition: int, records: list, status: str):
+        '''
+        Append the metric records one run reported to the result store, or a bare status row if there are
+        none. Warm-up iterations are kept, labelled so that aggregation leaves them out.
+        '''
+        benchmark = self.ledger_name(item.benchmark)
+        for record in records:
+            self.events.emit('metric', benchmark=benchmark, params=dict(item.params), key=item.key, repetition=repetition,
+                             metrics=record['metrics'], iteration=record.get('iteration'), labels=record.get('labels'),
+                             warmup=bool(record.get('warmup')))
+        if self.results is None:
+            return
+        if not records:
+            self.results.append(benchmark, dict(item.params), {}, status=status, repetition=repetition)
+        for record in records:
+            labels = {**(record.get('labels') or {}), WARMUP_LABEL: 'true'} if record.get('warmup') else record.get('labels')
+            self.results.append(benchmark, dict(item.params), record['metrics'], status=status, repetition=repetition,
+                                iteration=record.get('iteration'), labels=labels, timestamp=record['time'])
 
     @staticmethod
     def kv_list_to_opts(bench_item, kv_list):
@@ -217,23 +641,66 @@ class ExperimentRunner:
         '''
         Run clean.py to remove intermediate files for each benchmark item and reset state.
         '''
-        for benchmark in self.benchmarks_to_run:
-            self.run_benchmark_script('clean.py', benchmark)
+        try:
+            for benchmark in self.benchmarks_to_run:
+                self.run_setup_phase('clean', benchmark, {'benchmark_items': self.bench_items[benchmark]})
+                # whatever prepare set up may be gone now
+                self.prepare_cache.invalidate(self.ledger_name(benchmark))
+        finally:
+            self.plugins.close()
+            self.events.close()
+
+def timeout_argument(value: str) -> str:
+    try:
+        return check_timeout(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
 
 def main():
     parser = argparse.ArgumentParser(description='Welcome to DPU benchmarking.')
     parser.add_argument('--config', type=str, required=True, help='Path to the configuration file')
     parser.add_argument('--clean', action='store_true', help='Run clean scripts')
+    parser.add_argument('--plan', action='store_true',
+                        help='Only print the combinations to run, their estimated time and the execution order')
+    parser.add_argument('--jobs', type=int, default=1, help='Maximum number of parameter combinations to run concurrently')
+    parser.add_argument('--resume', action='store_true', help='Skip combinations that already completed in a previous sweep')
+    parser.add_argument('--force', action='store_true', help='Forget previously completed combinations and rerun everything')
+    parser.add_argument('--timeout', type=timeout_argument, metavar='SECONDS',
+                        help="Kill a run after this long (e.g. 600 or '30m') unless its benchmark sets a 'timeout'")
+    parser.add_argument('--reprepare', action='store_true',
+                        help='Run every prepare script, even for benchmarks whose prepare cache is up to date')
+    parser.add_argument('--telemetry', type=float, metavar='SECONDS',
+                        help='Sample CPU, memory, disk and network usage of every run at this interval')
+    parser.add_argument('--progress', action='store_true',
+                        help="Show a live progress line with ETA; the benchmarks' output only goes to output/logs/<run_id>/")
+    parser.add_argument('--compare', type=str, metavar='BASELINE',
+                        help='After the sweep, test its results for regressions against a baseline sweep (run id or '
+                             'result file) on the same host; exits with 1 if a metric regressed')
+    parser.add_argument('--no-plugins', dest='use_plugins', action='store_false',
+                        help="Always run the benchmark scripts, even if the benchmark provides a plugin.py")
     # TODO: may or may not need a standalone plot option
     # parser.add_argument('--report_only', action='store_true', help='rerun reports for already obtained results')
     args = parser.parse_args()
 
-    runner = ExperimentRunner(args.config)
+    runner = ExperimentRunner(args.config, jobs=args.jobs, resume=args.resume, force=args.force,
+                              use_plugins=args.use_plugins, telemetry_interval=args.telemetry, reprepare=args.reprepare,
+                              timeout=args.timeout, progress=args.progress)
 
-    if args.clean:
+    if args.plan:
+        runner.plan_dpbento()
+    elif args.clean:
         runner.clean_benchmarks()
     else:
+        # fail before spending hours on the sweep
+        baseline = None
+        if args.compare:
+            try:
+                baseline = runner.resolve_baseline(args.compare)
+            except FileNotFoundError as e:
+                parser.error(str(e))
         runner.run_dpbento()
+        if baseline and not runner.compare_results(baseline):
+            sys.exit(1)
 
 if __name__ == '__main__':
     main()